@@ -3,6 +3,7 @@ import os
 from ipdb import set_trace as st
 from numpy import testing as tst
 import pytest
+import unittest.mock
 from tree_tagger import Components, PDGNames
 from tools import generic_equality_comp, TempTestDir, data_dir
 import awkward
@@ -116,6 +117,33 @@ def test_apply_array_func():
         assert generic_equality_comp(out, result), f"{inp} gives result = {result}, not {out}"
 
 
+def test_apply_elementwise_func():
+    func = np.cos
+    inputs = [AwkdArrays.one_one, AwkdArrays.minus_plus, AwkdArrays.event_ints,
+              AwkdArrays.jet_ints, AwkdArrays.event_floats, AwkdArrays.jet_floats,
+              AwkdArrays.empty_event, AwkdArrays.empty_jet]
+    for inp in inputs:
+        result = Components.apply_elementwise_func(func, inp)
+        expected = Components.apply_array_func(func, inp)
+        assert generic_equality_comp(expected, result), f"{inp} gives result = {result}, not {expected}"
+    # multiple inputs and outputs
+    phi, pt = Components.apply_elementwise_func(Components.pxpy_to_phipt,
+                                                AwkdArrays.jet_floats, AwkdArrays.jet_floats)
+    assert generic_equality_comp(pt, Components.apply_array_func(lambda x: np.sqrt(2)*x,
+                                                                 AwkdArrays.jet_floats))
+    assert phi.flatten().flatten().tolist() == [np.pi/4]*6
+    # a view into a larger array only uses its own content
+    view = AwkdArrays.jet_floats[1:]
+    result = Components.apply_elementwise_func(func, view)
+    assert result.tolist() == [[[func(.4), func(.5), func(.6)]]]
+    assert len(result.content.content) == 3
+    # lists fall back to apply_array_func
+    result = Components.apply_elementwise_func(func, [[.1, .2], [.3]])
+    assert generic_equality_comp(result, awkward.fromiter([[func(.1), func(.2)], [func(.3)]]))
+    with pytest.raises(ValueError):
+        Components.apply_elementwise_func(np.add, AwkdArrays.event_ints, AwkdArrays.empty_event)
+
+
 def test_confine_angle():
     inputs_outputs = [
             (0., 0.),
@@ -322,6 +350,251 @@ def test_EventWise():
             pass
 
 
+def test_write_segment():
+    with TempTestDir("tst") as dir_name:
+        save_name = "segmented.awkd"
+        save_path = os.path.join(dir_name, save_name)
+        big = awkward.fromiter([np.arange(100.)]*50)
+        ew = Components.EventWise(dir_name, save_name)
+        # nothing on disk yet, so this is a full write
+        ew.append(Big=big)
+        size_before = os.path.getsize(save_path)
+        # now a segment should be added
+        ew.append(Small=AwkdArrays.event_ints)
+        with Components.zipfile.ZipFile(save_path) as zip_file:
+            names = zip_file.namelist()
+        assert "seg1~Small~.json" in names
+        assert not any(name.startswith("seg1~Big~") for name in names)
+        assert os.path.getsize(save_path) - size_before < size_before
+        ew_clone = Components.EventWise.from_file(save_path)
+        assert set(ew_clone.columns) == {"Big", "Small"}
+        assert ew_clone.Small.tolist() == AwkdArrays.event_ints.tolist()
+        assert ew_clone.Big.tolist() == big.tolist()
+        # overwrite in the clone, and remove a column
+        ew_clone.append(Small=AwkdArrays.event_floats)
+        ew_clone.remove("Big")
+        ew_clone.append_hyperparameters(Hyper=3)
+        # Big was most of the file, so removing it compacts the file
+        with Components.zipfile.ZipFile(save_path) as zip_file:
+            names = zip_file.namelist()
+        assert not any(name.startswith("Big") for name in names)
+        ew_clone2 = Components.EventWise.from_file(save_path)
+        assert ew_clone2.columns == ["Small"]
+        assert ew_clone2.hyperparameter_columns == ["Hyper"]
+        assert "Big" not in ew_clone2._column_contents
+        assert ew_clone2.Small.tolist() == AwkdArrays.event_floats.tolist()
+        assert ew_clone2.Hyper == 3
+        # renaming and aliases should survive a segment
+        ew_clone2.rename("Small", "Tiny")
+        ew_clone2.add_alias("Wee", "Tiny")
+        ew_clone2.append(Other=AwkdArrays.minus_plus)
+        ew_clone3 = Components.EventWise.from_file(save_path)
+        assert set(ew_clone3.columns) == {"Tiny", "Other", "Wee"}
+        assert ew_clone3.Wee.tolist() == AwkdArrays.event_floats.tolist()
+        # a full write compacts the segments away
+        ew_clone3.write()
+        with Components.zipfile.ZipFile(save_path) as zip_file:
+            names = zip_file.namelist()
+        assert not any(name.startswith("seg") for name in names)
+        assert ew_clone3.Tiny.tolist() == AwkdArrays.event_floats.tolist()
+        ew_clone4 = Components.EventWise.from_file(save_path)
+        assert set(ew_clone4.columns) == {"Tiny", "Other", "Wee"}
+        assert ew_clone4.Other.tolist() == AwkdArrays.minus_plus.tolist()
+        # names with a '-' are still recognised in the file
+        ew_clone4.append(**{"Big-Dash": big})
+        ew_clone4.append(Small=AwkdArrays.event_ints)
+        with Components.zipfile.ZipFile(save_path) as zip_file:
+            names = zip_file.namelist()
+        assert any(name.startswith("seg") for name in names)
+        ew_clone4.append(**{"Big-Dash": big[:, :1]})
+        with Components.zipfile.ZipFile(save_path) as zip_file:
+            names = zip_file.namelist()
+        assert not any(name.startswith("seg") for name in names)
+        assert getattr(Components.EventWise.from_file(save_path), "Big-Dash").tolist() == \
+                big[:, :1].tolist()
+
+
+def test_extend():
+    with TempTestDir("tst") as dir_name:
+        save_name = "extended.awkd"
+        save_path = os.path.join(dir_name, save_name)
+        big = awkward.fromiter([np.arange(100.)]*50)
+        ew = Components.EventWise(dir_name, save_name)
+        # nothing on disk yet, so the column is created by a full write
+        ew.extend(Big=big[:10])
+        ew.extend(Big=big[10:20])
+        assert ew.Big.tolist() == big[:20].tolist()
+        # now only the new events should be written
+        ew = Components.EventWise.from_file(save_path)
+        size_before = os.path.getsize(save_path)
+        ew.extend(Big=big[20:30], New=AwkdArrays.event_ints)
+        with Components.zipfile.ZipFile(save_path) as zip_file:
+            names = zip_file.namelist()
+        last_segment = max(Components.SegmentedContents.parse_key(name.split('.')[0])[0]
+                           for name in names)
+        assert any(name.startswith(f"ext{last_segment}~Big~") for name in names)
+        # a new column has nothing to extend
+        assert any(name.startswith(f"seg{last_segment}~New~") for name in names)
+        assert not any(name.startswith(f"seg{last_segment}~Big~") for name in names)
+        assert os.path.getsize(save_path) - size_before < size_before
+        assert ew.Big.tolist() == big[:30].tolist()
+        ew.extend(Big=big[30:40])
+        ew_clone = Components.EventWise.from_file(save_path)
+        assert ew_clone.Big.tolist() == big[:40].tolist()
+        assert ew_clone.New.tolist() == AwkdArrays.event_ints.tolist()
+        # replacing the column drops the extensions before it
+        ew_clone.append(Big=big[:5])
+        ew_clone.extend(Big=big[5:7])
+        ew_clone2 = Components.EventWise.from_file(save_path)
+        assert ew_clone2.Big.tolist() == big[:7].tolist()
+        # a column that has not been written is extended in memory
+        ew_clone2.append(Small=AwkdArrays.event_floats)
+        ew_clone2._set_contents(Small=AwkdArrays.event_ints)
+        ew_clone2.extend(Small=AwkdArrays.event_floats)
+        expected = AwkdArrays.event_ints.tolist() + AwkdArrays.event_floats.tolist()
+        assert Components.EventWise.from_file(save_path).Small.tolist() == expected
+        # a full write joins the extensions
+        ew_clone3 = Components.EventWise.from_file(save_path)
+        ew_clone3.write()
+        with Components.zipfile.ZipFile(save_path) as zip_file:
+            names = zip_file.namelist()
+        assert not any(name.startswith("ext") for name in names)
+        ew_clone4 = Components.EventWise.from_file(save_path)
+        assert ew_clone4.Big.tolist() == big[:7].tolist()
+        assert ew_clone4.Small.tolist() == expected
+        ew_clone4.append_hyperparameters(Hyper=3)
+        with pytest.raises(KeyError):
+            ew_clone4.extend(Hyper=AwkdArrays.event_ints)
+
+
+def test_max_loaded_bytes():
+    with TempTestDir("tst") as dir_name:
+        save_name = "budget.awkd"
+        save_path = os.path.join(dir_name, save_name)
+        columns = {f"Col{i}": awkward.fromiter([np.arange(10.)*i]*10) for i in range(4)}
+        ew = Components.EventWise(dir_name, save_name)
+        ew.append(**columns)
+        ew = Components.EventWise.from_file(save_path)
+        column_bytes = Components.array_nbytes(columns["Col0"])
+        # without a budget everything stays loaded
+        for name in columns:
+            getattr(ew, name)
+        assert set(ew._loaded_contents) == set(columns)
+        # with a budget only the most recently used are kept
+        ew = Components.EventWise.from_file(save_path)
+        ew.max_loaded_bytes = 2*column_bytes
+        for name in columns:
+            getattr(ew, name)
+        assert list(ew._loaded_contents) == ["Col2", "Col3"]
+        # using a column makes it the last to be released
+        ew.Col2
+        ew.Col0
+        assert list(ew._loaded_contents) == ["Col2", "Col0"]
+        # released columns reload transparently
+        for name, expected in columns.items():
+            assert getattr(ew, name).tolist() == expected.tolist()
+            ew.selected_index = 3
+            assert getattr(ew, name).tolist() == expected[3].tolist()
+            ew.selected_index = None
+        # a budget smaller than one column still keeps the column in use
+        ew.max_loaded_bytes = 1
+        assert ew.Col1.tolist() == columns["Col1"].tolist()
+        assert list(ew._loaded_contents) == ["Col1"]
+
+
+def test_event_chunk():
+    # numpy arrays are just sliced
+    tst.assert_allclose(Components.event_chunk(np.arange(5), 1, 3), [1, 2])
+    chunk = Components.event_chunk(AwkdArrays.event_ints, 1, 2)
+    assert chunk.tolist() == [[3]]
+    tst.assert_allclose(chunk.offsets, [0, 1])
+    tst.assert_allclose(chunk.content, [3])
+    # nested arrays are rebased at every level
+    jets = awkward.fromiter([[[1, 2], [3]], [[4, 5, 6]], [[], [7]]])
+    chunk = Components.event_chunk(jets, 1, 3)
+    assert chunk.tolist() == [[[4, 5, 6]], [[], [7]]]
+    tst.assert_allclose(chunk.offsets, [0, 1, 3])
+    tst.assert_allclose(chunk.content.offsets, [0, 3, 3, 4])
+    tst.assert_allclose(chunk.content.content, [4, 5, 6, 7])
+    # non contiguous arrays are compacted
+    masked = jets[[2, 0]]
+    assert Components.event_chunk(masked, 0, 2).tolist() == masked.tolist()
+    # empty ranges
+    assert Components.event_chunk(jets, 2, 2).tolist() == []
+
+
+def test_iter_chunks():
+    with TempTestDir("tst") as dir_name:
+        n_events = 7
+        values = awkward.fromiter([np.arange(i, dtype=float) for i in range(n_events)])
+        jets = awkward.fromiter([[np.arange(i), [i]] for i in range(n_events)])
+        ew = Components.EventWise(dir_name, "chunks.awkd")
+        ew.append(Values=values, Jets=jets, Event_n=np.arange(n_events))
+        ew.add_alias("Alias", "Values")
+        ew.selected_index = 2  # should be ignored
+        ranges = []
+        for event_range, chunk in ew.iter_chunks(["values", "Jets", "Alias", "Event_n"], 3):
+            ranges.append(event_range)
+            assert set(chunk) == {"values", "Jets", "Alias", "Event_n"}
+            start, stop = event_range
+            assert chunk["values"].tolist() == values[start:stop].tolist()
+            assert chunk["Alias"].tolist() == values[start:stop].tolist()
+            assert chunk["Jets"].tolist() == jets[start:stop].tolist()
+            tst.assert_allclose(chunk["Event_n"], np.arange(start, stop))
+            assert chunk["values"].offsets[0] == 0
+            assert len(chunk["values"].content) == chunk["values"].offsets[-1]
+        assert ranges == [(0, 3), (3, 6), (6, 7)]
+        ranges = [r for r, _ in ew.iter_chunks(["Values"], 2, start=1, stop=4)]
+        assert ranges == [(1, 3), (3, 4)]
+        assert list(ew.iter_chunks([], 2)) == []
+        with pytest.raises(AttributeError):
+            list(ew.iter_chunks(["Missing"], 2))
+
+
+def test_event_view():
+    with TempTestDir("tst") as dir_name:
+        n_events = 20
+        values = awkward.fromiter([np.arange(i, dtype=float) for i in range(n_events)])
+        ids = awkward.fromiter([np.arange(i)[::-1] for i in range(n_events)])
+        ew = Components.EventWise(dir_name, "view.awkd")
+        ew.append(Values=values, Ids=ids, Event_n=np.arange(n_events))
+        ew.append_hyperparameters(Hyper=4)
+        ew.add_alias("Alias", "Values")
+        view = ew.event_view(5)
+        assert view.selected_index == 5
+        assert view.values.tolist() == values[5].tolist()
+        assert view.Alias.tolist() == values[5].tolist()
+        assert view.Event_n == 5
+        assert view.Hyper == 4
+        assert ew.selected_index is None
+        assert "Values" in dir(view)
+        with pytest.raises(AttributeError):
+            view.Missing
+        # cannot be changed
+        with pytest.raises(AttributeError):
+            view.selected_index = 3
+        with pytest.raises(AttributeError):
+            view.Values = values[3]
+        # match indices works as with the eventWise
+        out = view.match_indices("Values", [[0, 1]], [ids[5]])
+        assert out.tolist() == ew.match_indices("Values", [[0, 1]], [ids[5]], event_n=5).tolist()
+        ew.selected_index = None
+        # views can be read from many threads at once
+        from concurrent.futures import ThreadPoolExecutor
+        ew = Components.EventWise.from_file(os.path.join(dir_name, "view.awkd"))
+        ew.max_loaded_bytes = 1  # force columns to be released and reloaded
+        # each eventWise has its own lock
+        assert ew._load_lock is not Components.EventWise(dir_name, "other.awkd")._load_lock
+        def read(event_n):
+            view = ew.event_view(event_n)
+            return view.Event_n, view.Values.tolist(), view.Ids.tolist()
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(read, list(range(n_events))*5))
+        for event_n, found_values, found_ids in results:
+            assert found_values == values[event_n].tolist()
+            assert found_ids == ids[event_n].tolist()
+
+
 # test subsections of eventwise ~~~~~~~~~~~~~~~
 def test_match_indices():
     with TempTestDir("tst") as dir_name:
@@ -360,6 +633,43 @@ def test_match_indices():
         assert len(out.flatten()) == 0
 
 
+def test_match_indices_all():
+    with TempTestDir("tst") as dir_name:
+        np.random.seed(3)
+        n_events = 10
+        values, ids, roots, picks = [], [], [], []
+        for event_n in range(n_events):
+            n_jets = np.random.randint(0, 4)
+            lengths = np.random.randint(1, 5, n_jets)
+            values.append([np.random.rand(l) for l in lengths])
+            ids.append([np.random.permutation(l) + 10*event_n for l in lengths])
+            roots.append([np.random.randint(l) + 10*event_n for l in lengths])
+            picks.append([np.random.randint(-l, l, 2) for l in lengths])
+        ew = Components.EventWise(dir_name, "match.awkd")
+        ew.append(Values=awkward.fromiter(values), Ids=awkward.fromiter(ids),
+                  Roots=awkward.fromiter(roots), Picks=awkward.fromiter(picks))
+        by_id = ew.match_indices_all("Values", "Roots", "Ids")
+        by_position = ew.match_indices_all("Values", "Picks")
+        assert len(by_id) == len(by_position) == n_events
+        for event_n in range(n_events):
+            expected = [[v for v, i in zip(row_v, row_i) if i == r]
+                        for row_v, row_i, r in zip(values[event_n], ids[event_n], roots[event_n])]
+            assert by_id[event_n].tolist() == expected
+            single = ew.match_indices("Values", "Roots", "Ids", event_n=event_n)
+            assert single.tolist() == expected
+            expected = [list(row_v[p]) for row_v, p in zip(values[event_n], picks[event_n])]
+            assert by_position[event_n].tolist() == expected
+            single = ew.match_indices("Values", "Picks", event_n=event_n)
+            assert single.tolist() == expected
+        ew.selected_index = None
+        # the positions can be found directly
+        positions = Components.match_positions([1, 3], awkward.fromiter([[3, 1], [2, 3, 3]]))
+        assert positions.tolist() == [[1], [1, 2]]
+        tst.assert_allclose(Components.match_positions([1, 0]), [1, 0])
+        with pytest.raises(ValueError):
+            ew.match_indices_all("Values", "Roots", awkward.fromiter([[[1]]]))
+
+
 def test_split():
     with TempTestDir("tst") as dir_name:
         # splitting a blank ew should result in only Nones
@@ -469,6 +779,76 @@ def test_fragment():
             tst.assert_allclose(ew0.c4.flatten().flatten(), content_4[idxs].flatten().flatten())
 
 
+def test_fragment_virtual():
+    with TempTestDir("tst") as dir_name:
+        save_name = "test.awkd"
+        ew = Components.EventWise(dir_name, save_name)
+        n_events = 12
+        content_1 = awkward.fromiter(np.arange(n_events))
+        content_2 = awkward.fromiter([np.random.rand(np.random.randint(1, 50)) for _ in range(n_events)])
+        unsplit = awkward.fromiter([1, 2, 3])
+        ew.append(Event_n=content_1, c2=content_2, Unsplit=unsplit)
+        ew.append_hyperparameters(Hyper=5)
+        ew.add_alias("Alias", "C2")
+        paths = ew.fragment('Event_n', n_fragments=3, virtual=True)
+        results = []
+        for i, path in enumerate(paths):
+            # the parts hold no copy of the data
+            assert os.path.getsize(path) < os.path.getsize(os.path.join(dir_name, save_name))
+            ew0 = Components.EventWise.from_file(path)
+            idxs = slice(i*4, (i+1)*4)
+            tst.assert_allclose(ew0.Event_n, content_1[idxs])
+            assert ew0.C2.tolist() == content_2[idxs].tolist()
+            assert ew0.Hyper == 5
+            if i == 0:
+                assert ew0.Unsplit.tolist() == unsplit.tolist()
+                assert ew0.Alias.tolist() == content_2[idxs].tolist()
+            else:
+                assert "Unsplit" not in ew0.columns
+            # results are written to the part only
+            result = awkward.fromiter([[i]*j for j in range(4)])
+            results += result.tolist()
+            ew0.append(Result=result)
+            ew0 = Components.EventWise.from_file(path)
+            assert ew0.Result.tolist() == result.tolist()
+            tst.assert_allclose(ew0.Event_n, content_1[idxs])
+        assert "Result" not in Components.EventWise.from_file(os.path.join(dir_name, save_name)).columns
+        # recombining reads from the original file
+        recombined = Components.EventWise.combine(os.path.split(paths[0])[0], "test")
+        tst.assert_allclose(recombined.Event_n, content_1)
+        assert recombined.C2.tolist() == content_2.tolist()
+        assert recombined.Result.tolist() == results
+        assert recombined.Unsplit.tolist() == unsplit.tolist()
+        assert not any(key in recombined._column_contents
+                       for key in Components.BackedContents.backing_keys)
+        # a full write keeps a part virtual, and removed columns stay removed
+        ew0 = Components.EventWise.from_file(paths[1])
+        ew0.remove("C2")
+        ew0.write()
+        on_disk = awkward.load(paths[1])
+        assert "backing_path" in on_disk
+        assert "Event_n" not in on_disk
+        ew0 = Components.EventWise.from_file(paths[1])
+        assert "C2" not in ew0.columns
+        tst.assert_allclose(ew0.Event_n, content_1[4:8])
+        assert ew0.Result.tolist() == results[4:8]
+        # a part that fails to write does not leave its claimed file
+        ew = Components.EventWise.from_file(os.path.join(dir_name, save_name))
+        with unittest.mock.patch.object(Components.EventWise, "write", side_effect=OSError):
+            with pytest.raises(OSError):
+                ew.split([0], [4], "Event_n", "broken", virtual=True)
+        assert os.listdir(os.path.join(dir_name, "test_broken")) == []
+
+
+def test_claim_file_name():
+    with TempTestDir("tst") as dir_name:
+        name_format = "part{}.awkd"
+        names = [Components.claim_file_name(dir_name, name_format) for _ in range(3)]
+        assert names == ["part0.awkd", "part1.awkd", "part2.awkd"]
+        os.remove(os.path.join(dir_name, "part1.awkd"))
+        assert Components.claim_file_name(dir_name, name_format) == "part1.awkd"
+
+
 def test_split_unfinished():
     with TempTestDir("tst") as dir_name:
         save_name = "test.awkd"
@@ -582,6 +962,60 @@ def test_combine():
         assert len(os.listdir(dir_name)) == 1
 
 
+def test_combine_segments():
+    with TempTestDir("tst") as dir_name:
+        n_events = 30
+        event_n = np.arange(n_events)
+        values = awkward.fromiter([np.random.rand(i%4, 20) for i in range(n_events)])
+        ew = Components.EventWise(dir_name, "test.awkd")
+        ew.append(Event_n=event_n, Values=values)
+        paths = ew.split([20, 0], [30, 20], "Event_n", "cat")
+        os.remove(os.path.join(dir_name, "test.awkd"))
+        # add a column to each fragment as a segment
+        extra = awkward.fromiter([[1, 2], [3]])
+        for path in paths:
+            fragment = Components.EventWise.from_file(path)
+            fragment.append(Extra=extra)
+            with Components.zipfile.ZipFile(path) as zip_file:
+                assert "seg1~Extra~.json" in zip_file.namelist()
+        subdir_name = os.path.split(paths[0])[0]
+        recombined = Components.EventWise.combine(subdir_name, "test", check_for_dups=True)
+        # the fragment with the lowest Event_n comes first
+        tst.assert_allclose(recombined.Event_n, event_n)
+        assert recombined.Values.tolist() == values.tolist()
+        # duplicated content is only added once
+        assert recombined.Extra.tolist() == extra.tolist()
+        recombined = Components.EventWise.from_file(os.path.join(recombined.dir_name,
+                                                                 recombined.save_name))
+        assert set(recombined.columns) == {"Event_n", "Values", "Extra"}
+        assert recombined.Values.tolist() == values.tolist()
+
+
+def test_concatenate_events():
+    parts = [AwkdArrays.jet_ints, AwkdArrays.empty, AwkdArrays.empty_jet]
+    joined = Components.concatenate_events(parts)
+    expected = AwkdArrays.jet_ints.tolist() + AwkdArrays.empty_jet.tolist()
+    assert joined.tolist() == expected
+    tst.assert_allclose(joined.offsets, [0, 2, 3, 5, 6])
+    tst.assert_allclose(Components.concatenate_events([np.arange(2), np.arange(3)]),
+                        [0, 1, 0, 1, 2])
+    assert len(Components.concatenate_events([])) == 0
+    # views only contribute their own events
+    joined = Components.concatenate_events([AwkdArrays.event_floats[1:], AwkdArrays.event_floats])
+    assert joined.tolist() == [[.3], [.1, .2], [.3]]
+
+
+def test_content_hash():
+    assert (Components.content_hash(AwkdArrays.event_ints) ==
+            Components.content_hash(awkward.fromiter([[1, 2], [3]])))
+    # same content, different structure
+    assert (Components.content_hash(AwkdArrays.event_ints) !=
+            Components.content_hash(awkward.fromiter([[1], [2, 3]])))
+    assert (Components.content_hash(AwkdArrays.event_ints) !=
+            Components.content_hash(AwkdArrays.event_floats))
+    assert Components.content_hash("dog") == Components.content_hash("dog")
+
+
 def test_recursive_combine():
     with TempTestDir("tst") as dir_name:
         dir_name += '/'
@@ -599,12 +1033,31 @@ def test_recursive_combine():
         more_paths = resplit.fragment("C1", n_fragments=3)
         os.remove(paths[0])  # so it isn't added twice
         dir_name = os.path.split(paths[0])[0]
+        # hidden directories are not fragments
+        hidden_dir = os.path.join(os.path.split(more_paths[0])[0],
+                                  Components.logs_dir_name(save_name))
+        os.makedirs(os.path.join(hidden_dir, "Jet"))
         recombined = Components.EventWise.recursive_combine(dir_name)
+        assert not os.path.exists(hidden_dir)
         recombined = Components.EventWise.from_file(recombined)
         # tere in no order garentee, so get the new order from c1
         order = np.argsort(recombined.c1)
         tst.assert_allclose(recombined.c1[order], content_1)
         tst.assert_allclose(recombined.c2[order], content_2)
+    with TempTestDir("tst") as dir_name:
+        # hidden directories that are not logs are left alone
+        ew = Components.EventWise(dir_name, save_name)
+        ew.append(c1=content_1, c2=content_2)
+        paths = ew.split([0, 5], [5, 10], "c1", "dog")
+        os.remove(os.path.join(dir_name, save_name))
+        fragment_dir = os.path.split(paths[0])[0]
+        other_dir = os.path.join(fragment_dir, ".git")
+        os.makedirs(other_dir)
+        with open(os.path.join(other_dir, "HEAD"), 'w') as other_file:
+            other_file.write("ref: refs/heads/main\n")
+        with pytest.raises(OSError):
+            Components.EventWise.recursive_combine(fragment_dir)
+        assert os.path.exists(os.path.join(other_dir, "HEAD"))
 
 # out of eventwise ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
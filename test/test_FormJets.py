@@ -2,6 +2,7 @@ from numpy import testing as tst
 import pytest
 import warnings
 import os
+import sys
 from ipdb import set_trace as st
 import numpy as np
 from tree_tagger import Components, FormJets
@@ -9,7 +10,9 @@ from tools import TempTestDir
 from test_Components import AwkdArrays
 import awkward
 import itertools
+import functools
 import scipy.spatial
+import scipy.sparse
 
 
 def test_knn():
@@ -55,6 +58,55 @@ def test_knn():
     tst.assert_allclose(FormJets.knn(distances, 2),  expected)
 
 
+def test_Custom_KMeans():
+    def distance2(points_a, points_b, row_a, row_b):
+        return scipy.spatial.distance.cdist(points_a, points_b, metric='sqeuclidean')
+    kmeans = FormJets.Custom_KMeans(distance2)
+    points = np.random.random((5, 2))
+    with pytest.raises(ValueError):
+        kmeans.fit(6, points)
+    with pytest.raises(ValueError):
+        kmeans.fit(0, points)
+    # well seperated groups should always be found
+    np.random.seed(2)
+    centers = np.array([[0., 0.], [10., 0.], [0., 10.], [10., 10.]])
+    groups = np.repeat(np.arange(4), 20)
+    points = centers[groups] + np.random.normal(0, 0.5, (80, 2))
+    score, allocations, centeroids = kmeans.fit(4, points)
+    # each group has one allocation
+    for group in range(4):
+        assert len(set(allocations[groups == group])) == 1
+    assert len(set(allocations)) == 4
+    for group in range(4):
+        tst.assert_allclose(centeroids[allocations[groups == group][0]],
+                            np.mean(points[groups == group], axis=0))
+    expected_score = np.sum((points - centeroids[allocations])**2)
+    tst.assert_allclose(score, expected_score)
+    # kmeans++ never starts two centeroids on the same point
+    kmeans.points, kmeans.n_points = points, len(points)
+    starts = kmeans._inital_centroids(4, 30)
+    assert starts.shape == (30, 4, 2)
+    for start in starts:
+        assert len(np.unique(start, axis=0)) == 4
+    # even when some points are duplicated
+    kmeans.points = np.repeat(points[:3], 2, axis=0)
+    kmeans.n_points = 6
+    starts = kmeans._inital_centroids(3, 30)
+    for start in starts:
+        assert len(np.unique(start, axis=0)) == 3
+    # a point where the distance is nan can go anywhere
+    def angular2(points_a, points_b, row_a, row_b):
+        return scipy.spatial.distance.cdist(points_a, points_b, metric='cosine')
+    kmeans = FormJets.Custom_KMeans(angular2)
+    points = np.array([[1., 0.], [1., 0.1], [0., 1.], [0.1, 1.], [0., 0.]])
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        score, allocations, centeroids = kmeans.fit(2, points)
+    assert allocations[0] == allocations[1]
+    assert allocations[2] == allocations[3]
+    assert allocations[0] != allocations[2]
+
+
 # Consider adding tests for jets created with pseudorapidity instead of rapidity.
 # if you ever use that functionality again....
 
@@ -642,6 +694,34 @@ def test_set_roots():
     tst.assert_allclose(jets.root_jetInputIdxs, [1, 2])
 
 
+def test_tables():
+    n_rows = 4
+    floats = np.arange(n_rows*8, dtype=float).reshape((n_rows, 8))
+    floats[:, 3] = 1000.  # energy
+    jets = make_simple_jets(floats, {}, FormJets.Spectral)
+    ints = np.array(jets._ints)
+    floats = np.array(jets._floats)
+    # int columns are views that cannot be written to
+    tst.assert_allclose(jets.InputIdx, ints[:, jets._InputIdx_col])
+    with pytest.raises(ValueError):
+        jets.InputIdx[0] = 10
+    # moving to the back keeps the order of the other rows
+    jets._move_to_back(1)
+    order = [0, 2, 3, 1]
+    tst.assert_allclose(jets._ints, ints[order])
+    tst.assert_allclose(jets._floats, floats[order])
+    # append past the preallocated space
+    for i in range(2*n_rows):
+        jets._append_row(ints[0], floats[0])
+    assert len(jets) == 3*n_rows
+    tst.assert_allclose(jets._ints[:n_rows], ints[order])
+    tst.assert_allclose(jets._floats[n_rows:], np.tile(floats[0], (2*n_rows, 1)))
+    # replacing the tables changes the length
+    jets._set_tables(ints[:2], floats[:2])
+    assert len(jets) == 2
+    tst.assert_allclose(jets._floats, floats[:2])
+
+
 def test_idx_from_inpIdx():
     n_rows = 4
     ints = np.zeros((n_rows, 5), dtype=int) -1
@@ -654,6 +734,28 @@ def test_idx_from_inpIdx():
         assert i == jets.idx_from_inpIdx(inpidx)
     with pytest.raises(ValueError):
         jets.idx_from_inpIdx(7)
+    # the lookup follows rows as they move
+    jets._move_to_back(0)
+    assert jets.idx_from_inpIdx(0) == n_rows - 1
+    assert jets.idx_from_inpIdx(5) == 0
+    # new ids are never reused
+    jets._append_row(jets._ints[0], jets._floats[0])
+    assert jets.idx_from_inpIdx(5) == 0
+    assert jets._next_id == 6
+    # moves and merges keep the lookup the same as reading the rows again
+    for _ in range(20):
+        n_rows = len(jets._ints)
+        if np.random.rand() > 0.5:
+            jets._move_to_back(np.random.randint(n_rows))
+        else:
+            remove_index, replace_index = np.random.choice(n_rows, 2, replace=False)
+            new_ints = [-1]*len(jets.int_columns)
+            new_ints[jets._InputIdx_col] = jets._next_id
+            jets._place_merged(remove_index, replace_index, new_ints, jets._floats[0])
+        found = [jets.idx_from_inpIdx(i) for i in jets._ints[:, jets._InputIdx_col]]
+        jets._row_of_id = None
+        expected = [jets.idx_from_inpIdx(i) for i in jets._ints[:, jets._InputIdx_col]]
+        assert found == expected
 
 
 def test_get_decendants():
@@ -760,8 +862,8 @@ def internal_recalculate_one(jets, param_dict):
     float_array = np.array(jets._floats)
     # duplicate the floats and ints
     int_array[:, jets._InputIdx_col] += len(jets)
-    jets._ints += int_array.tolist()
-    jets._floats += float_array.tolist()
+    jets._set_tables(np.vstack((jets._ints, int_array)),
+                     np.vstack((jets._floats, float_array)))
     jets.currently_avalible = jets._get_currently_avalible()
     # calculate the distances
     jets._set_distances()
@@ -799,6 +901,81 @@ def test_Traditional_internal():
     # as Pseudojet should not be directly created and Traditional lack support for all options
     apply_internal(FormJets.Traditional, internal_recalculate_one)
 
+
+def test_Traditional_nearest_neighbours():
+    np.random.seed(3)
+    n_rows = 30
+    floats = np.zeros((n_rows, 8))
+    floats[:, 0] = np.random.exponential(5., n_rows)
+    floats[:, 1] = np.random.uniform(-2., 2., n_rows)
+    floats[:, 2] = np.random.uniform(-np.pi, np.pi, n_rows)
+    floats[:, 3] = 2*floats[:, 0]*np.cosh(floats[:, 1])
+    # some exact duplicates make ties
+    floats[5:8] = floats[0]
+    for row in floats:
+        SimpleClusterSamples.fill_linear(row)
+    for jet_params in [{'DeltaR': 0.4, 'ExpofPTMultiplier': -1},
+                       {'DeltaR': 1., 'ExpofPTMultiplier': 1, 'PhyDistance': 'invarient'},
+                       {'DeltaR': 0.8, 'ExpofPTMultiplier': 0, 'PhyDistance': 'taxicab'}]:
+        jets = make_simple_jets(floats, jet_params, FormJets.Traditional)
+        while jets.currently_avalible > 0:
+            # the cached neighbours must pick the first minimum of the full matrix
+            distances2 = jets._distances2
+            expected_row, expected_column = np.unravel_index(np.argmin(distances2),
+                                                             distances2.shape)
+            nearest = jets._nearest_slot[jets._active_slots]
+            found_column = np.searchsorted(jets._active_slots, nearest[expected_row])
+            assert found_column == expected_column
+            tst.assert_allclose(jets._nearest_distance2[jets._active_slots],
+                                np.min(distances2, axis=1))
+            jets._step_assign_parents()
+
+
+def test_Traditional_tiled():
+    class TiledTraditional(FormJets.Traditional):
+        min_tiled_inputs = 2
+    np.random.seed(4)
+    n_rows = 60
+    floats = np.zeros((n_rows, 8))
+    floats[:, 0] = np.random.exponential(5., n_rows)
+    floats[:, 1] = np.random.uniform(-2., 2., n_rows)
+    # put some close to the phi boundary
+    floats[:, 2] = np.random.uniform(-np.pi, np.pi, n_rows)
+    floats[:10, 2] = np.pi - np.random.uniform(0, 0.3, 10)
+    floats[10:20, 2] = -np.pi + np.random.uniform(0, 0.3, 10)
+    floats[:, 3] = 2*floats[:, 0]*np.cosh(floats[:, 1])
+    floats[25:28] = floats[20]
+    for row in floats:
+        SimpleClusterSamples.fill_linear(row)
+    for jet_params in [{'DeltaR': 0.4, 'ExpofPTMultiplier': -1},
+                       {'DeltaR': 1., 'ExpofPTMultiplier': 1},
+                       {'DeltaR': 0.8, 'ExpofPTMultiplier': 0, 'PhyDistance': 'taxicab'}]:
+        tiled = make_simple_jets(floats, jet_params, TiledTraditional, assign=True)
+        assert tiled._tiled
+        dense = make_simple_jets(floats, jet_params, FormJets.Traditional, assign=True)
+        assert not dense._tiled
+        tst.assert_allclose(tiled._ints, dense._ints)
+        tst.assert_allclose(tiled._floats, dense._floats)
+        assert tiled.root_jetInputIdxs == dense.root_jetInputIdxs
+    # the dense distances are not made when tiled
+    tiled = make_simple_jets(floats, {'DeltaR': 0.4}, TiledTraditional)
+    with pytest.raises(ValueError):
+        tiled._distances2
+    # the heap gives the same slot as an argmin over the nearest distances
+    for jet_class in [TiledTraditional, FormJets.Traditional]:
+        jets = make_simple_jets(floats, {'DeltaR': 0.8}, jet_class)
+        jets._set_nearest(jets._active_slots[[3, 7]], jets._active_slots[[4, 8]], np.nan)
+        while jets.currently_avalible:
+            active = jets._active_slots
+            expected = active[np.argmin(jets._nearest_distance2[active])]
+            assert jets._closest_slot() == expected
+            jets._step_assign_parents()
+    # distances that don't only depend on rapidity and phi cannot be tiled
+    jets = make_simple_jets(floats, {'PhyDistance': 'invarient'}, TiledTraditional)
+    assert not jets._tiled
+    jets = make_simple_jets(floats, {'ExpofPTFormat': 'Luclus'}, TiledTraditional)
+    assert not jets._tiled
+
 # IterativeCone ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 def test_select_seed():
@@ -1009,6 +1186,45 @@ def test_write_event():
         assert not jets.check_params(ew)
 
 
+def test_JetColumnBuilder():
+    jet_params = {'DeltaR': 0.4}
+    jet_class = FormJets.Traditional
+    events = {}
+    for event_n, n_rows in [(1, 4), (2, 1), (4, 6), (5, 3)]:
+        floats = np.random.random((n_rows, 8))
+        floats[:, -1] = 0.
+        for row in floats:
+            SimpleClusterSamples.fill_angular(row)
+        events[event_n] = make_simple_jets(floats, jet_params, jet_class, assign=True).split()
+    jet_name = events[1][0].jet_name
+    # events 0 and 3 have no jets, event 6 is padding at the end
+    with TempTestDir("tst") as dir_name:
+        ew = Components.EventWise(dir_name, "tmp.awkd")
+        expected = None
+        builder = FormJets.JetColumnBuilder(jet_class, jet_name, initial_rows=2)
+        for event_n in range(7):
+            jets = events.get(event_n, [])
+            expected = jet_class.create_updated_dict(jets, jet_name, event_n, ew, expected)
+            builder.add_event(event_n, jets)
+        found = builder.columns()
+        assert set(found.keys()) == set(expected.keys())
+        for name in expected:
+            assert len(found[name]) == 7
+            assert found[name].tolist() == awkward.fromiter(expected[name]).tolist(), name
+        # starting from an eventWise gives the same columns
+        first = FormJets.JetColumnBuilder(jet_class, jet_name)
+        for event_n in range(3):
+            first.add_event(event_n, events.get(event_n, []))
+        ew.append(**first.columns())
+        builder = FormJets.JetColumnBuilder(jet_class, jet_name, ew)
+        assert builder.n_events == 3
+        for event_n in range(3, 7):
+            builder.add_event(event_n, events.get(event_n, []))
+        found = builder.columns()
+        for name in expected:
+            assert found[name].tolist() == awkward.fromiter(expected[name]).tolist(), name
+
+
 # TODO add test for removing correct eigenvector when there are seperated graph components
 def test_set_eigenspace_distances():
     for jet_class in [FormJets.Spectral, FormJets.Indicator]:
@@ -1377,6 +1593,263 @@ def test_conductance_check():
     assert new_conductance > 0
 
 
+def test_Spectral_running_stopping_conditions():
+    class FullMeanDistance(FormJets.Spectral):
+        def _mean_distance_over(self):
+            mean_distance = self._distances2[np.tril_indices_from(self._distances2, -1)]
+            if len(mean_distance) == 0:
+                return False
+            return np.nanmean(np.sqrt(mean_distance)) > self.DeltaR
+    np.random.seed(6)
+    n_rows = 25
+    floats = np.random.random((n_rows, 8))
+    for row in floats:
+        SimpleClusterSamples.fill_angular(row)
+    for jet_class in [FormJets.Spectral, FormJets.SpectralMean]:
+        # the mean distance starts a little over 0.4,
+        # and grows as pseudojets merge
+        for delta_r in [0.3, 0.5, 0.7]:
+            jet_params = {'StoppingCondition': 'meandistance', 'DeltaR': delta_r,
+                          'NumEigenvectors': 4}
+            class Expected(FullMeanDistance, jet_class):
+                pass
+            jets = make_simple_jets(floats, jet_params, jet_class)
+            expected = make_simple_jets(floats, jet_params, Expected)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                while jets.currently_avalible:
+                    jets._step_assign_parents()
+                    expected._step_assign_parents()
+                    if jets.currently_avalible > 1:
+                        lower_triangle = np.tril_indices_from(jets._distances2, -1)
+                        found = FormJets.Spectral._distance_sums(
+                                jets._distances2[lower_triangle])
+                        tst.assert_allclose(jets._distance_stats, found)
+            tst.assert_allclose(jets._ints, expected._ints)
+            tst.assert_allclose(jets._floats, expected._floats)
+    # the conductance of a merge should match summing the affinity between sets
+    for jet_params in [{'StoppingCondition': 'conductance'},
+                       {'StoppingCondition': 'conductance', 'AffinityCutoff': ('knn', 4)}]:
+        jets = make_simple_jets(floats, jet_params, FormJets.Spectral)
+        all_inputs = set(range(n_rows))
+        for _ in range(10):
+            for idx_a, idx_b in itertools.combinations(range(jets.currently_avalible), 2):
+                inside = jets._conductance_sets[idx_a].union(jets._conductance_sets[idx_b])
+                outside = list(all_inputs - inside)
+                inside = list(inside)
+                numerator = np.sum(jets._initial_affinity[inside][:, outside])
+                denominator = min(np.sum(jets._floats[inside, jets._Size_col]),
+                                  jets._total_size)
+                to_remove, conductance = jets._conductance_check(idx_a, idx_b)
+                tst.assert_allclose(conductance, numerator/denominator)
+                expected_remove = [idx for idx in (idx_a, idx_b)
+                                   if jets._current_conductance[idx] < numerator/denominator]
+                assert to_remove == expected_remove
+            try:
+                jets._step_assign_parents()
+            except RuntimeError:
+                break  # the conductance stopping condition can reach the diagonal
+
+
+def test_Spectral_sparse_affinity():
+    class SparseSpectral(FormJets.Spectral):
+        min_sparse_inputs = 2
+    np.random.seed(5)
+    n_rows = 60
+    floats = np.zeros((n_rows, 8))
+    floats[:, 0] = np.random.exponential(5., n_rows)
+    floats[:, 1] = np.random.uniform(-2., 2., n_rows)
+    # put some close to the phi boundary
+    floats[:, 2] = np.random.uniform(-np.pi, np.pi, n_rows)
+    floats[:10, 2] = np.pi - np.random.uniform(0, 0.3, 10)
+    floats[10:20, 2] = -np.pi + np.random.uniform(0, 0.3, 10)
+    floats[:, 3] = 2*floats[:, 0]*np.cosh(floats[:, 1])
+    for row in floats:
+        SimpleClusterSamples.fill_linear(row)
+    for jet_params in [{'AffinityCutoff': ('knn', 3)},
+                       {'AffinityCutoff': ('knn', 5), 'AffinityType': 'exponent2',
+                        'PhyDistance': 'taxicab', 'Laplacien': 'symmetric'},
+                       {'AffinityCutoff': ('distance', 1.), 'ExpofPTMultiplier': 1,
+                        'ExpofPTPosition': 'eigenspace'},
+                       {'AffinityCutoff': ('distance', 0.8), 'PhyDistance': 'taxicab',
+                        'StoppingCondition': 'meandistance'}]:
+        jet_params = {'DeltaR': 0.5, **jet_params}
+        # same eigensolver on both, so the clustering should match exactly
+        sparse = make_simple_jets(floats, jet_params, SparseSpectral, eigensolver='dense')
+        assert scipy.sparse.issparse(sparse._affinity)
+        dense = make_simple_jets(floats, jet_params, FormJets.Spectral)
+        assert not scipy.sparse.issparse(dense._affinity)
+        tst.assert_allclose(sparse._affinity.toarray(), dense._affinity)
+        sparse.assign_parents()
+        dense.assign_parents()
+        tst.assert_allclose(sparse._ints, dense._ints)
+        tst.assert_allclose(sparse._floats, dense._floats)
+    jet_params = {'AffinityCutoff': ('distance', 0.8), 'StoppingCondition': 'conductance'}
+    sparse = make_simple_jets(floats, jet_params, SparseSpectral)
+    dense = make_simple_jets(floats, jet_params, FormJets.Spectral)
+    tst.assert_allclose(sparse._current_conductance, dense._current_conductance)
+    tst.assert_allclose(sparse._conductance_check(0, 1)[1], dense._conductance_check(0, 1)[1])
+    # affinities that need every distance are left dense
+    for jet_params in [{'AffinityCutoff': ('knn', 3), 'AffinityType': 'linear'},
+                       {'AffinityCutoff': ('knn', 3), 'PhyDistance': 'normed'},
+                       {'AffinityCutoff': ('distance', 1.), 'ExpofPTMultiplier': 1},
+                       {'AffinityCutoff': None}]:
+        jets = make_simple_jets(floats, jet_params, SparseSpectral)
+        assert not scipy.sparse.issparse(jets._affinity)
+
+
+def test_Spectral_eigensolver():
+    class SparseSpectral(FormJets.Spectral):
+        min_sparse_inputs = 2
+    np.random.seed(7)
+    n_rows = 80
+    floats = np.zeros((n_rows, 8))
+    floats[:, 0] = np.random.exponential(5., n_rows)
+    floats[:, 1] = np.random.uniform(-2., 2., n_rows)
+    floats[:, 2] = np.random.uniform(-np.pi, np.pi, n_rows)
+    floats[:, 3] = 2*floats[:, 0]*np.cosh(floats[:, 1])
+    for row in floats:
+        SimpleClusterSamples.fill_linear(row)
+    with pytest.raises(ValueError):
+        make_simple_jets(floats, {}, FormJets.Spectral, eigensolver='qr')
+    for jet_class, jet_params in [(SparseSpectral, {'AffinityCutoff': ('knn', 5)}),
+                                  (SparseSpectral, {'AffinityCutoff': ('distance', 1.5),
+                                                    'Laplacien': 'symmetric'}),
+                                  (FormJets.Spectral, {'Eigenspace': 'normalised'}),
+                                  (FormJets.SpectralFull, {'AffinityCutoff': ('knn', 5)})]:
+        jet_params = {'DeltaR': 0.8, 'NumEigenvectors': 4, **jet_params}
+        dense = make_simple_jets(floats, jet_params, jet_class, eigensolver='dense')
+        # by default a sparse affinity gets a sparse laplacien and lanczos
+        default = make_simple_jets(floats, jet_params, jet_class)
+        sparse = scipy.sparse.issparse(default._affinity)
+        assert sparse == (jet_class is SparseSpectral)
+        assert default._chosen_eigensolver() == ('lanczos' if sparse else 'dense')
+        assert scipy.sparse.issparse(default._laplacien()) == sparse
+        tst.assert_allclose(default.eigenvalues, dense.eigenvalues, atol=1e-6)
+        for eigensolver in ['lanczos', 'lobpcg']:
+            jets = make_simple_jets(floats, jet_params, jet_class, eigensolver=eigensolver)
+            tst.assert_allclose(jets.eigenvalues, dense.eigenvalues, atol=1e-6)
+            # eigenvectors are only defined up to sign, but distances are not
+            tst.assert_allclose(jets._distances2, dense._distances2, atol=1e-5)
+            if jet_class is FormJets.SpectralFull:
+                # a few steps reuse the previous eigenvectors
+                for _ in range(3):
+                    jets._step_assign_parents()
+                    assert jets._warm_start.shape[0] == jets.currently_avalible
+                dense_steps = make_simple_jets(floats, jet_params, jet_class,
+                                               eigensolver='dense')
+                for _ in range(3):
+                    dense_steps._step_assign_parents()
+                tst.assert_allclose(jets.eigenvalues[-1], dense_steps.eigenvalues[-1],
+                                    atol=1e-6)
+                tst.assert_allclose(jets._ints, dense_steps._ints)
+    # too few points for the iterative eigensolvers falls back to dense
+    jet_params = {'NumEigenvectors': 4}
+    dense = make_simple_jets(floats[:6], jet_params, FormJets.Spectral, eigensolver='dense')
+    for eigensolver in ['lanczos', 'lobpcg']:
+        jets = make_simple_jets(floats[:6], jet_params, FormJets.Spectral,
+                                eigensolver=eigensolver)
+        tst.assert_allclose(jets.eigenvalues, dense.eigenvalues)
+
+
+def test_SpectralCache():
+    with TempTestDir("tst") as dir_name:
+        cache = FormJets.SpectralCache(dir_name, max_bytes=np.inf)
+        key = FormJets.SpectralCache.make_key('a', np.arange(3), 1.)
+        assert key == FormJets.SpectralCache.make_key('a', np.arange(3), 1.)
+        assert key != FormJets.SpectralCache.make_key('a', np.arange(3.), 1.)
+        assert key != FormJets.SpectralCache.make_key('a', np.arange(3), 2.)
+        assert cache.get(key) is None
+        dense = np.random.random((4, 4))
+        cache.put(key, **FormJets.SpectralCache.pack_matrix(dense))
+        found = FormJets.SpectralCache.unpack_matrix(cache.get(key))
+        tst.assert_allclose(found, dense)
+        sparse = scipy.sparse.random(5, 5, density=0.3, format='csr')
+        cache.put('sparse', **FormJets.SpectralCache.pack_matrix(sparse))
+        found = FormJets.SpectralCache.unpack_matrix(cache.get('sparse'))
+        assert scipy.sparse.issparse(found)
+        tst.assert_allclose(found.toarray(), sparse.toarray())
+        # make the cache just big enough for two entries
+        for i, name in enumerate(['first', 'second', 'third']):
+            cache.put(name, values=np.full(100, i))
+            os.utime(os.path.join(dir_name, name + ".npz"), (i, i))
+        entry_size = os.path.getsize(os.path.join(dir_name, "first.npz"))
+        cache.max_bytes = 2*entry_size
+        cache.get('first')  # now second is the least recently used
+        cache.put('fourth', values=np.full(100, 3))
+        assert cache.get('second') is None
+        assert cache.get('third') is None
+        tst.assert_allclose(cache.get('first')['values'], 0)
+        tst.assert_allclose(cache.get('fourth')['values'], 3)
+        assert sorted(os.listdir(dir_name)) == ['first.npz', 'fourth.npz']
+
+
+def test_Spectral_stage_cache():
+    class SparseSpectral(FormJets.Spectral):
+        min_sparse_inputs = 2
+    np.random.seed(3)
+    n_rows = 30
+    floats = np.zeros((n_rows, 8))
+    floats[:, 0] = np.random.exponential(5., n_rows)
+    floats[:, 1] = np.random.uniform(-2., 2., n_rows)
+    floats[:, 2] = np.random.uniform(-np.pi, np.pi, n_rows)
+    floats[:, 3] = 2*floats[:, 0]*np.cosh(floats[:, 1])
+    for row in floats:
+        SimpleClusterSamples.fill_linear(row)
+    with TempTestDir("tstcache") as dir_name:
+        jet_params = {'DeltaR': 0.5, 'NumEigenvectors': 5, 'AffinityCutoff': ('knn', 4)}
+        expected = make_simple_jets(floats, jet_params, FormJets.Spectral, assign=True)
+        # the first time fills the cache, the second reads from it
+        for n_entries in [4, 4]:
+            jets = make_simple_jets(floats, jet_params, FormJets.Spectral, assign=True,
+                                    stage_cache=dir_name)
+            assert len(os.listdir(dir_name)) == n_entries
+            tst.assert_allclose(jets._ints, expected._ints)
+            tst.assert_allclose(jets._floats, expected._floats)
+            tst.assert_allclose(jets.eigenvalues[0], expected.eigenvalues[0])
+        # DeltaR only changes the clustering
+        jet_params['DeltaR'] = 0.8
+        expected = make_simple_jets(floats, jet_params, FormJets.Spectral, assign=True)
+        jets = make_simple_jets(floats, jet_params, FormJets.Spectral, assign=True,
+                                stage_cache=dir_name)
+        assert len(os.listdir(dir_name)) == 4
+        tst.assert_allclose(jets._ints, expected._ints)
+        # a new number of eigenvectors reuses the laplacien
+        jet_params['NumEigenvectors'] = 3
+        expected = make_simple_jets(floats, jet_params, FormJets.Spectral, assign=True)
+        jets = make_simple_jets(floats, jet_params, FormJets.Spectral, assign=True,
+                                stage_cache=dir_name)
+        assert len(os.listdir(dir_name)) == 5
+        tst.assert_allclose(jets._ints, expected._ints)
+        # a new affinity reuses the physical distances
+        jet_params['AffinityType'] = 'exponent2'
+        expected = make_simple_jets(floats, jet_params, FormJets.Spectral, assign=True)
+        jets = make_simple_jets(floats, jet_params, FormJets.Spectral, assign=True,
+                                stage_cache=dir_name)
+        assert len(os.listdir(dir_name)) == 8
+        tst.assert_allclose(jets._ints, expected._ints)
+        # sparse affinities are cached without physical distances
+        jet_params['Sigma'] = 0.5
+        expected = make_simple_jets(floats, jet_params, SparseSpectral, assign=True)
+        for _ in range(2):
+            jets = make_simple_jets(floats, jet_params, SparseSpectral, assign=True,
+                                    stage_cache=dir_name)
+            assert len(os.listdir(dir_name)) == 11
+            assert scipy.sparse.issparse(jets._affinity) or jets.currently_avalible == 0
+            tst.assert_allclose(jets._ints, expected._ints)
+        # SpectralFull only caches the starting stages,
+        # which are shared with the last jets
+        jets = make_simple_jets(floats, jet_params, FormJets.SpectralFull, assign=True,
+                                stage_cache=dir_name)
+        assert len(os.listdir(dir_name)) == 11
+        expected = make_simple_jets(floats, jet_params, FormJets.SpectralFull, assign=True)
+        tst.assert_allclose(jets._ints, expected._ints)
+        # checkpoints are used instead of the cache
+        jets = make_simple_jets(floats, {}, FormJets.Spectral, checkpoints={},
+                                stage_cache=dir_name)
+        assert len(os.listdir(dir_name)) == 11
+
+
 # Indicator ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 def test_Indicator_step_assign_parents():
     # check results have correct form
@@ -1430,6 +1903,53 @@ def test_merge_complete_jets():
         children = jets.get_decendants(True, jetInputIdx=root)
         assert set(children) in merge_sets
 
+def brute_force_sweep_scores(jets):
+    """ score every cut of the avaliable pseudojets by summing the affinity from scratch """
+    n_trials = len(jets._avaliable) - 1
+    avaliable_idxs = jets._order[jets._avaliable]
+    set_idxs = set(jets._order)
+    scores = np.full(n_trials, np.nan)
+    post_flip = False
+    for count_left in range(1, n_trials+1):
+        if post_flip:
+            in_group = avaliable_idxs[count_left:]
+        else:
+            in_group = avaliable_idxs[:count_left]
+        out_group = list(set_idxs - set(in_group))
+        numerator = np.sum(jets._affinity[out_group][:, in_group])
+        if jets.Laplacien == 'unnormalised':
+            post_flip = count_left > 0.5*n_trials
+            denominator = abs(count_left - post_flip*n_trials)
+        else:
+            denominator = np.sum(jets._floats[in_group, jets._Size_col])
+            if not post_flip and denominator > 0.5*jets._total_size:
+                post_flip = True
+                denominator = jets._total_size - denominator
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores[count_left-1] = numerator/denominator
+    scores[np.isinf(scores)] = np.nan
+    return scores
+
+
+def test_Splitting_sweep_scores():
+    np.random.seed(4)
+    n_rows = 15
+    floats = np.random.random((n_rows, 8))
+    for row in floats:
+        SimpleClusterSamples.fill_angular(row)
+    # a high MaxCutScore makes several jets, so later sweeps cut against assigned pseudojets
+    for jet_params in [{}, {'MaxCutScore': 100.}, {'Laplacien': 'symmetric', 'MaxCutScore': 100.},
+                       {'AffinityCutoff': ('knn', 2), 'MaxCutScore': 100.}]:
+        jets = make_simple_jets(floats, jet_params, FormJets.Splitting)
+        while jets._avaliable:
+            expected = brute_force_sweep_scores(jets)
+            avaliable = list(jets._avaliable)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                jets._step_assign_parents()
+            tst.assert_allclose(jets._scores[avaliable[:-1]], expected, atol=1e-12)
+        assert jets.currently_avalible == 0
+
+
 #def test_Splitting_internal():
 #    apply_internal(FormJets.Splitting,
 #                   internal_Splitting_set_distances,
@@ -1669,6 +2189,43 @@ def test_filter_pt_eta():
             tst.assert_allclose(out, expected)
 
 
+def test_jet_input_mask():
+    n_events = 6
+    counts = [0, 3, 1, 5, 2, 4]
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    n_particles = offsets[-1]
+    def per_event(values):
+        return awkward.JaggedArray.fromoffsets(offsets, values)
+    pt = np.random.random(n_particles)
+    pt[::4] = np.nan
+    pz = np.random.normal(0, 3, n_particles)
+    track = np.random.randint(-1, 2, n_particles)
+    tower = np.random.randint(-1, 2, n_particles)
+    n_children = np.random.randint(0, 2, n_particles)
+    children = awkward.JaggedArray.fromcounts(n_children, np.ones(np.sum(n_children), dtype=int))
+    contents = {"PT": per_event(pt), "Pz": per_event(pz),
+                "Particle_Track": per_event(track), "Particle_Tower": per_event(tower),
+                "Children": awkward.JaggedArray.fromoffsets(offsets, children)}
+    with TempTestDir("jet_input_mask") as dir_name:
+        ew = Components.EventWise(dir_name, "test.awkd")
+        ew.append(**contents)
+        pt_eta_cut = functools.partial(FormJets.filter_pt_eta, min_pt=0.2, max_eta=1.)
+        filter_sets = [[FormJets.filter_obs], [FormJets.filter_ends],
+                       [FormJets.filter_pt_eta], [pt_eta_cut],
+                       [FormJets.filter_ends, FormJets.filter_obs, pt_eta_cut]]
+        for filter_functions in filter_sets:
+            # wrapping the filters hides the vectorised versions
+            per_event_filters = [lambda *args, f=f: f(*args) for f in filter_functions]
+            for start, stop in [(0, n_events), (2, 5), (3, 3)]:
+                event_offsets, mask = FormJets.jet_input_mask(ew, filter_functions,
+                                                              start, stop)
+                tst.assert_allclose(event_offsets, offsets[start:stop+1] - offsets[start])
+                expected_offsets, expected = FormJets.jet_input_mask(ew, per_event_filters,
+                                                                     start, stop)
+                tst.assert_allclose(event_offsets, expected_offsets)
+                assert mask.tolist() == expected.tolist()
+
+
 def test_create_JetInputs():
     with TempTestDir("create_JetInputs") as dir_name:
         name = "test.awkd"
@@ -1787,6 +2344,207 @@ def test_produce_summary():
 #            clustering_algorithm(empty_ew, make_jets4, compare_distance=False)
 
 
+# speaks the binary protocol of applyFastJet --binary,
+# the lowest energy pair is joined until a third of the inputs remain,
+# and rows are written in the same order as applyFastJet
+fake_applyFastJet = """#!{python}
+import struct, sys
+import numpy as np
+def row(momentum):
+    px, py, pz, e = momentum
+    return [np.hypot(px, py), 0.5*np.log((e + pz)/(e - pz)), np.arctan2(py, px), e, px, py, pz]
+def cluster(inputs):
+    nodes = [(int(i), momentum, []) for i, *momentum in inputs]
+    while len(nodes) > max(1, len(inputs)//3):
+        nodes.sort(key=lambda node: node[1][3])
+        first, second = nodes.pop(0), nodes.pop(0)
+        nodes.append((-1, np.add(first[1], second[1]), [first, second]))
+    ints, floats = [], []
+    for root in sorted(nodes, key=lambda node: -np.hypot(*node[1][:2])):
+        ints.append([len(ints), root[0], -1, -1, -1])
+        floats.append(row(root[1]))
+        stack = [(root, len(ints) - 1)]
+        while stack:
+            node, row_n = stack.pop()
+            for col, piece in zip([3, 4], node[2]):
+                ints[row_n][col] = len(ints)
+                ints.append([len(ints), piece[0], ints[row_n][0], -1, -1])
+                floats.append(row(piece[1]))
+                stack.append((piece, len(ints) - 1))
+    return ints, floats
+if sys.argv[1:] != ["--binary"] or not {binary}:
+    if len(sys.argv) != 3:
+        print("The arguments should be <deltaR> <algorithm_num>")
+        sys.exit(1)
+    print(" **send input file to stdin", flush=True)
+    inputs = [[float(x) for x in line.split()] for line in sys.stdin if line.strip()]
+    ints, floats = cluster(inputs)
+    print(" **output file starts here")
+    algorithm_name = ["kt_algorithm", "antikt_algorithm", "cambridge_algorithm"][int(sys.argv[2])]
+    print("# deltaR=" + sys.argv[1] + " " + algorithm_name +
+          " Columns; pseudojet_id InputIdx parent_id child1_id child2_id")
+    for line in ints:
+        print(*line)
+    print("# PT Rapidity Phi Energy Px Py Pz")
+    for line in floats:
+        print(*line)
+    sys.exit(0)
+while True:
+    header = sys.stdin.buffer.read(16)
+    if len(header) < 16:
+        break
+    n_events, algorithm_num, DeltaR = struct.unpack("=iid", header)
+    offsets = np.frombuffer(sys.stdin.buffer.read(8*(n_events + 1)), dtype=np.int64)
+    inputs = np.frombuffer(sys.stdin.buffer.read(8*5*offsets[-1])).reshape((-1, 5))
+    ints, floats, row_offsets = [], [], [0]
+    for start, stop in zip(offsets[:-1], offsets[1:]):
+        event_ints, event_floats = cluster(inputs[start:stop])
+        ints += event_ints
+        floats += event_floats
+        row_offsets.append(len(ints))
+    sys.stdout.buffer.write(np.array(row_offsets, dtype=np.int64).tobytes())
+    sys.stdout.buffer.write(np.array(ints, dtype=np.int32).tobytes())
+    sys.stdout.buffer.write(np.array(floats, dtype=float).tobytes())
+    sys.stdout.buffer.flush()
+"""
+
+
+def write_fake_applyFastJet(dir_name, binary=True):
+    program_path = os.path.join(dir_name, "applyFastJet")
+    with open(program_path, 'w') as program:
+        program.write(fake_applyFastJet.format(python=sys.executable, binary=binary))
+    os.chmod(program_path, 0o755)
+    return program_path
+
+
+def test_FastJetBridge():
+    with TempTestDir("fastjet") as dir_name:
+        program_path = write_fake_applyFastJet(dir_name)
+        ew = Components.EventWise(dir_name, "test.awkd")
+        n_inputs = 4
+        floats = np.random.random((n_inputs, 8))
+        floats[:, 3] += 2.  # energy
+        set_JetInputs(ew, floats)
+        ew.selected_index = 0
+        with FormJets.FastJetBridge(program_path) as bridge:
+            jets = FormJets.run_FastJet(ew, 0.4, -1, bridge=bridge)
+            pid = bridge._process.pid
+            assert jets.DeltaR == 0.4
+            assert jets.ExpofPTMultiplier == -1
+            # everything is joined into one jet
+            assert len(jets) == 2*n_inputs - 1
+            assert len(jets.root_jetInputIdxs) == 1
+            root = jets.idx_from_inpIdx(jets.root_jetInputIdxs[0])
+            tst.assert_allclose(jets._floats[root, jets._Energy_col], np.sum(floats[:, 3]))
+            assert sorted(jets.get_decendants(jetInputIdx=jets.root_jetInputIdxs[0])) == \
+                list(range(n_inputs))
+            # many events go through the same process
+            header, fast_ints, fast_floats = bridge.cluster(np.empty((0, 5)), 0.4, 0)
+            assert "kt_algorithm" in header
+            assert fast_ints.shape == (0, 5)
+            assert fast_floats.shape == (0, 7)
+            again = FormJets.run_FastJet(ew, 0.4, -1, bridge=bridge)
+            assert bridge._process.pid == pid
+            tst.assert_allclose(again._floats, jets._floats)
+            # if the process dies it is restarted
+            bridge._process.kill()
+            bridge._process.wait()
+            again = FormJets.run_FastJet(ew, 0.4, 0, bridge=bridge)
+            assert bridge._process.pid != pid
+            tst.assert_allclose(again._floats, jets._floats)
+        assert bridge._process is None
+
+
+def test_run_FastJet_batch():
+    with TempTestDir("fastjet") as dir_name:
+        program_path = write_fake_applyFastJet(dir_name)
+        ew = Components.EventWise(dir_name, "test.awkd")
+        columns = [name.replace("Pseudojet", "JetInputs") for name in FormJets.PseudoJet.float_columns
+                   if "Distance" not in name and "Size" not in name]
+        events = []
+        for n_inputs in [0, 1, 2, 7, 20, 3]:
+            floats = np.random.random((n_inputs, len(columns)))
+            floats[:, 3] += 2.  # energy
+            events.append(floats)
+        contents = {name: awkward.fromiter([event[:, i] for event in events])
+                    for i, name in enumerate(columns)}
+        contents["JetInputs_SourceIdx"] = awkward.fromiter([np.arange(len(event))
+                                                            for event in events])
+        ew.append(**contents)
+        with FormJets.FastJetBridge(program_path) as bridge:
+            found = FormJets.run_FastJet_batch(ew, 0.4, 1, start=1, bridge=bridge)
+            # the same as clustering one event at a time
+            expected = None
+            for event_n in range(1, len(events)):
+                ew.selected_index = event_n
+                jets = FormJets.run_FastJet(ew, 0.4, 1, bridge=bridge).split()
+                expected = FormJets.Traditional.create_updated_dict(jets, "FastJet", event_n,
+                                                                    ew, expected)
+        assert set(found.keys()) == set(expected.keys())
+        for name in expected:
+            assert len(found[name]) == len(events) - 1
+            assert found[name].tolist() == awkward.fromiter(expected[name][1:]).tolist(), name
+        # jets have a root and at least one input
+        assert found["FastJet_Rank"][-1].tolist() != []
+        ew.selected_index = None
+        assert found["FastJet_InputIdx"][0].tolist() == [[0]]
+
+
+def test_FastJetBridge_text():
+    events = [np.random.random((n_inputs, 4)) + [0., 0., 0., 2.]
+              for n_inputs in [3, 0, 1, 7]]
+    input_offsets = np.cumsum([0] + [len(event) for event in events])
+    inputs = np.vstack([np.column_stack((np.arange(len(event)), event))
+                        for event in events])
+    results = {}
+    for binary in [True, False]:
+        with TempTestDir("fastjet") as dir_name:
+            program_path = write_fake_applyFastJet(dir_name, binary)
+            with FormJets.FastJetBridge(program_path) as bridge:
+                results[binary] = bridge.cluster_batch(inputs, input_offsets, 0.4, 1)
+                assert bridge.binary == binary
+                # a build without --binary is never launched with it again
+                if not binary:
+                    assert bridge._process is None
+                    results["single"] = bridge.cluster(inputs[:3], 0.4, 1)
+    header, fast_ints, fast_floats, row_offsets = results[False]
+    assert header == results[True][0]
+    assert "antikt_algorithm" in header
+    tst.assert_allclose(row_offsets, results[True][3])
+    tst.assert_allclose(fast_ints, results[True][1])
+    tst.assert_allclose(fast_floats, results[True][2])
+    single_header, single_ints, single_floats = results["single"]
+    assert single_header == header
+    tst.assert_allclose(single_ints, fast_ints[:row_offsets[1]])
+    tst.assert_allclose(single_floats, fast_floats[:row_offsets[1]])
+
+
+def test_applyFastJet_binary():
+    program_path = os.path.join(os.path.dirname(FormJets.__file__), "applyFastJet")
+    with FormJets.FastJetBridge(program_path) as bridge:
+        bridge._start()
+        if not bridge.binary:
+            pytest.skip(f"{program_path} cannot be run with --binary")
+        # two events, the first has two well separated inputs,
+        # the second has two inputs close enough to join
+        inputs = np.array([[0, 10., 0., 0., 10.],
+                           [1, -10., 0., 0., 10.],
+                           [0, 10., 0., 0., 10.],
+                           [1, 10., 0.1, 0., 10.1]])
+        header, fast_ints, fast_floats, row_offsets = \
+            bridge.cluster_batch(inputs, [0, 2, 4], 0.4, 1)
+    # the fastjet banner must not be in the reply
+    assert row_offsets.tolist() == [0, 2, 5]
+    assert fast_ints.shape == (5, 5)
+    assert fast_floats.shape == (5, 7)
+    assert sorted(fast_ints[:2, 1]) == [0, 1]
+    tst.assert_allclose(fast_floats[:2, 3], 10.)
+    # the joined jet is the root of the second event
+    assert fast_ints[2, 2] == -1
+    assert sorted(fast_ints[3:, 1]) == [0, 1]
+    tst.assert_allclose(fast_floats[2, 3:], [20.1, 20., 0.1, 0.])
+
+
 def test_cluster_multiapply():
     # event 1
     jet_class = FormJets.SpectralMean
@@ -1849,6 +2607,188 @@ def test_cluster_multiapply():
             multi_ints2 = np.vstack([jet._ints for jet in jets2])
             multi_floats2 = np.vstack([jet._floats for jet in jets2])
             SimpleClusterSamples.match_ints_floats(end_int2, end_float2, multi_ints2, multi_floats2)
+            # a stage cache should not change the jets
+            jet_name = "CachedJet"
+            cache_dir = os.path.join(dir_name, "cache")
+            finished = FormJets.cluster_multiapply(eventWise, jet_class, jet_params,
+                                                   jet_name, silent=True,
+                                                   stage_cache=cache_dir)
+            assert finished
+            assert len(os.listdir(cache_dir)) > 0
+            for event_n, end_ints, end_floats in [(0, end_int1, end_float1),
+                                                  (1, end_int2, end_float2)]:
+                jets = jet_class.multi_from_file(file_name, event_n, jet_name)
+                multi_ints = np.vstack([jet._ints for jet in jets])
+                multi_floats = np.vstack([jet._floats for jet in jets])
+                SimpleClusterSamples.match_ints_floats(end_ints, end_floats,
+                                                       multi_ints, multi_floats)
+
+
+def test_ClusterResultLog():
+    jet_class = FormJets.Traditional
+    jet_params = {'DeltaR': 0.4}
+    columns = [name.replace("Pseudojet", "JetInputs") for name in FormJets.PseudoJet.float_columns
+               if "Distance" not in name]
+    events = []
+    for n_rows in [4, 0, 5, 3]:
+        floats = np.random.random((n_rows, 8))
+        floats[:, -1] = 0.
+        for row in floats:
+            SimpleClusterSamples.fill_angular(row)
+        events.append(floats)
+    contents = {name: awkward.fromiter([floats[:, i] for floats in events])
+                for i, name in enumerate(columns)}
+    contents["JetInputs_SourceIdx"] = awkward.fromiter([np.arange(len(floats))
+                                                        for floats in events])
+    with TempTestDir("tst") as dir_name:
+        eventWise = Components.EventWise(dir_name, "tmp.awkd")
+        eventWise.append(**contents)
+        file_name = os.path.join(dir_name, "tmp.awkd")
+        # all in one go
+        finished = FormJets.cluster_multiapply(eventWise, jet_class, jet_params,
+                                               "WholeJet", silent=True)
+        assert finished
+        # one event at a time, starting again after each batch
+        for stop in range(1, len(events) + 1):
+            eventWise = Components.EventWise.from_file(file_name)
+            result_log = FormJets.ClusterResultLog(eventWise, "LogJet")
+            assert result_log.stop == stop - 1
+            finished = FormJets.cluster_multiapply(eventWise, jet_class, jet_params,
+                                                   "LogJet", batch_length=1, silent=True)
+            assert finished == (stop == len(events))
+            if not finished:
+                # the batches wait in the log
+                assert "LogJet_Energy" not in eventWise.columns
+                assert len(result_log.batches()) == stop
+                # not visible as a fragment directory
+                assert [name for name in os.listdir(dir_name)
+                        if not name.startswith('.')] == ["tmp.awkd"]
+        assert not os.path.exists(result_log.logs_dir)
+        eventWise = Components.EventWise.from_file(file_name)
+        for name in eventWise.columns:
+            if name.startswith("WholeJet_"):
+                found = getattr(eventWise, name.replace("WholeJet", "LogJet"))
+                assert found.tolist() == getattr(eventWise, name).tolist(), name
+        # compacting every batch gives the same result
+        for _ in events:
+            FormJets.cluster_multiapply(eventWise, jet_class, jet_params, "EveryJet",
+                                        batch_length=1, silent=True, compact_every=1)
+            assert FormJets.ClusterResultLog(eventWise, "EveryJet").batches() == []
+        assert eventWise.EveryJet_Energy.tolist() == eventWise.WholeJet_Energy.tolist()
+        # batches left behind by an interrupted compaction are ignored
+        result_log = FormJets.ClusterResultLog(eventWise, "EveryJet")
+        os.makedirs(result_log.dir_name, exist_ok=True)
+        awkward.save(os.path.join(result_log.dir_name, result_log.batch_format.format(0, 1)),
+                     {"EveryJet_Energy": eventWise.EveryJet_Energy[:1]}, mode='w')
+        assert result_log.batches() == []
+        assert result_log.stop == len(events)
+        result_log.compact()
+        assert not os.path.exists(result_log.dir_name)
+        assert eventWise.EveryJet_Energy.tolist() == eventWise.WholeJet_Energy.tolist()
+        # an interrupted run can leave a half written batch,
+        # or a batch that was compacted but not removed, neither should be used
+        eventWise = Components.EventWise.from_file(file_name)
+        FormJets.cluster_multiapply(eventWise, jet_class, jet_params, "ResumeJet",
+                                    batch_length=2, silent=True, compact_every=1)
+        result_log = FormJets.ClusterResultLog(eventWise, "ResumeJet")
+        assert result_log.n_stored == 2
+        os.makedirs(result_log.dir_name, exist_ok=True)
+        temp_path = os.path.join(result_log.dir_name,
+                                 result_log.temp_format.format(os.getpid() + 1))
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(b"PK\x03\x04 half a batch")
+        # overlaps the compacted events, and has the wrong events in it
+        awkward.save(os.path.join(result_log.dir_name, result_log.batch_format.format(1, 3)),
+                     {"ResumeJet_Energy": eventWise.WholeJet_Energy[:2]}, mode='w')
+        assert result_log.stop == 2
+        eventWise = Components.EventWise.from_file(file_name)
+        finished = FormJets.cluster_multiapply(eventWise, jet_class, jet_params, "ResumeJet",
+                                               batch_length=1, silent=True)
+        assert not finished
+        result_log = FormJets.ClusterResultLog(eventWise, "ResumeJet")
+        assert [batch[:2] for batch in result_log.batches()] == [(2, 3)]
+        finished = FormJets.cluster_multiapply(eventWise, jet_class, jet_params, "ResumeJet",
+                                               batch_length=1, silent=True)
+        assert finished
+        assert not os.path.exists(result_log.logs_dir)
+        eventWise = Components.EventWise.from_file(file_name)
+        for name in eventWise.columns:
+            if name.startswith("WholeJet_"):
+                found = getattr(eventWise, name.replace("WholeJet", "ResumeJet"))
+                assert found.tolist() == getattr(eventWise, name).tolist(), name
+    # compacting only writes the new events, so the bytes written
+    # by each compaction don't grow with the events already stored
+    n_events = 12
+    floats = np.random.random((n_events*4, 8))
+    floats[:, -1] = 0.
+    for row in floats:
+        SimpleClusterSamples.fill_angular(row)
+    contents = {name: awkward.JaggedArray.fromcounts([4]*n_events, floats[:, i])
+                for i, name in enumerate(columns)}
+    contents["JetInputs_SourceIdx"] = awkward.fromiter([np.arange(4)]*n_events)
+    with TempTestDir("tst") as dir_name:
+        eventWise = Components.EventWise(dir_name, "tmp.awkd")
+        eventWise.append(**contents)
+        file_name = os.path.join(dir_name, "tmp.awkd")
+        written = []
+        for _ in range(n_events):
+            size_before = os.path.getsize(file_name)
+            FormJets.cluster_multiapply(eventWise, jet_class, jet_params, "GrowJet",
+                                        batch_length=1, silent=True, compact_every=1)
+            written.append(os.path.getsize(file_name) - size_before)
+        assert len(eventWise.GrowJet_Energy) == n_events
+        with Components.zipfile.ZipFile(file_name) as zip_file:
+            names = zip_file.namelist()
+        extensions = {name.split('~')[0] for name in names
+                      if name.startswith("ext") and "~GrowJet_Energy~" in name}
+        assert len(extensions) == n_events - 1
+        # the first compaction makes the columns
+        assert min(written[1:]) > 0
+        assert max(written[1:]) < 2*min(written[1:])
+
+
+def test_read_trees():
+    jet_class = FormJets.Traditional
+    jet_params = {'DeltaR': 0.4}
+    columns = [name.replace("Pseudojet", "JetInputs") for name in FormJets.PseudoJet.float_columns
+               if "Distance" not in name]
+    events = []
+    for n_rows in [4, 0, 5, 3]:
+        floats = np.random.random((n_rows, 8))
+        floats[:, -1] = 0.
+        for row in floats:
+            SimpleClusterSamples.fill_angular(row)
+        events.append(floats)
+    contents = {name: awkward.fromiter([floats[:, i] for floats in events])
+                for i, name in enumerate(columns)}
+    contents["JetInputs_SourceIdx"] = awkward.fromiter([np.arange(len(floats))
+                                                        for floats in events])
+    with TempTestDir("tst") as dir_name:
+        eventWise = Components.EventWise(dir_name, "tmp.awkd")
+        eventWise.append(**contents)
+        jet_name = "TreeJet"
+        FormJets.cluster_multiapply(eventWise, jet_class, jet_params, jet_name, silent=True)
+        trees, jet_offsets, row_offsets = jet_class.read_trees(eventWise, jet_name, 1)
+        assert len(jet_offsets) == len(events)
+        assert trees.dtype.names[:5] == ("InputIdx", "Parent", "Child1", "Child2", "Rank")
+        for event_n in range(1, len(events)):
+            jets = jet_class.multi_from_file(eventWise, event_n, jet_name)
+            assert jet_offsets[event_n] - jet_offsets[event_n-1] == len(jets)
+            for jet_n, jet in enumerate(jets, jet_offsets[event_n-1]):
+                rows = trees[row_offsets[jet_n]:row_offsets[jet_n+1]]
+                for col_num, name in enumerate(jet.int_columns):
+                    tst.assert_allclose(rows[name.split('_', 1)[1]], jet._ints[:, col_num])
+                for col_num, name in enumerate(jet.float_columns):
+                    tst.assert_allclose(rows[name.split('_', 1)[1]], jet._floats[:, col_num])
+        # only some float columns
+        trees, jet_offsets, row_offsets = jet_class.read_trees(eventWise, jet_name, 0, 2,
+                                                               float_columns=["PT"])
+        assert trees.dtype.names[5:] == ("PT",)
+        assert len(trees) == row_offsets[-1] == len(eventWise.TreeJet_PT[:2].flatten().flatten())
+        # an empty range
+        trees, jet_offsets, row_offsets = jet_class.read_trees(eventWise, jet_name, 1, 2)
+        assert len(trees) == 0
+        assert jet_offsets.tolist() == [0, 0]
 
 
 def test_check_hyperparameters():
@@ -1910,6 +2850,66 @@ def test_get_jet_names_params():
             assert found_paramsB[name] == jet_paramsB[name]
 
 
+def test_JetRegistry():
+    paramsA = {'DeltaR': 0.4, 'AffinityCutoff': ('knn', 3), 'ExpofPTPosition': 'input',
+               'StoppingCondition': None}
+    paramsB = {**paramsA, 'DeltaR': 0.8}
+    paramsC = {**paramsA, 'AffinityCutoff': None}
+    # equal parameters have equal hashes
+    assert FormJets.jet_parameter_hash(paramsA) == \
+            FormJets.jet_parameter_hash({**paramsA, 'AffinityCutoff': ['knn', 3.]})
+    assert FormJets.jet_parameter_hash({'NumEigenvectors': 2}) == \
+            FormJets.jet_parameter_hash({'NumEigenvectors': 2.})
+    assert FormJets.jet_parameter_hash({'DeltaR': np.nan}) == \
+            FormJets.jet_parameter_hash({'DeltaR': np.nan})
+    assert FormJets.jet_parameter_hash(paramsA) != FormJets.jet_parameter_hash(paramsB)
+    with TempTestDir("tst") as dir_name:
+        eventWise = Components.EventWise(dir_name, "tmp.awkd")
+        registry = FormJets.JetRegistry.of(eventWise)
+        assert FormJets.JetRegistry.of(eventWise) is registry
+        registry.register("AAJet", paramsA)
+        registry.register("BBJet", paramsB)
+        # jets written without a hash are still found
+        eventWise.append_hyperparameters(**{"CCJet_" + k: v for k, v in paramsC.items()})
+        eventWise.append_hyperparameters(**{"DDJet_" + k: v for k, v in paramsA.items()})
+        assert FormJets.get_jet_params(eventWise, "CCJet") == paramsC
+        assert registry.names_for(paramsA) == ["AAJet", "DDJet"]
+        assert registry.names_for({'DeltaR': 0.4}) == []
+        assert registry.find({'DeltaR': 0.4}) == ["AAJet", "CCJet", "DDJet"]
+        assert registry.find({'DeltaR': 0.4, 'AffinityCutoff': None}) == ["CCJet"]
+        assert registry.find({'DeltaR': 0.6}) == []
+        # numbers only need to be close, as np.isclose
+        assert registry.find({'DeltaR': 0.4000001}) == ["AAJet", "CCJet", "DDJet"]
+        assert registry.find({'DeltaR': 0.39999999}) == ["AAJet", "CCJet", "DDJet"]
+        assert registry.find({'DeltaR': 0.4001}) == []
+        assert registry.names_for({**paramsA, 'DeltaR': 0.4000001}) == []
+        # pairs need an equal first element and a close second element
+        assert registry.find({'AffinityCutoff': ('knn', 3.00000001)}) == \
+                ["AAJet", "BBJet", "DDJet"]
+        assert registry.find({'AffinityCutoff': ('distance', 3)}) == []
+        assert registry.find({'AffinityCutoff': ('knn', 4)}) == []
+        assert registry.find({'StoppingCondition': None, 'AffinityCutoff': None}) == ["CCJet"]
+        assert FormJets.check_for_jet(eventWise, {'DeltaR': 0.4},
+                                      pottentials=["AAJet", "BBJet", "CCJet"]) == ["AAJet", "CCJet"]
+        assert FormJets.check_for_jet(eventWise, {'DeltaR': 0.4}, name_start="DD",
+                                      pottentials=["AAJet", "DDJet"]) == ["DDJet"]
+        # changes to the hyperparameters are followed
+        eventWise.remove_prefix("AAJet")
+        eventWise.rename_prefix("BBJet", "EEJet")
+        assert registry.names_for(paramsA) == ["DDJet"]
+        assert registry.names_for(paramsB) == ["EEJet"]
+        assert registry.find({'DeltaR': 0.8}) == ["EEJet"]
+        eventWise.append_hyperparameters(**{"CCJet_DeltaR": 0.8})
+        assert registry.find({'DeltaR': 0.8}) == ["CCJet", "EEJet"]
+        eventWise.write()
+        # the hashes are kept in the file
+        eventWise = Components.EventWise.from_file(os.path.join(dir_name, "tmp.awkd"))
+        assert "EEJet" + FormJets.JetRegistry.hash_suffix in eventWise.hyperparameter_columns
+        registry = FormJets.JetRegistry.of(eventWise)
+        assert registry.names_for(paramsB) == ["EEJet"]
+        assert registry.find({'DeltaR': 0.8, 'AffinityCutoff': None}) == ["CCJet"]
+
+
 def test_filter_jets():
     # will need 
     # Jet_Parent, Jet_Child1, Jet_PT
@@ -260,8 +260,12 @@ def test_remove_partial():
         # calling it with the wrong total length should yeild an error
         with pytest.raises(AssertionError):
             ParallelFormJets.remove_partial(paths, n_events+1)
+        # batches of an unfinished jet in a log
+        result_log = FormJets.ClusterResultLog(ew, unfinished_jet)
+        result_log.write_batch(0, 1, CatJet_InputIdx=awkward.fromiter([0.]))
         # calling it with the right length should remove the right jet
         ParallelFormJets.remove_partial(paths, n_events)
+        assert not os.path.exists(result_log.logs_dir)
         ew = Components.EventWise.from_file(paths[0])
         for name in ["Event_n", finished_jet+"_InputIdx", "JetInputs_InputIdx"]:
             tst.assert_allclose(params[name], getattr(ew, name))
@@ -272,7 +276,17 @@ def test_remove_partial():
         for name in ["Event_n", finished_jet+"_InputIdx", "JetInputs_InputIdx"]:
             tst.assert_allclose(params[name], getattr(ew, name))
         assert unfinished_jet+"_InputIdx" not in ew.columns
-
+        # virtual fragments stay virtual
+        fragment_paths = ew.fragment('Event_n', n_fragments=2, virtual=True)
+        for path in fragment_paths:
+            fragment = Components.EventWise.from_file(path)
+            fragment.append(**{unfinished_jet + '_InputIdx': awkward.fromiter([0.])})
+        ParallelFormJets.remove_partial(fragment_paths, n_events//2)
+        for path in fragment_paths:
+            assert "Event_n" not in awkward.load(path)
+            ew = Components.EventWise.from_file(path)
+            assert unfinished_jet+"_InputIdx" not in ew.columns
+            assert len(ew.Event_n) == n_events//2
 
 
 def test_recombine_eventWise():
@@ -1,7 +1,14 @@
 """Low level components, format apes that of root """
+import hashlib
 import pickle
 import warnings
 import os
+import sys
+import re
+import threading
+import zipfile
+import shutil
+from collections.abc import MutableMapping
 from ipdb import set_trace as st
 import awkward
 import uproot
@@ -131,6 +138,160 @@ def _apply_array_func(func, depth, *nested):
         return out
 
 
+def flat_structure(nested):
+    """
+    Separate a jagged array into the offsets at each level
+    and the flat content at the bottom.
+
+    Parameters
+    ----------
+    nested : awkward array or numpy array
+        object to be separated
+
+    Returns
+    -------
+    offsets : list of numpy arrays
+        the offsets of each level of the array, outermost first,
+        each starting from 0
+    content : numpy array
+        all the objects at the bottom of the array
+
+    """
+    offsets = []
+    if isinstance(nested, awkward.JaggedArray):
+        nested = event_chunk(nested, 0, len(nested))
+    while isinstance(nested, awkward.JaggedArray):
+        offsets.append(nested.offsets)
+        nested = nested.content
+    content = np.asarray(nested)
+    if content.dtype == object:
+        raise TypeError("Content is not a regular array")
+    return offsets, content
+
+
+def restore_structure(offsets, content):
+    """
+    Inverse of flat_structure.
+
+    Parameters
+    ----------
+    offsets : list of numpy arrays
+        the offsets of each level of the array, outermost first
+    content : numpy array
+        all the objects at the bottom of the array
+
+    Returns
+    -------
+    nested : awkward array or numpy array
+        jagged array with the given offsets
+    """
+    for level_offsets in offsets[::-1]:
+        content = awkward.JaggedArray.fromoffsets(level_offsets, content)
+    return content
+
+
+def apply_elementwise_func(func, *nested):
+    """
+    Apply an elementwise function to objects with the same nested structure.
+    The function is called once on the flat content of the objects,
+    and the structure is restored around the result.
+    Only correct for functions whose output at each position
+    depends only on the inputs at that position, otherwise see apply_array_func.
+
+    Parameters
+    ----------
+    func : callable
+        function to be applied, should accept as many
+        arguments as there are nested objects provided,
+        may return a tuple of results
+    *nested: nested iterables
+        objects to apply the function to
+
+    Returns
+    -------
+    : nested iterables or tuple of nested iterables
+        objects after function application
+    
+    """
+    try:
+        structures, flats = zip(*[flat_structure(x) for x in nested])
+    except TypeError:  # the objects are not regular arrays
+        return apply_array_func(func, *nested)
+    offsets = structures[0]
+    for other in structures[1:]:
+        if len(other) != len(offsets) or \
+           not all(np.array_equal(a, b) for a, b in zip(offsets, other)):
+            raise ValueError("Inputs do not have the same structure")
+    result = func(*flats)
+    if isinstance(result, tuple):
+        return tuple(restore_structure(offsets, part) for part in result)
+    return restore_structure(offsets, result)
+
+
+def concatenate_events(parts):
+    """
+    Join arrays end to end along the event axis.
+
+    Parameters
+    ----------
+    parts : list of awkward arrays or numpy arrays
+        arrays to join, in order
+
+    Returns
+    -------
+    joined : awkward array or numpy array
+        all events of all the parts
+    """
+    parts = [part for part in parts if len(part)]
+    if not parts:
+        return awkward.fromiter([])
+    try:
+        structures = [flat_structure(part) for part in parts]
+    except TypeError:  # the objects are not regular arrays
+        return awkward.fromiter(parts).flatten()
+    depth = len(structures[0][0])
+    if any(len(offsets) != depth for offsets, _ in structures):
+        return awkward.fromiter(parts).flatten()
+    joined_offsets = []
+    for level in range(depth):
+        pieces = [np.zeros(1, dtype=int)]
+        shift = 0
+        for offsets, _ in structures:
+            pieces.append(offsets[level][1:] + shift)
+            shift += offsets[level][-1]
+        joined_offsets.append(np.concatenate(pieces))
+    content = np.concatenate([content for _, content in structures])
+    return restore_structure(joined_offsets, content)
+
+
+def content_hash(array):
+    """
+    Summarise the content of an array in a short string,
+    to spot duplicates without keeping copies of them.
+
+    Parameters
+    ----------
+    array : awkward array or object
+        object to be hashed
+
+    Returns
+    -------
+    digest : string
+        the same for arrays with the same structure and content
+    """
+    try:
+        offsets, content = flat_structure(array)
+    except TypeError:  # the objects are not regular arrays
+        return hashlib.sha1(pickle.dumps(array)).hexdigest()
+    hasher = hashlib.sha1()
+    for level_offsets in offsets:
+        hasher.update(str(len(level_offsets)).encode())
+        hasher.update(np.ascontiguousarray(level_offsets).tobytes())
+    hasher.update(f"{content.dtype.str}{content.shape}".encode())
+    hasher.update(np.ascontiguousarray(content).tobytes())
+    return hasher.hexdigest()
+
+
 def confine_angle(angle):
     """
     Confine angle x, s.t. -pi <= x < pi
@@ -215,6 +376,61 @@ def safe_convert(cls, string):
     else: return cls(string)
 
 
+def event_chunk(array, start, stop):
+    """
+    Take a contiguous range of events from an array.
+    At every level of a jagged array the result has offsets that start
+    from 0 and content that holds only the selected range.
+    The content is a view, nothing large is copied.
+
+    Parameters
+    ----------
+    array : array like
+        array with events on the 0th axis
+    start : int
+        first event to take
+    stop : int
+        event to stop before
+
+    Returns
+    -------
+    chunk : array like
+        the selected events
+    """
+    if not isinstance(array, awkward.JaggedArray):
+        return array[start:stop]
+    sliced = array[start:stop]
+    try:
+        offsets = sliced.offsets
+    except ValueError:  # starts and stops are not contiguous
+        sliced = sliced.compact()
+        offsets = sliced.offsets
+    first, last = offsets[0], offsets[-1]
+    content = event_chunk(sliced.content, first, last)
+    return awkward.JaggedArray.fromoffsets(offsets - first, content)
+
+
+def array_nbytes(array):
+    """
+    Estimate the memory used by an array,
+    for awkward arrays this includes the offsets.
+
+    Parameters
+    ----------
+    array : array like
+        the array to measure
+
+    Returns
+    -------
+    nbytes : int
+        approximate size in bytes
+    """
+    try:
+        return array.nbytes
+    except (AttributeError, TypeError, ValueError):
+        return sys.getsizeof(array)
+
+
 class git_properties:
     def __init__(self, gitdict=None):
         # start with them being None, try to fix
@@ -272,11 +488,378 @@ class git_properties:
         return string
 
 
+def match_positions(match_from, match_to=None):
+    """
+    Find the positions of the items selected from each row of a column,
+    see EventWise.match_indices.
+    Works on the flat content of the rows, so rows from
+    many events can be processed in one call.
+
+    Parameters
+    ----------
+    match_from: arraylike
+        if match_to is None, the positions wanted from each row,
+        either one int per row or a jagged array of ints.
+        Otherwise, one id per row.
+    match_to : JaggedArray
+        ids of each item in each row
+        (Default value = None)
+
+    Returns
+    -------
+    positions : arraylike of ints
+        the positions in each row of the selected items,
+        one int per row if match_from was one int per row
+        and match_to was None, otherwise jagged
+    """
+    if match_to is None:
+        if isinstance(match_from, awkward.JaggedArray):
+            return match_from
+        return np.asarray(match_from, dtype=int)
+    match_to = event_chunk(match_to, 0, len(match_to))
+    match_from = np.asarray(match_from)
+    n_rows = len(match_to)
+    if match_from.shape != (n_rows,):
+        raise ValueError(f"Need one id per row, found shape {match_from.shape} for {n_rows} rows")
+    row_of = np.repeat(np.arange(n_rows), match_to.counts)
+    mask = np.asarray(match_to.content) == match_from[row_of]
+    local_position = np.arange(len(row_of)) - match_to.offsets[row_of]
+    counts = np.bincount(row_of[mask], minlength=n_rows)
+    return awkward.JaggedArray.fromcounts(counts, local_position[mask])
+
+
+def _select_positions(rows, positions):
+    """
+    Take items from each row of a jagged array.
+
+    Parameters
+    ----------
+    rows : JaggedArray
+        the rows to select from
+    positions : arraylike of int
+        as returned by match_positions
+
+    Returns
+    -------
+    selected : awkward array
+        the selected items
+    """
+    if isinstance(positions, awkward.JaggedArray):
+        return rows[positions]
+    counts = rows.counts
+    if len(positions) != len(rows):
+        raise ValueError(f"Need one position per row, found {len(positions)} for {len(rows)} rows")
+    positions = np.where(positions < 0, positions + counts, positions)
+    if np.any((positions < 0) | (positions >= counts)):
+        raise IndexError("Position out of range for row")
+    return rows.content[rows.starts + positions]
+
+
+def _match_event(attr, match_from, match_to=None):
+    """
+    Select items from the rows of a column in one event,
+    see EventWise.match_indices.
+
+    Parameters
+    ----------
+    attr : arraylike
+        the column for this event
+    match_from: arraylike
+        list of desired indices
+    match_to : arraylike
+        list of indices that indicate the order of the attribute
+        (Default value = None)
+
+    Returns
+    -------
+    out : awkward array
+        the selected objects from this event
+    """
+    if isinstance(attr, awkward.JaggedArray):
+        try:
+            return _select_positions(attr, match_positions(match_from, match_to))
+        except (TypeError, ValueError):
+            pass  # irregular input, such as a single id for all rows
+    if match_to is not None:
+        try:
+            out = [row[f == t] for f, t, row in zip(match_from, match_to, attr)]
+        except TypeError:
+            mask = int(match_from) == match_to
+            out = [row[m] for m, row in zip(mask, attr)]
+    else:
+        out = [row[m] for m, row in zip(match_from, attr)]
+    return awkward.fromiter(out)
+
+
+def claim_file_name(dir_name, name_format):
+    """
+    Find the first free file name of the given format,
+    and create an empty file there, so no other process can take it.
+
+    Parameters
+    ----------
+    dir_name : string
+        directory for the file
+    name_format : string
+        format of the file name, with space for one integer
+
+    Returns
+    -------
+    name : string
+        the claimed file name
+    """
+    i = 0
+    while True:
+        name = name_format.format(i)
+        try:
+            # creation fails if the file already exists, and cannot race
+            os.close(os.open(os.path.join(dir_name, name), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return name
+        except FileExistsError:
+            i += 1
+
+
+logs_dir_pattern = re.compile(r"^\.(.+)_logs$")
+
+
+def logs_dir_name(save_name):
+    """
+    Name of the hidden directory, beside an eventWise file,
+    that holds logs of work on it, such as FormJets.ClusterResultLog.
+
+    Parameters
+    ----------
+    save_name : string
+        file name of the eventWise
+
+    Returns
+    -------
+    name : string
+        name of the logs directory, matched by logs_dir_pattern
+    """
+    return "." + os.path.splitext(save_name)[0] + "_logs"
+
+
+class SegmentedContents(MutableMapping):
+    """
+    Lazy, writable view of the contents of an eventWise file.
+    The file holds a base set of contents, and may hold segments
+    that were appended afterwards. Where a name appears more than once
+    the latest segment wins, and values set in memory win over anything on disk.
+    A segment can also hold extensions, events to add to the end
+    of the latest full content of a name.
+    Nothing is read from disk until it is requested.
+    """
+    segment_format = "seg{}~{}~"
+    segment_pattern = re.compile(r"^seg(\d+)~(.+)~$")
+    extension_format = "ext{}~{}~"
+    extension_pattern = re.compile(r"^ext(\d+)~(.+)~$")
+
+    def __init__(self, on_disk):
+        """
+        Parameters
+        ----------
+        on_disk : Mapping
+            the contents as read by awkward.load
+        """
+        self._in_memory = {}
+        self.rebase(on_disk)
+
+    @classmethod
+    def parse_key(cls, key):
+        """
+        Identify the segment and name of a key stored on disk.
+
+        Parameters
+        ----------
+        key : string
+            key as it appears in the file
+
+        Returns
+        -------
+        segment_n : int
+            number of the segment, 0 for the base contents
+        name : string
+            name of the content
+        extends : bool
+            does the key hold events to add to the end of the content,
+            rather than the whole content
+        """
+        match = cls.segment_pattern.match(key)
+        if match is not None:
+            return int(match.group(1)), match.group(2), False
+        match = cls.extension_pattern.match(key)
+        if match is not None:
+            return int(match.group(1)), match.group(2), True
+        return 0, key, False
+
+    def rebase(self, on_disk, keep_in_memory=True):
+        """
+        Point at a new set of contents on disk.
+
+        Parameters
+        ----------
+        on_disk : Mapping
+            the contents as read by awkward.load
+        keep_in_memory : bool
+            should values that have been set in memory be kept?
+            If they have been written to disk they can be released.
+            (Default value = True)
+        """
+        if not keep_in_memory:
+            self._in_memory = {}
+        self._on_disk = on_disk
+        self._disk_keys = {}
+        self._extension_keys = {}
+        latest = {}
+        extensions = []
+        self.n_segments = 0
+        for key in on_disk:
+            segment_n, name, extends = self.parse_key(key)
+            self.n_segments = max(self.n_segments, segment_n)
+            if extends:
+                extensions.append((segment_n, name, key))
+                continue
+            if name in self._in_memory or latest.get(name, -1) > segment_n:
+                continue
+            latest[name] = segment_n
+            self._disk_keys[name] = key
+        # only extensions after the latest full content apply
+        for segment_n, name, key in sorted(extensions):
+            if name in self._disk_keys and segment_n > latest[name]:
+                self._extension_keys.setdefault(name, []).append(key)
+
+    def on_disk(self, name):
+        """
+        Is the content of a name read from disk, rather than memory?
+
+        Parameters
+        ----------
+        name : string
+            name of the content
+
+        Returns
+        -------
+        on_disk : bool
+            True if the content is on disk and not replaced in memory
+        """
+        return name in self._disk_keys
+
+    def __getitem__(self, name):
+        if name in self._in_memory:
+            return self._in_memory[name]
+        content = self._on_disk[self._disk_keys[name]]
+        if name in self._extension_keys:
+            content = concatenate_events([content] + [self._on_disk[key] for key
+                                                      in self._extension_keys[name]])
+        return content
+
+    def __setitem__(self, name, value):
+        self._disk_keys.pop(name, None)
+        self._extension_keys.pop(name, None)
+        self._in_memory[name] = value
+
+    def __delitem__(self, name):
+        self._extension_keys.pop(name, None)
+        if name in self._in_memory:
+            del self._in_memory[name]
+        else:
+            del self._disk_keys[name]
+
+    def __iter__(self):
+        return iter(list(self._disk_keys) + list(self._in_memory))
+
+    def __len__(self):
+        return len(self._disk_keys) + len(self._in_memory)
+
+
+class BackedContents(SegmentedContents):
+    """
+    Contents of a virtual fragment, a range of events from another eventWise file.
+    Content written to the fragment itself takes priority,
+    other columns are read from the backing file on request.
+    """
+    backing_keys = ['backing_path', 'event_range', 'backed_columns', 'backed_unsplit']
+
+    def __init__(self, on_disk, dir_name):
+        """
+        Parameters
+        ----------
+        on_disk : Mapping
+            the contents of the fragment as read by awkward.load
+        dir_name : string
+            directory of the fragment,
+            the backing path is relative to this
+        """
+        super().__init__(on_disk)
+        self._backing_path = os.path.join(dir_name, self['backing_path'][0])
+        self._backing = None
+        self.event_range = tuple(int(x) for x in self['event_range'])
+        # names of content in the backing file, and if they should be sliced
+        self._backed = {name: True for name in self['backed_columns']}
+        self._backed.update({name: False for name in self['backed_unsplit']})
+
+    def __getitem__(self, name):
+        try:
+            return super().__getitem__(name)
+        except KeyError:
+            if name not in self._backed:
+                raise
+        if self._backing is None:
+            self._backing = EventWise._load_contents(self._backing_path)
+        content = self._backing[name]
+        if self._backed[name]:
+            start, stop = self.event_range
+            content = content[start:stop]
+        return content
+
+    def __setitem__(self, name, value):
+        self._backed.pop(name, None)
+        super().__setitem__(name, value)
+
+    def __delitem__(self, name):
+        found = self._backed.pop(name, None) is not None
+        try:
+            super().__delitem__(name)
+        except KeyError:
+            if not found:
+                raise
+
+    def __iter__(self):
+        own = list(super().__iter__())
+        return iter(own + [name for name in self._backed if name not in own])
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def own_contents(self):
+        """
+        The contents that belong in the fragment's own file,
+        which is everything except what is read from the backing file.
+        The record of backed columns reflects any that have been
+        replaced or removed since the fragment was read.
+
+        Returns
+        -------
+        contents : dict
+            keys are names and values are contents
+        """
+        contents = {name: self[name] for name in super().__iter__()}
+        contents['backed_columns'] = awkward.fromiter([name for name, sliced
+                                                       in self._backed.items() if sliced])
+        contents['backed_unsplit'] = awkward.fromiter([name for name, sliced
+                                                       in self._backed.items() if not sliced])
+        return contents
+
+
 class EventWise:
     """The most basic properties of collections that exist in an eventwise sense"""
     selected_index = None
     EVENT_DEPTH = 1 # events, objects in events
     JET_DEPTH = 2 # events, jets, objects in jets
+    # memory budget in bytes for columns kept in ram, None for no limit
+    # when exceeded the least recently used columns are released
+    max_loaded_bytes = None
 
     def __init__(self, dir_name, save_name, columns=None, contents=None, hyperparameter_columns=None, gitdict=None):
         """
@@ -302,6 +885,8 @@ class EventWise:
 
         """
         self._loaded_contents = {}  # keep columns that have been accessed in ram
+        # held while changing the loaded columns, so views can be read from many threads
+        self._load_lock = threading.RLock()
         # the init method must generate some table of items,
         # nomally a jagged array
         self.dir_name = dir_name
@@ -322,6 +907,9 @@ class EventWise:
             self._column_contents = {}
         assert len(set(self.columns)) == len(self.columns), f"Duplicates in columns; {self.columns}"
         self._alias_dict = self._gen_alias()
+        # the path of the file this object last matched, and what has changed since then
+        self._synced_path = None
+        self._unwritten_columns = set(self._column_contents)
         self.hyperparameters = {}
         self.git_properties = git_properties(gitdict)
 
@@ -366,7 +954,7 @@ class EventWise:
         # if to_remove is not infact an alias the line above will throw an error
         del self._alias_dict[to_remove]
         del alias_list[alias_idx]
-        self._column_contents = {**self._column_contents, 'alias': awkward.fromiter(alias_list)}
+        self._set_contents(alias=awkward.fromiter(alias_list))
         self.columns.remove(to_remove)
 
     def add_alias(self, name, target):
@@ -384,7 +972,7 @@ class EventWise:
         assert name not in self.columns
         alias_list = self._column_contents['alias'].tolist()
         alias_list.append([name, target])
-        self._column_contents = {**self._column_contents, 'alias': awkward.fromiter(alias_list)}
+        self._set_contents(alias=awkward.fromiter(alias_list))
         self._alias_dict[name] = target
         self.columns.append(name)
 
@@ -403,27 +991,172 @@ class EventWise:
         if attr_name == '_alias_dict':
             # we can safely return an empty dict
             return {}
+        attr_name = self._true_name(attr_name)
+        if attr_name in self.columns:
+            column = self._load_column(attr_name)
+            if self.selected_index is not None:
+                return column[self.selected_index]
+            return column
+        if attr_name in self.hyperparameter_columns:
+            return self._column_contents[attr_name]
+        raise AttributeError(f"{self.__class__.__name__} does not have {attr_name}")
+
+    def _true_name(self, attr_name):
+        """
+        Convert an attribute name to the name it is stored under.
+
+        Parameters
+        ----------
+        attr_name : string
+            name of the column or hyperparameter_column
+            case insensative
+            can be an alias
+
+        Returns
+        -------
+        attr_name : string
+            name with a capital first letter, and any alias resolved
+        """
         # capitalise raises the case of the first letter
         attr_name = attr_name[0].upper() + attr_name[1:]
         # if it is an alias get the true name
-        attr_name = self._alias_dict.get(attr_name, attr_name)
-        if attr_name in self.columns:
-            try:  # start by assuming it has been loaded
-                if self.selected_index is not None:
-                    return self._loaded_contents[attr_name][self.selected_index]
-                return self._loaded_contents[attr_name]
-            except KeyError:  # it hasn't been loaded
+        return self._alias_dict.get(attr_name, attr_name)
+
+    def _load_column(self, attr_name):
+        """
+        Get a column for all events, loading it into ram if needed.
+        Does not consult the selected_index.
+
+        Parameters
+        ----------
+        attr_name : string
+            true name of the column, not an alias
+
+        Returns
+        -------
+        column : array like
+            content of the column for every event
+        """
+        try:
+            loaded_contents = self._loaded_contents
+        except AttributeError: # we dont have a loaded dict yet
+            loaded_contents = self._loaded_contents = {}
+            self._load_lock = threading.RLock()
+        try:  # start by assuming it has been loaded
+            column = loaded_contents[attr_name]
+        except KeyError:  # it hasn't been loaded
+            with self._load_lock:
+                if attr_name in loaded_contents:  # another thread got here first
+                    return loaded_contents[attr_name]
                 try:
-                    self._loaded_contents[attr_name] = self._column_contents[attr_name][:]
+                    column = self._column_contents[attr_name][:]
                 except TypeError:  # cannot be indexed
-                    self._loaded_contents[attr_name] = self._column_contents[attr_name]
-                return getattr(self, attr_name)
-            except AttributeError: # we dont have a loaded dict yet
-                self._loaded_contents = {}
-                return getattr(self, attr_name)
-        if attr_name in self.hyperparameter_columns:
-            return self._column_contents[attr_name]
-        raise AttributeError(f"{self.__class__.__name__} does not have {attr_name}")
+                    column = self._column_contents[attr_name]
+                loaded_contents[attr_name] = column
+                self._release_loaded(keep=attr_name)
+            return column
+        if self.max_loaded_bytes is not None:
+            with self._load_lock:
+                # move to the end, so it is the last to be released
+                loaded_contents.pop(attr_name, None)
+                loaded_contents[attr_name] = column
+        return column
+
+    def event_view(self, event_n):
+        """
+        Get a read only view of one event.
+        The view does not use or change the selected_index,
+        so many views can be in use at once, including from different threads.
+
+        Parameters
+        ----------
+        event_n : int
+            index of the event
+
+        Returns
+        -------
+        view : EventView
+            the columns of the view are the columns of this event
+        """
+        return EventView(self, event_n)
+
+    def iter_chunks(self, columns, chunk_size=1000, start=0, stop=None):
+        """
+        Iterate over contiguous ranges of events, getting
+        many events of each column at once.
+        Each jagged array in a chunk is a view with offsets
+        starting from 0 and flat content covering only that chunk,
+        so calculations can be vectorised over the content.
+        Does not consult the selected_index.
+
+        Parameters
+        ----------
+        columns : list of strings
+            names of the columns to include,
+            case insensative, can be aliases
+        chunk_size : int
+            maximum number of events in each chunk
+            (Default value = 1000)
+        start : int
+            first event to include
+            (Default value = 0)
+        stop : int
+            event to stop before, if None go to the last event
+            (Default value = None)
+
+        Yields
+        ------
+        event_range : tuple of int
+            the start and stop of the events in this chunk
+        chunk : dict of arrays
+            the keys are the column names as given,
+            the values are those columns for the events in range
+        """
+        assert chunk_size > 0, "chunk_size must be positive"
+        loaded = {}
+        for name in columns:
+            true_name = self._true_name(name)
+            if true_name not in self.columns:
+                raise AttributeError(f"{self.__class__.__name__} does not have {true_name}")
+            loaded[name] = self._load_column(true_name)
+        if not loaded:
+            return
+        n_events = len(next(iter(loaded.values())))
+        assert all(len(column) == n_events for column in loaded.values()), \
+            "Columns have different numbers of events"
+        if stop is None or stop > n_events:
+            stop = n_events
+        for chunk_start in range(start, stop, chunk_size):
+            chunk_stop = min(chunk_start + chunk_size, stop)
+            chunk = {name: event_chunk(column, chunk_start, chunk_stop)
+                     for name, column in loaded.items()}
+            yield (chunk_start, chunk_stop), chunk
+
+    def _release_loaded(self, keep=None):
+        """
+        If the columns in ram exceed max_loaded_bytes, drop the least
+        recently used ones. They will be reloaded from the contents
+        if they are requested again.
+
+        Parameters
+        ----------
+        keep : string
+            name of a column that should not be released
+            (Default value = None)
+        """
+        if self.max_loaded_bytes is None:
+            return
+        sizes = {name: array_nbytes(column) for name, column
+                 in self._loaded_contents.items()}
+        total = sum(sizes.values())
+        # dicts are in insertion order, and used columns are moved to the end
+        for name in list(self._loaded_contents):
+            if total <= self.max_loaded_bytes:
+                break
+            if name == keep:
+                continue
+            del self._loaded_contents[name]
+            total -= sizes[name]
 
     def match_indices(self, attr_name, match_from, match_to=None, event_n=None):
         """
@@ -472,15 +1205,48 @@ class EventWise:
             match_from = getattr(self, match_from)
         if isinstance(match_to, str):
             match_to = getattr(self, match_to)
+        return _match_event(attr, match_from, match_to)
+
+    def match_indices_all(self, attr_name, match_from, match_to=None):
+        """
+        Applies to all events at once, and does not consult the selected_index.
+        Otherwise the same as match_indices.
+        Rather than looping over events and rows the matching is done
+        on the flat content of the columns.
+
+        Parameters
+        ----------
+        attr_name : string
+            column to return values from
+        match_from: string or arraylike
+            column name or indices for all events
+        match_to : string or arraylike
+            column name or indices for all events, that indicate
+            the order of the attribute
+            (Default value = None)
+
+        Returns
+        -------
+        out : awkward array
+            the selected objects from every event
+        """
+        attr = self._load_column(self._true_name(attr_name))
+        if isinstance(match_from, str):
+            match_from = self._load_column(self._true_name(match_from))
+        if isinstance(match_to, str):
+            match_to = self._load_column(self._true_name(match_to))
+        attr = event_chunk(attr, 0, len(attr))
+        match_from = event_chunk(match_from, 0, len(match_from))
+        if not np.array_equal(attr.counts, match_from.counts):
+            raise ValueError(f"{attr_name} and match_from have different numbers of rows")
         if match_to is not None:
-            try:
-                out = [row[f == t] for f, t, row in zip(match_from, match_to, attr)]
-            except TypeError:
-                mask = int(match_from) == match_to
-                out = [row[m] for m, row in zip(mask, attr)]
-        else:
-            out = [row[m] for m, row in zip(match_from, attr)]
-        return awkward.fromiter(out)
+            match_to = event_chunk(match_to, 0, len(match_to))
+            if not np.array_equal(attr.counts, match_to.counts):
+                raise ValueError(f"{attr_name} and match_to have different numbers of rows")
+            match_to = match_to.content
+        positions = match_positions(match_from.content, match_to)
+        selected = _select_positions(attr.content, positions)
+        return awkward.JaggedArray.fromoffsets(attr.offsets, selected)
 
     def __dir__(self):
         """Overiding the __dir__ to add the columns and hyperparameter_columns """
@@ -497,39 +1263,212 @@ class EventWise:
         """ Assumeing two eventwise objects saved in the same place are the same object """
         return self.save_name == other.save_name and self.dir_name == other.dir_name
 
-    def write(self, update_git_properties=False):
-        """Write to disk"""  # TODO, could append mode speed this up?
-        path = os.path.join(self.dir_name, self.save_name)
+    def _set_contents(self, **new_content):
+        """
+        Place new content in memory, to be written by the next
+        write or append. Does not change the columns.
+
+        Parameters
+        ----------
+        **new_content : objects
+            the parameter names are the names for the contents
+            the parameter values are the contents
+        """
+        if isinstance(self._column_contents, dict):
+            self._column_contents = {**self._column_contents, **new_content}
+        else:
+            self._mutable_contents()
+            self._column_contents.update(new_content)
+        self._unwritten_columns.update(new_content)
+
+    def _mutable_contents(self):
+        """ Make sure the _column_contents can be changed without loading them all """
+        if not isinstance(self._column_contents, MutableMapping):
+            self._column_contents = SegmentedContents(self._column_contents)
+
+    def _metadata(self, update_git_properties=False):
+        """
+        Information, besides the content, that is saved with every write.
+
+        Parameters
+        ----------
+        update_git_properties : bool
+            should the git properties be set to the current state of the repo
+            (Default value = False)
+
+        Returns
+        -------
+        metadata : dict of awkward arrays
+            column orders, the alias and the git properties
+        """
         assert len(self.columns) == len(set(self.columns)), "Columns contains duplicates"
         non_alias_cols = [c for c in self.columns if c not in self._alias_dict]
-        column_order = awkward.fromiter(non_alias_cols)
-        #try:
-        #    del self._column_contents['column_order']
-        #except KeyError:
-        #    pass
         non_alias_hcols = [c for c in self.hyperparameter_columns if c not in self._alias_dict]
-        hyperparameter_column_order = awkward.fromiter(non_alias_hcols)
-        #try:
-        #    del self._column_contents['hyperparameter_column_order']
-        #except KeyError:
-        #    pass
-        #all_content = {'column_order': column_order,
-        #               'hyperparameter_column_order': hyperparameter_column_order,
-        #               **self._column_contents}
-        all_content = {}
-        # must happen in this order so the new column order overwrites the old
-        all_content.update(self._column_contents)
-        all_content['column_order'] = column_order
-        all_content['hyperparameter_column_order'] = hyperparameter_column_order
+        metadata = {'column_order': awkward.fromiter(non_alias_cols),
+                    'hyperparameter_column_order': awkward.fromiter(non_alias_hcols),
+                    'alias': self._column_contents['alias']}
         if update_git_properties:
             self.git_properties.update_latest()
         # turn the gitdict into a list of tuples
         # this prevents clashes with other parts of the code that assume everhting is
         # basically an awkward array
-        gittuples = awkward.fromiter([(key, value) for key, value
-                                      in self.git_properties.gitdict.items()])
-        all_content['gitdict'] = gittuples
+        metadata['gitdict'] = awkward.fromiter([(key, value) for key, value
+                                                in self.git_properties.gitdict.items()])
+        return metadata
+
+    def write(self, update_git_properties=False):
+        """
+        Write everything to disk, replacing any existing file.
+        This also compacts any segments left by append.
+        A virtual fragment only writes what is not in its backing file.
+
+        Parameters
+        ----------
+        update_git_properties : bool
+            should the git properties be set to the current state of the repo
+            (Default value = False)
+        """
+        path = os.path.join(self.dir_name, self.save_name)
+        all_content = {}
+        # must happen in this order so the new column order overwrites the old
+        if isinstance(self._column_contents, BackedContents):
+            # a virtual fragment stays virtual
+            all_content.update(self._column_contents.own_contents())
+        else:
+            all_content.update(self._column_contents)
+        all_content.update(self._metadata(update_git_properties))
         awkward.save(path, all_content, mode='w')
+        # the keys in the old file are gone,
+        # and everything in memory is now on disk
+        if isinstance(self._column_contents, SegmentedContents):
+            self._column_contents.rebase(awkward.load(path), keep_in_memory=False)
+        elif os.path.exists(path):  # awkward.save adds .awkd to names without it
+            # read back lazily, so later segments can extend what is on disk
+            self._column_contents = SegmentedContents(awkward.load(path))
+        self._synced_path = path
+        self._unwritten_columns = set()
+
+    def write_segment(self, update_git_properties=False, extensions=None):
+        """
+        Write only the contents that have changed since the last
+        read or write, as a segment appended to the existing file.
+        The cost scales with the size of the changes, not the size of the file.
+        Falls back to a full write if this object does not match the file on disk,
+        or if most of the file has been made obsolete by later segments.
+
+        Parameters
+        ----------
+        update_git_properties : bool
+            should the git properties be set to the current state of the repo
+            (Default value = False)
+        extensions : dict of iterables
+            events to add to the end of columns,
+            where a column is on disk only these events are written
+            (Default value = None)
+        """
+        extensions = dict(extensions or {})
+        path = os.path.join(self.dir_name, self.save_name)
+        if self._synced_path != path or not os.path.exists(path):
+            self._join_extensions(extensions)
+            self.write(update_git_properties)
+            return
+        # only content on disk can be extended there
+        contents = self._column_contents
+        in_memory = [name for name in extensions
+                     if not (isinstance(contents, SegmentedContents) and contents.on_disk(name))]
+        self._join_extensions({name: extensions.pop(name) for name in in_memory})
+        new_content = {name: self._column_contents[name]
+                       for name in self._unwritten_columns
+                       if name in self._column_contents}
+        metadata = self._metadata(update_git_properties)
+        new_content.update(metadata)
+        # find the last segment, and how much of the file is superseded
+        stored_bytes = {}
+        with zipfile.ZipFile(path, mode='r') as zip_file:
+            for info in zip_file.infolist():
+                key, extension = info.filename.rsplit('.', 1)
+                if extension == 'raw':  # awkward adds -<part> to the key
+                    key = key.rsplit('-', 1)[0]
+                stored_bytes[key] = stored_bytes.get(key, 0) + info.file_size
+        stored_keys = [SegmentedContents.parse_key(key) for key in stored_bytes]
+        latest_segment = {}
+        for segment_n, name, extends in stored_keys:
+            if not extends:  # extensions add to content, they don't replace it
+                latest_segment[name] = max(segment_n, latest_segment.get(name, 0))
+        # content that has been removed is superseded too
+        live = set(self.columns + self.hyperparameter_columns + BackedContents.backing_keys)
+        # the metadata is rewritten every time, so only content decides
+        content_bytes = [(name in new_content or name not in live or
+                          segment_n < latest_segment.get(name, 0), size)
+                         for (segment_n, name, _), size in zip(stored_keys, stored_bytes.values())
+                         if name not in metadata]
+        superseded = sum(size for is_superseded, size in content_bytes if is_superseded)
+        if 2*superseded > sum(size for _, size in content_bytes):
+            self._join_extensions(extensions)
+            self.write(update_git_properties)
+            return
+        segment_n = max((segment_n for segment_n, _, _ in stored_keys), default=0) + 1
+        segment = {SegmentedContents.segment_format.format(segment_n, name): value
+                   for name, value in new_content.items()}
+        segment.update({SegmentedContents.extension_format.format(segment_n, name): events
+                        for name, events in extensions.items()})
+        awkward.save(path, segment, mode='a')
+        if isinstance(self._column_contents, SegmentedContents):
+            # release the new values, they can be read from disk now
+            self._column_contents.rebase(awkward.load(path), keep_in_memory=False)
+        self._unwritten_columns = set()
+
+    def _join_extensions(self, extensions):
+        """
+        Add events to the end of columns in memory,
+        so they are written with the rest of the content.
+
+        Parameters
+        ----------
+        extensions : dict of iterables
+            the keys are column names,
+            the values are the events to add to the end of those columns
+        """
+        joined = {}
+        for name, events in extensions.items():
+            try:
+                existing = self._column_contents[name]
+            except KeyError:  # a new column
+                existing = []
+            joined[name] = concatenate_events([existing, events])
+        if joined:
+            self._set_contents(**joined)
+
+    @staticmethod
+    def _load_contents(path):
+        """
+        Lazily read the contents of a file written by an eventWise,
+        without anything superseded by later segments.
+
+        Parameters
+        ----------
+        path : string
+            full or relative file path to the saved eventWise
+
+        Returns
+        -------
+        contents : SegmentedContents
+            mapping from names to contents, loaded on request
+        """
+        on_disk = awkward.load(path)
+        contents = SegmentedContents(on_disk)
+        if 'backing_path' in contents:  # this is a virtual fragment
+            contents = BackedContents(on_disk, os.path.split(path)[0])
+        if contents.n_segments:
+            # segments may have removed content
+            keep = set(list(contents['column_order']) +
+                       list(contents['hyperparameter_column_order']) +
+                       ['column_order', 'hyperparameter_column_order', 'gitdict', 'alias'] +
+                       BackedContents.backing_keys)
+            for name in list(contents):
+                if name not in keep:
+                    del contents[name]
+        return contents
 
     @classmethod
     def from_file(cls, path):
@@ -547,7 +1486,7 @@ class EventWise:
             loaded eventWise object
         
         """
-        contents = awkward.load(path)
+        contents = cls._load_contents(path)
         columns = list(contents['column_order'])
         hyperparameter_columns = list(contents['hyperparameter_column_order'])
         if 'gitdict' in contents:  # it will appear as a list of tuples
@@ -557,6 +1496,8 @@ class EventWise:
         new_eventWise = cls(*os.path.split(path), columns=columns,
                             hyperparameter_columns=hyperparameter_columns,
                             contents=contents, gitdict=gitdict)
+        new_eventWise._synced_path = path
+        new_eventWise._unwritten_columns = set()
         return new_eventWise
 
     def append(self, **new_content):
@@ -585,8 +1526,35 @@ class EventWise:
                 if name in self.columns:
                     self.remove(name)
             self.columns += New_columns
-            self._column_contents = {**self._column_contents, **new_content}
-            self.write(update_git_properties=True)
+            self._set_contents(**new_content)
+            self.write_segment(update_git_properties=True)
+
+    def extend(self, **new_events):
+        """
+        Add events to the end of columns, creating any columns that don't exist.
+        Only the new events are written, so the cost does not grow
+        with the number of events already in the columns.
+        Will write the results to disk.
+
+        Parameters
+        ----------
+        **new_events : iterables
+            the parameter names are the names for the columns
+            the parameter values are the events to add
+        """
+        if new_events:
+            new_columns = sorted(new_events.keys())
+            # enforce the first letter of each attrbute to be capital
+            New_columns = [c[0].upper() + c[1:] for c in new_columns]
+            new_events = {C: new_events[c] for C, c in zip(New_columns, new_columns)}
+            # check it's not in hyperparameters
+            for name in New_columns:
+                if name in self.hyperparameter_columns:
+                    raise KeyError(f"Already have {name} as a hyperparameter column")
+                # the loaded copy is missing the new events
+                self._loaded_contents.pop(name, None)
+            self.columns += [name for name in New_columns if name not in self.columns]
+            self.write_segment(update_git_properties=True, extensions=new_events)
 
     def append_hyperparameters(self, **new_content):
         """
@@ -614,8 +1582,8 @@ class EventWise:
                 if name in self.hyperparameter_columns:
                     self.remove(name)
             self.hyperparameter_columns += New_columns
-            self._column_contents = {**self._column_contents, **new_content}
-            self.write(update_git_properties=True)
+            self._set_contents(**new_content)
+            self.write_segment(update_git_properties=True)
 
     def remove(self, col_name):
         """
@@ -636,11 +1604,9 @@ class EventWise:
                 self.hyperparameter_columns.remove(col_name)
             else:
                 raise KeyError(f"Don't have a column called {col_name}")
-            if not isinstance(self._column_contents, dict):
-                # it's not yet been loaded
-                # gotta load it or we cannot delete elements
-                self._column_contents = dict(self._column_contents)
+            self._mutable_contents()
             del self._column_contents[col_name]
+            self._unwritten_columns.discard(col_name)
             if col_name in self._loaded_contents:
                 del self._loaded_contents[col_name]
 
@@ -683,10 +1649,11 @@ class EventWise:
                 self.hyperparameter_columns[self.hyperparameter_columns.index(old_name)] = new_name
             else:
                 raise KeyError(f"Don't have a column called {old_name}")
-            if not isinstance(self._column_contents, dict):
-                self._column_contents = {k:v for k, v in self._column_contents.items()}
+            self._mutable_contents()
             self._column_contents[new_name] = self._column_contents[old_name]
             del self._column_contents[old_name]
+            self._unwritten_columns.discard(old_name)
+            self._unwritten_columns.add(new_name)
 
     def rename_prefix(self, old_prefix, new_prefix):
         """
@@ -736,6 +1703,9 @@ class EventWise:
             Should content that is not per-event should be stored
             only in the first split created?
             (Default; True)
+        virtual : bool
+            Should the fragments be virtual? See split.
+            (Default; False)
 
         Returns
         -------
@@ -788,6 +1758,9 @@ class EventWise:
             Should content that is not per-event should be stored
             only in the first split created?
             (Default; True)
+        virtual : bool
+            Should the parts be virtual? See split.
+            (Default; False)
 
         Returns
         -------
@@ -832,6 +1805,13 @@ class EventWise:
         the same columns but a subset of the events.
         Writes the new eventWises in a subfolder of the save_dir.
 
+        If the parts are virtual then they hold no copy of the data,
+        only a reference to this eventWise's file and their range of events.
+        Their columns are read from this file when requested,
+        and anything appended to them is written only to the part.
+        This file must not be moved or deleted while the parts are in use.
+        Virtual parts require upper_bounds to be given.
+
         Parameters
         ----------
         lower_bounds : array like of int
@@ -854,6 +1834,9 @@ class EventWise:
             Should content that is not per-event should be stored
             only in the first split created?
             (Default; True)
+        virtual : bool
+            Should the parts be virtual?
+            (Default; False)
 
         Returns
         -------
@@ -885,9 +1868,13 @@ class EventWise:
             to_check = set()
         n_events = len(getattr(self, per_event_component))
         # work out which lists have this property
-        per_event_cols = [c for c in self.columns
-                          if len(self._column_contents[c]) == n_events]
+        per_event_cols = [c for c in self.columns if c not in self._alias_dict
+                          and len(self._column_contents[c]) == n_events]
         assert to_check.issubset(per_event_cols)
+        virtual = kwargs.get('virtual', False) and upper_bounds is not None
+        if virtual:
+            return self._split_virtual(lower_bounds, upper_bounds, per_event_cols,
+                                       save_dir, name_format, kwargs.get('no_dups', True))
         new_contents = []
         if upper_bounds is None:  # treat lower bounds as a list of indices
             for index_list in lower_bounds:
@@ -910,7 +1897,6 @@ class EventWise:
         # if no dupes only put the unchanged content in the first event
         no_dups = kwargs.get('no_dups', True)
         all_paths = []
-        i = 0
         add_unsplit = True
         # add the hyperparameters to all things...
         hyper_param_dict = {name: self._column_contents[name] for
@@ -922,26 +1908,97 @@ class EventWise:
                 all_paths.append(None)
                 continue
             new_content = {**new_content, **hyper_param_dict}
-            # this bit isn't thread safe and could create a race condition
-            while name_format.format(i) in os.listdir(save_dir):
-                i += 1
-            name = name_format.format(i)
+            name = claim_file_name(save_dir, name_format)
+            try:
+                if add_unsplit:
+                    new_content = {**new_content, **unchanged_parts}
+                    eventWise = type(self)(save_dir, name,
+                                    columns=self.columns,
+                                    hyperparameter_columns=self.hyperparameter_columns,
+                                    contents=new_content)
+                    if no_dups:
+                        # don't do this again
+                        add_unsplit = False
+                else:
+                    eventWise = type(self)(save_dir, name,
+                                    columns=per_event_cols,
+                                    hyperparameter_columns=self.hyperparameter_columns,
+                                    contents=new_content)
+                eventWise.write()
+            except BaseException:
+                # don't leave the claimed file behind, empty or half written
+                os.remove(os.path.join(save_dir, name))
+                raise
+            all_paths.append(os.path.join(save_dir, name))
+        return all_paths
+
+    def _split_virtual(self, lower_bounds, upper_bounds, per_event_cols,
+                       save_dir, name_format, no_dups):
+        """
+        Write virtual parts, see split.
+
+        Parameters
+        ----------
+        lower_bounds : array like of int
+            first event in each section, inclusive
+        upper_bounds : array like of int
+            last event in each section, exclusive
+        per_event_cols : list of strings
+            names of the columns that have one row per event
+        save_dir : string
+            directory to write the parts in
+        name_format : string
+            format for the file names of the parts
+        no_dups : bool
+            Should content that is not per-event should be
+            only in the first split created?
+
+        Returns
+        -------
+        all_paths : list of strings
+            file paths to the new eventWise objects
+        """
+        # the parts will read from the file, so it must be up to date
+        own_path = os.path.join(self.dir_name, self.save_name)
+        if self._unwritten_columns or self._synced_path != own_path:
+            self.write_segment()
+        backing_path = awkward.fromiter([os.path.relpath(own_path, save_dir)])
+        hyper_param_dict = {name: self._column_contents[name] for
+                            name in self.hyperparameter_columns}
+        non_alias_cols = [c for c in self.columns if c not in self._alias_dict]
+        unsplit_cols = [c for c in non_alias_cols if c not in per_event_cols]
+        all_paths = []
+        add_unsplit = True
+        for lower, upper in zip(lower_bounds, upper_bounds):
+            if lower > upper:
+                raise ValueError(f"lower bound {lower} greater than upper bound {upper}")
+            if lower == upper:
+                # append none as a placeholder
+                all_paths.append(None)
+                continue
+            new_content = {**hyper_param_dict,
+                           'backing_path': backing_path,
+                           'event_range': np.array([lower, upper]),
+                           'backed_columns': awkward.fromiter(per_event_cols)}
             if add_unsplit:
-                new_content = {**new_content, **unchanged_parts}
-                eventWise = type(self)(save_dir, name,
-                                columns=self.columns,
-                                hyperparameter_columns=self.hyperparameter_columns,
-                                contents=new_content)
-                if no_dups:
-                    # don't do this again
-                    add_unsplit = False
+                new_content['backed_unsplit'] = awkward.fromiter(unsplit_cols)
+                new_content['alias'] = self._column_contents['alias']
+                columns = non_alias_cols
+                add_unsplit = not no_dups
             else:
-                eventWise = type(self)(save_dir, name,
-                                columns=per_event_cols,
-                                hyperparameter_columns=self.hyperparameter_columns,
-                                contents=new_content)
+                new_content['backed_unsplit'] = awkward.fromiter([])
+                columns = [c for c in non_alias_cols if c in per_event_cols]
+            name = claim_file_name(save_dir, name_format)
+            try:
+                eventWise = type(self)(save_dir, name, columns=list(columns),
+                                       hyperparameter_columns=list(self.hyperparameter_columns),
+                                       contents=new_content)
+                eventWise.write()
+            except BaseException:
+                # don't leave the claimed file behind, empty or half written
+                os.remove(os.path.join(save_dir, name))
+                raise
             all_paths.append(os.path.join(save_dir, name))
-            eventWise.write()
         return all_paths
 
     @classmethod
@@ -974,7 +2031,8 @@ class EventWise:
         root_dir = '/'.join(dir_name.split('/')[:-1])
         save_base = dir_name.split('/')[-1].split('_', 1)[0]
         for name in os.listdir(dir_name):
-            if not name.endswith('.awkd'):
+            # hidden directories are not fragments, FormJets keeps logs in them
+            if not name.endswith('.awkd') and not name.startswith('.'):
                 subdir_name = os.path.join(dir_name, name)
                 merged_name = cls.recursive_combine(subdir_name, check_for_dups, del_fragments)
                 os.rename(merged_name, subdir_name + ".awkd")
@@ -984,6 +2042,12 @@ class EventWise:
         os.rename(os.path.join(combined_eventWise.dir_name, combined_eventWise.save_name),
                   joined_name)
         if del_fragments:
+            # logs of the fragments that were just deleted,
+            # any other content stops the directory being removed
+            for name in os.listdir(dir_name):
+                if logs_dir_pattern.match(name):
+                    print(f"Removing {name}, left by a deleted fragment")
+                    shutil.rmtree(os.path.join(dir_name, name))
             os.rmdir(dir_name)
         return joined_name
 
@@ -993,7 +2057,9 @@ class EventWise:
         Join multiple eventWise objects so that all events are contaiend in a single eventWise.
         Inverts the split funciton.
         Writes to disk.
-        If coulmns don't have event length requires Event_n to sort them
+        If coulmns don't have event length requires Event_n to sort them.
+        The fragments are read and written one column at a time,
+        so only one column need be held in memory.
 
         Parameters
         ----------
@@ -1028,87 +2094,177 @@ class EventWise:
                          if name.startswith(save_base)
                          and name.endswith(".awkd")]
         columns = []
-        hyperparameter_columns = set()
-        contents = {}
-        pickle_strs = {}  # when checking for dups
-        for fragment_n, fragment in enumerate(fragments):
+        hyperparameter_columns = []
+        # hyperparameters, and anything that is not a column
+        other_contents = {}
+        metadata = ['column_order', 'hyperparameter_column_order', 'gitdict'] + \
+                   BackedContents.backing_keys
+        fragment_contents = []
+        for fragment in fragments:
             path = os.path.join(dir_name, fragment)
             try:
-                content_here = awkward.load(path)
+                content_here = cls._load_contents(path)
             except Exception:
                 print(f"Problem in {path}, skipping")
                 continue
             # check hyperparameters match and add as needed
-            found_hcols = set(content_here.get("hyperparameter_column_order", []))
-            if hyperparameter_columns and found_hcols:  # check they are the same here
-                for name in found_hcols:
-                    if name not in hyperparameter_columns:
-                        hyperparameter_columns.add(name)
-                        contents[name] = content_here[name]
-                    error_msg = f"Missmatch in hyperparameter {name}"
-                    try:
-                        np.testing.assert_allclose(content_here[name], contents[name],
-                                                   err_msg=error_msg)
-                    except TypeError:
-                        assert content_here[name] == contents[name], error_msg
-            elif found_hcols:  # add here
-                hyperparameter_columns = found_hcols
-                for name in found_hcols:
-                    contents[name] = content_here[name]
+            for name in content_here.get("hyperparameter_column_order", []):
+                if name not in hyperparameter_columns:
+                    hyperparameter_columns.append(name)
+                    other_contents[name] = content_here[name]
+                    continue
+                error_msg = f"Missmatch in hyperparameter {name}"
+                try:
+                    np.testing.assert_allclose(content_here[name], other_contents[name],
+                                               err_msg=error_msg)
+                except TypeError:
+                    assert content_here[name] == other_contents[name], error_msg
             # update columns
             for name in content_here['column_order']:
                 if name not in columns:
                     columns.append(name)
-                    # add padding
-                    contents[name] = [[] for _ in range(fragment_n)]
-            # then go through the contents adding what is foud, but do not flatten
-            for key in columns:
-                if key not in content_here:
-                    contents[key].append([]) # placeholder
-                elif check_for_dups:
-                    if key not in pickle_strs:
-                        pickle_strs[key] = pickle.dumps(content_here[key])
-                        contents[key].append(content_here[key])
-                    elif pickle_strs[key] != pickle.dumps(content_here[key]):
-                        contents[key].append(content_here[key])
-                    else:  # need to add a placeholder
-                        contents[key].append([])
-                else:
-                    contents[key].append(content_here[key])
-            # anythign else should be the sma ein all instances,
+            # anything else should be the same in all instances,
             # or only be found once
             for key in content_here:
-                if key in hyperparameter_columns or key in columns:
-                    continue  # already been delt with
-                if key not in contents:
-                    contents[key] = content_here[key]
-                    pickle_strs[key] = pickle.dumps(content_here[key])
-                else:
-                    pickle_strs[key] == pickle.dumps(content_here[key]), f"What is {key}?"
-        # make all non hyperparameters into awkward arrays
-        for key in contents:
-            if key not in hyperparameter_columns:
-                contents[key] = awkward.fromiter(contents[key])
+                if key in hyperparameter_columns or key in columns or key in metadata:
+                    continue
+                if key not in other_contents:
+                    other_contents[key] = content_here[key]
+            fragment_contents.append(content_here)
         # if it's possible to order the contents correctly, do so
-        if "Event_n" in contents:
+        if "Event_n" in columns:
             # assume that each fragment contains a continuous set of events
-            start_point = [numbering[0] for numbering in contents["Event_n"]]
-            order = np.argsort(start_point)
-            for key in columns:
-                contents[key] = contents[key][order].flatten()
+            start_points = []
+            for content_here in fragment_contents:
+                numbering = content_here.get("Event_n", [])
+                start_points.append(numbering[0] if len(numbering) else np.inf)
+            order = np.argsort(start_points, kind='stable')
         else:
-            for key in columns:
-                contents[key] = contents[key].flatten()
-            lengths = {len(contents[key]) for key in columns}
-            assert len(lengths) == 1, "Columns with differing length, but no Event_n"
-        new_eventWise = cls(dir_name, save_base+"_joined.awkd", columns=columns, contents=contents, hyperparameter_columns=hyperparameter_columns)
+            order = range(len(fragment_contents))
+        save_name = save_base+"_joined.awkd"
+        path = os.path.join(dir_name, save_name)
+        new_eventWise = cls(dir_name, save_name, contents=other_contents,
+                            hyperparameter_columns=hyperparameter_columns)
         new_eventWise.write()
+        new_eventWise = cls.from_file(path)
+        # now add the columns one at a time
+        lengths = set()
+        for name in columns:
+            seen_hashes = set()
+            parts = []
+            for fragment_n in order:
+                content_here = fragment_contents[fragment_n]
+                if name not in content_here:
+                    continue
+                part = content_here[name]
+                if check_for_dups:
+                    part_hash = content_hash(part)
+                    if part_hash in seen_hashes:
+                        continue
+                    seen_hashes.add(part_hash)
+                parts.append(part)
+            combined = concatenate_events(parts)
+            lengths.add(len(combined))
+            if "Event_n" not in columns and len(lengths) > 1:
+                os.remove(path)
+                raise AssertionError("Columns with differing length, but no Event_n")
+            new_eventWise.columns.append(name)
+            new_eventWise._set_contents(**{name: combined})
+            # writting releases the combined column from memory
+            new_eventWise.write_segment()
         if del_fragments:
             for fragment in fragments:
                 os.remove(os.path.join(dir_name, fragment))
         return new_eventWise
 
 
+class EventView:
+    """
+    Read only view of a single event in an EventWise.
+    Columns are accessed as attributes, as they are in the EventWise
+    with the selected_index set, but no shared state is changed.
+    """
+    __slots__ = ('_eventWise', '_selected_index')
+
+    def __init__(self, eventWise, event_n):
+        """
+        Parameters
+        ----------
+        eventWise : EventWise
+            the dataset to view
+        event_n : int
+            index of the event
+        """
+        object.__setattr__(self, '_eventWise', eventWise)
+        object.__setattr__(self, '_selected_index', event_n)
+
+    @property
+    def selected_index(self):
+        """ The index of the event in view """
+        return self._selected_index
+
+    def __getattr__(self, attr_name):
+        """
+        The columns and hyperparameter_columns of the eventWise are all avalible attrs
+
+        Parameters
+        ----------
+        attr_name : string
+            name of the column or hyperparameter_column being access
+            case insensative
+            can be an alias
+        """
+        eventWise = self._eventWise
+        attr_name = eventWise._true_name(attr_name)
+        if attr_name in eventWise.columns:
+            return eventWise._load_column(attr_name)[self._selected_index]
+        if attr_name in eventWise.hyperparameter_columns:
+            return eventWise._column_contents[attr_name]
+        raise AttributeError(f"{self.__class__.__name__} does not have {attr_name}")
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is read only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is read only")
+
+    def __dir__(self):
+        """ Add the columns and hyperparameter_columns """
+        new_attrs = set(super().__dir__() + self._eventWise.columns +
+                        self._eventWise.hyperparameter_columns)
+        return sorted(new_attrs)
+
+    def __str__(self):
+        return f"<EventView of event {self._selected_index} in {self._eventWise}>"
+
+    def match_indices(self, attr_name, match_from, match_to=None):
+        """
+        As EventWise.match_indices, for the event in view.
+
+        Parameters
+        ----------
+        attr_name : string
+            column to return values from
+        match_from: string or arraylike
+            column name or list of desired indices 
+        match_to : string or arraylike
+            column name or list of indices that indicate
+            the order of the attribute
+            (Default value = None)
+
+        Returns
+        -------
+        out : awkward array
+            the selected objects from this event
+        """
+        attr = getattr(self, attr_name)
+        if isinstance(match_from, str):
+            match_from = getattr(self, match_from)
+        if isinstance(match_to, str):
+            match_to = getattr(self, match_to)
+        return _match_event(attr, match_from, match_to)
+
+
 def event_matcher(eventWise1, eventWise2):
     """
     Find the indices required to match two eventWise objects.
@@ -1249,21 +2405,8 @@ def add_rapidity(eventWise, base_name=None):
         pts = getattr(eventWise, base_name+"PT")
         pzs = getattr(eventWise, base_name+"Pz")
         es = getattr(eventWise, base_name+"Energy")
-        n_events = len(getattr(eventWise, base_name+"PT"))
-        rapidities = []
-        for event_n in range(n_events):
-            if event_n % 10 == 0:
-                print(f"{event_n/n_events:.1%}", end='\r')
-            rap_here = []
-            eventWise.selected_index = event_n
-            pts = getattr(eventWise, base_name+"PT")
-            pzs = getattr(eventWise, base_name+"Pz")
-            es = getattr(eventWise, base_name+"Energy")
-            rap_here = ptpze_to_rapidity(pts, pzs, es)
-            rapidities.append(awkward.fromiter(rap_here))
-        rapidities = awkward.fromiter(rapidities)
+        rapidities = apply_elementwise_func(ptpze_to_rapidity, pts, pzs, es)
         new_content[base_name+"Rapidity"] = rapidities
-    eventWise.selected_index = None
     eventWise.append(**new_content)
 
 
@@ -1310,7 +2453,7 @@ def add_thetas(eventWise, basename=None):
                     pt = np.sqrt(getattr(eventWise, name+"Px")**2 +
                                  getattr(eventWise, name+"Py")**2)
                 # tan(theta) = oposite/adjacent = pt/pz
-                theta = ptpz_to_theta(pt, pz)
+                theta = apply_elementwise_func(ptpz_to_theta, pt, pz)
             #else:
             #    birr = getattr(eventWise, name+"Birr")
             #    pt = getattr(eventWise, name+"PT")
@@ -1355,7 +2498,7 @@ def add_pseudorapidity(eventWise, basename=None):
         missing_ps = [basename]
     for name in missing_ps:
         theta = getattr(eventWise, name+"Theta")
-        pseudorapidity = apply_array_func(theta_to_pseudorapidity, theta)
+        pseudorapidity = apply_elementwise_func(theta_to_pseudorapidity, theta)
         contents[name+"PseudoRapidity"] = pseudorapidity
     eventWise.append(**contents)
 
@@ -1506,7 +2649,7 @@ def add_PT(eventWise, basename=None):
     for name in missing_pt:
         px = getattr(eventWise, name+"Px")
         py = getattr(eventWise, name+"Py")
-        pt = apply_array_func(lambda x, y: np.sqrt(x**2 + y**2), px, py)
+        pt = apply_elementwise_func(lambda x, y: np.sqrt(x**2 + y**2), px, py)
         contents[name+"PT"] = pt
     eventWise.append(**contents)
 
@@ -1539,7 +2682,7 @@ def add_phi(eventWise, basename=None):
     for name in missing_phi:
         px = getattr(eventWise, name+"Px")
         py = getattr(eventWise, name+"Py")
-        phi = apply_array_func(lambda x, y: np.arctan2(y, x), px, py)
+        phi = apply_elementwise_func(lambda x, y: np.arctan2(y, x), px, py)
         contents[name+"Phi"] = phi
     eventWise.append(**contents)
 
@@ -1575,7 +2718,8 @@ def add_mass(eventWise, basename=None):
         py = getattr(eventWise, name+"Py")
         pz = getattr(eventWise, name+"Pz")
         e = getattr(eventWise, name+"Energy")
-        contents[name+"Mass"] = np.sqrt(e**2 - px**2 - py**2 - pz**2)
+        contents[name+"Mass"] = apply_elementwise_func(
+                lambda e, px, py, pz: np.sqrt(e**2 - px**2 - py**2 - pz**2), e, px, py, pz)
     eventWise.append(**contents)
 
 
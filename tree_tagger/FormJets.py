@@ -1,11 +1,23 @@
 """ Module for tools to create and handle jets """
 import warnings
+import itertools
+import functools
 import matplotlib
 import subprocess
+import struct
+import atexit
+import hashlib
+import bisect
+import heapq
+import zipfile
+import shutil
+import re
 import os
 import csv
 import scipy
 import scipy.spatial
+import scipy.sparse
+import scipy.sparse.linalg
 import sklearn.cluster
 import awkward
 from matplotlib import pyplot as plt
@@ -31,14 +43,37 @@ def knn(distances, num_neighbours):
 class Custom_KMeans:
     """ Compute kmeans with a custom distance function,
     the mean of the centroids is a euclidien mean, but the 
-    scores and allocations are done with the given  distance function"""
-    def __init__(self, distance_function, max_iter=500, max_restarts=500, silent=True):
+    scores and allocations are done with the given  distance function.
+    Restarts are run in batches, each batch as one array calculation."""
+    def __init__(self, distance_function, max_iter=500, max_restarts=500, silent=True,
+                 restart_batch=20):
         self.distance_function = distance_function
         self.silent = silent
         self.max_iter = max_iter
         self.max_restarts = max_restarts
+        self.restart_batch = restart_batch
 
     def fit(self, n_clusters, points):
+        """
+        Find the best of many kmeans restarts,
+        stopping once the best score has been found more than a few times.
+
+        Parameters
+        ----------
+        n_clusters : int
+            number of clusters to make
+        points : 2d array of floats
+            points to cluster, one per row
+
+        Returns
+        -------
+        score : float
+            summed distance from each point to its centeroid
+        allocations : array of ints
+            cluster number of each point
+        centeroids : 2d array of floats
+            position of each cluster
+        """
         if len(points) < n_clusters:
             raise ValueError("Cannot make more clusters than there are points")
         if n_clusters < 1:
@@ -49,26 +84,27 @@ class Custom_KMeans:
         min_count = 0
         patience = 5
         scores = []
-        for _ in range(self.max_restarts):
-            try:
-                score, aloc, cen = self._attempt(n_clusters)
-            except:
-                st()
-                score, aloc, cen = self._attempt(n_clusters)
-            if np.isclose(score, min_score):
-                allocations.append(aloc)
-                centeroids.append(cen)
-                scores.append(score)
-                min_count += 1
-                if min_count > patience:
-                    break
-            elif score < min_score:
-                allocations = [aloc]
-                centeroids = [cen]
-                scores = [score]
-                min_count = 0
-                min_score = score
-        else:
+        n_done = 0
+        repeated = False
+        while n_done < self.max_restarts and not repeated:
+            n_restarts = min(self.restart_batch, self.max_restarts - n_done)
+            n_done += n_restarts
+            for score, aloc, cen in zip(*self._attempt(n_clusters, n_restarts)):
+                if np.isclose(score, min_score):
+                    allocations.append(aloc)
+                    centeroids.append(cen)
+                    scores.append(score)
+                    min_count += 1
+                    if min_count > patience:
+                        repeated = True
+                        break
+                elif score < min_score:
+                    allocations = [aloc]
+                    centeroids = [cen]
+                    scores = [score]
+                    min_count = 0
+                    min_score = score
+        if not repeated:
             if not self.silent:
                 print("Didn't repeat.")
             # if all scores were nan we could technically reach here
@@ -80,40 +116,109 @@ class Custom_KMeans:
         best = np.argmin(scores)
         return scores[best], allocations[best], centeroids[best]
 
+    def _attempt(self, n_clusters, n_restarts=1):
+        """
+        Run kmeans from several starting points at once,
+        each restart stops moving once its allocations settle.
+
+        Parameters
+        ----------
+        n_clusters : int
+            number of clusters to make
+        n_restarts : int
+            number of starting points
+            (Default; 1)
 
-    def _attempt(self, n_clusters):
-        centeroids = self._inital_centroids(n_clusters)
-        allocations = -np.ones(self.n_points)
+        Returns
+        -------
+        scores : array of floats
+            summed distance from each point to its centeroid in each restart
+        allocations : 2d array of ints
+            cluster number of each point in each restart
+        centeroids : 3d array of floats
+            position of each cluster in each restart
+        """
+        n_dims = self.points.shape[1]
+        centeroids = self._inital_centroids(n_clusters, n_restarts)
+        allocations = -np.ones((n_restarts, self.n_points), dtype=int)
+        distances = np.empty((n_restarts, n_clusters, self.n_points))
+        nan_points = np.isnan(self.points)
+        clean_points = np.where(nan_points, 0., self.points)
+        cluster_numbers = np.arange(n_clusters)[:, np.newaxis]
+        active = np.arange(n_restarts)  # restarts that have not settled
         for i in range(self.max_iter):
-            distances = self.distance_function(centeroids, self.points, None, None)
+            found = self.distance_function(centeroids[active].reshape(-1, n_dims),
+                                           self.points, None, None)
+            found = found.reshape(len(active), n_clusters, self.n_points)
             # sometimes a point will return all nan, for an angular function
             # this is a point sitting at the origin
             # it dosen't matter where we put this point
-            distances[:, np.all(np.isnan(distances), axis=0)] = -1
+            all_nan = np.all(np.isnan(found), axis=1)
+            if np.any(all_nan):
+                found = np.where(all_nan[:, np.newaxis], -1, found)
+            distances[active] = found
             # other nan values should be respected
-            new_allocations = np.nanargmin(distances, axis=0)
-            if np.all(new_allocations == allocations):
+            new_allocations = np.nanargmin(found, axis=1)
+            changed = np.any(new_allocations != allocations[active], axis=1)
+            allocations[active] = new_allocations
+            active = active[changed]
+            if len(active) == 0:
                 break
-            allocations = new_allocations
-            for cluster_n in range(n_clusters):
-                points_here = self.points[allocations==cluster_n]
-                if len(points_here):  # otherwise leave the centeriod where it was
-                    centeroid = np.nanmean(points_here, axis=0)
-                    if not np.all(centeroid == 0):
-                        # all 0 centeroid breaks the cross product thing,
-                        # and just indicates that the points in this cluster
-                        # are orientated in oposing directions
-                        centeroids[cluster_n] = centeroid
+            # nanmean of the points in each cluster
+            membership = (allocations[active, np.newaxis] == cluster_numbers).astype(float)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = (membership @ clean_points)/(membership @ ~nan_points)
+            # otherwise leave the centeriod where it was
+            move = np.any(membership, axis=2)
+            # all 0 centeroid breaks the cross product thing,
+            # and just indicates that the points in this cluster
+            # are orientated in oposing directions
+            move &= ~np.all(means == 0, axis=2)
+            centeroids[active] = np.where(move[..., np.newaxis], means, centeroids[active])
         else:
             if not self.silent:
                 print("Didn't settle!!")
-        score = np.nansum(distances[allocations, range(self.n_points)])
-        return score, allocations, centeroids
+        scores = np.nansum(np.take_along_axis(distances, allocations[:, np.newaxis], axis=1),
+                           axis=(1, 2))
+        return scores, allocations, centeroids
+
+    def _inital_centroids(self, n_clusters, n_restarts=1):
+        """
+        Choose starting centeroids from the points with kmeans++,
+        each point after the first is chosen with probability proportional
+        to its distance from the closest centeroid already chosen.
 
+        Parameters
+        ----------
+        n_clusters : int
+            number of clusters to make
+        n_restarts : int
+            number of starting points
+            (Default; 1)
 
-    def _inital_centroids(self, n_clusters):
-        indices = np.random.choice(self.n_points, n_clusters, replace=False)
-        return self.points[indices]
+        Returns
+        -------
+        centeroids : 3d array of floats
+            position of each cluster in each restart
+        """
+        restarts = np.arange(n_restarts)[:, np.newaxis]
+        chosen = np.empty((n_restarts, n_clusters), dtype=int)
+        chosen[:, 0] = np.random.randint(self.n_points, size=n_restarts)
+        closest = np.full((n_restarts, self.n_points), np.inf)
+        for cluster_n in range(1, n_clusters):
+            found = self.distance_function(self.points[chosen[:, cluster_n-1]],
+                                           self.points, None, None)
+            closest = np.fmin(closest, found)
+            weights = np.nan_to_num(np.clip(closest, 0, None), posinf=0.)
+            weights[restarts, chosen[:, :cluster_n]] = 0.  # no point is chosen twice
+            # if all the points are at the centeroids, choose any other point
+            no_weight = np.sum(weights, axis=1) <= 0
+            weights[no_weight] = 1.
+            weights[restarts[no_weight], chosen[no_weight, :cluster_n]] = 0.
+            cumulative = np.cumsum(weights, axis=1)
+            draws = np.random.random(n_restarts)*cumulative[:, -1]
+            chosen[:, cluster_n] = np.sum(cumulative <= draws[:, np.newaxis], axis=1)
+        return self.points[chosen].astype(float)
 
 
 class PseudoJet:
@@ -181,7 +286,7 @@ class PseudoJet:
             self.float_columns[idx] = self.float_columns[idx].replace("_Rapidity",
                                                                       "_PseudoRapidity")
         # make a table of ints and a table of floats
-        # lists not arrays, becuase they will grow
+        # preallocated arrays, with room for the rows made by merging
         self._set_column_numbers()
         if isinstance(eventWise, str):
             assert selected_index is not None, \
@@ -195,34 +300,29 @@ class PseudoJet:
                 "Must specify an index (event number) for the eventWise"
         if ints_floats is not None:
             assert len(ints_floats) == 2
-            self._ints = ints_floats[0]
-            self._floats = ints_floats[1]
-            if isinstance(self._ints, np.ndarray):
-                # these are forced into list format
-                self._ints = self._ints.tolist()
-            if isinstance(self._floats, np.ndarray):
-                self._floats = self._floats.tolist()
+            self._set_tables(*ints_floats)
             self.root_jetInputIdxs = kwargs.get('root_jetInputIdxs', [])
             self.n_inputs = 0  # there are no raw inputs
         else:
             assert "JetInputs_PT" in eventWise.columns, "eventWise must have JetInputs"
             assert isinstance(eventWise.selected_index, int), "selected index should be int"
             self.n_inputs = len(eventWise.JetInputs_PT)
-            self._ints = [[i, -1, -1, -1, -1] for i in range(self.n_inputs)]
+            ints = np.full((self.n_inputs, len(self.int_columns)), -1, dtype=int)
+            ints[:, self._InputIdx_col] = np.arange(self.n_inputs)
             if self.from_PseudoRapidity:
                 rapidity_var = eventWise.JetInputs_PseudoRapidity
             else:
                 rapidity_var = eventWise.JetInputs_Rapidity
-            self._floats = np.vstack((eventWise.JetInputs_PT,
-                                      rapidity_var,
-                                      eventWise.JetInputs_Phi,
-                                      eventWise.JetInputs_Energy,
-                                      eventWise.JetInputs_Px,
-                                      eventWise.JetInputs_Py,
-                                      eventWise.JetInputs_Pz,
-                                      np.zeros(self.n_inputs),  # Join distance
-                                      np.ones(self.n_inputs))).T # Size
-            self._floats = self._floats.tolist()
+            floats = np.vstack((eventWise.JetInputs_PT,
+                                rapidity_var,
+                                eventWise.JetInputs_Phi,
+                                eventWise.JetInputs_Energy,
+                                eventWise.JetInputs_Px,
+                                eventWise.JetInputs_Py,
+                                eventWise.JetInputs_Pz,
+                                np.zeros(self.n_inputs),  # Join distance
+                                np.ones(self.n_inputs))).T # Size
+            self._set_tables(ints, floats)
             # as we go note the root notes of the pseudojets
             self.root_jetInputIdxs = []
         # define the physical distance measure
@@ -292,7 +392,7 @@ class PseudoJet:
     def _get_event_mass(self):
         """ Should be called in constructor, and assigned to self.event_mass, 
         don't need to call again"""
-        floats = np.array(self._floats)[self.Child1==-1]
+        floats = self._floats[self.Child1==-1]
         if len(floats) == 0:
             return 0.
         invarient_mass2 = (np.sum(floats[:, self._Energy_col])**2 
@@ -590,10 +690,170 @@ class PseudoJet:
         new_attrs = set(super().__dir__())
         return sorted(new_attrs)
 
+    @staticmethod
+    def _preallocate(values, n_columns, dtype):
+        """
+        Make a table with space for the rows that merging will add.
+        Every merge adds one row, so twice the starting length
+        is enough to cluster the rows to completion.
+
+        Parameters
+        ----------
+        values : 2d array like
+            starting rows of the table
+        n_columns : int
+            number of columns in the table,
+            only used if the values are empty
+        dtype : type
+            type of the table
+
+        Returns
+        -------
+        table : 2d numpy array
+            array with the values in the first rows
+        """
+        values = np.array(values, dtype=dtype)
+        if values.ndim != 2:
+            values = values.reshape((-1, n_columns))
+        table = np.empty((2*len(values) + 1, values.shape[1]), dtype=dtype)
+        table[:len(values)] = values
+        return table
+
+    def _set_tables(self, ints, floats):
+        """
+        Replace the int and float tables
+
+        Parameters
+        ----------
+        ints : 2d array like of ints
+            int columns of each pseudojet, order as per the column attributes
+        floats : 2d array like of floats
+            float columns of each pseudojet, order as per the column attributes
+        """
+        self._int_table = self._preallocate(ints, len(self.int_columns), int)
+        self._float_table = self._preallocate(floats, len(self.float_columns), float)
+        self._n_rows = len(ints)
+        self._reset_ids()
+
+    def _reset_ids(self):
+        """
+        Forget the row each id was found in, and find the next free id.
+        Needed whenever the int table is replaced.
+        """
+        self._row_of_id = None
+        ids = self._ints[:, self._InputIdx_col]
+        self._next_id = int(np.max(ids, initial=-1)) + 1
+
+    @property
+    def _ints(self):
+        """ The int columns of each pseudojet, a view on the table in use """
+        return self._int_table[:self._n_rows]
+
+    @_ints.setter
+    def _ints(self, ints):
+        self._int_table = self._preallocate(ints, len(self.int_columns), int)
+        self._n_rows = len(ints)
+        self._reset_ids()
+
+    @property
+    def _floats(self):
+        """ The float columns of each pseudojet, a view on the table in use """
+        return self._float_table[:self._n_rows]
+
+    @_floats.setter
+    def _floats(self, floats):
+        self._float_table = self._preallocate(floats, len(self.float_columns), float)
+        self._n_rows = len(floats)
+        self._reset_ids()
+
+    def _append_row(self, ints, floats):
+        """
+        Add a row to the end of the tables, growing them if they are full.
+
+        Parameters
+        ----------
+        ints : array like of ints
+            int columns of the new row
+        floats : array like of floats
+            float columns of the new row
+        """
+        if self._n_rows >= min(len(self._int_table), len(self._float_table)):
+            self._int_table = self._preallocate(self._ints, len(self.int_columns), int)
+            self._float_table = self._preallocate(self._floats, len(self.float_columns), float)
+        self._int_table[self._n_rows] = ints
+        self._float_table[self._n_rows] = floats
+        new_id = int(self._int_table[self._n_rows, self._InputIdx_col])
+        if self._row_of_id is not None:
+            self._row_of_id.setdefault(new_id, self._n_rows)
+        self._next_id = max(self._next_id, new_id + 1)
+        self._n_rows += 1
+
+    def _move_to_back(self, pseudojet_index):
+        """
+        Move a row to the back of the tables,
+        shifting the rows after it forward by one.
+
+        Parameters
+        ----------
+        pseudojet_index : int
+            index of the row to move
+        """
+        last = self._n_rows - 1
+        for table in (self._int_table, self._float_table):
+            row = table[pseudojet_index].copy()
+            table[pseudojet_index:last] = table[pseudojet_index+1:last+1]
+            table[last] = row
+        if self._row_of_id is not None:
+            # the rows after this one each moved forward one place
+            row_of_id = self._row_of_id
+            shifted = self._int_table[pseudojet_index:last, self._InputIdx_col].tolist()
+            for row_n, jet_id in enumerate(shifted, pseudojet_index):
+                if row_of_id[jet_id] == row_n + 1:
+                    row_of_id[jet_id] = row_n
+            moved_id = int(self._int_table[last, self._InputIdx_col])
+            if row_of_id[moved_id] == pseudojet_index:
+                # ids can repeat, the first row with the id is kept
+                row_of_id[moved_id] = pseudojet_index + shifted.index(moved_id) \
+                    if moved_id in shifted else last
+
+    def _place_merged(self, remove_index, replace_index, new_ints, new_floats):
+        """
+        Move the two rows that have been merged to the back of the tables,
+        and put the merged pseudojet in place of the second.
+
+        Parameters
+        ----------
+        remove_index : int
+            index of the jet that will be removed (moved to the back)
+        replace_index : int
+            index of the jet that will be replaced by the combined jet
+            (current jet will be moved to the back)
+        new_ints : list of ints
+            int columns of the combined pseudojet
+        new_floats : list of floats
+            float columns of the combined pseudojet
+        """
+        # move the first pseudojet to the back without replacement
+        self._move_to_back(remove_index)
+        # move the second pseudojet to the back but replace it with the new pseudojet
+        old_id = int(self._int_table[replace_index, self._InputIdx_col])
+        self._append_row(self._ints[replace_index], self._floats[replace_index])
+        self._int_table[replace_index] = new_ints
+        self._float_table[replace_index] = new_floats
+        new_id = int(self._int_table[replace_index, self._InputIdx_col])
+        self._next_id = max(self._next_id, new_id + 1)
+        if self._row_of_id is not None:
+            row_of_id = self._row_of_id
+            if row_of_id.get(old_id) == replace_index:
+                later = self._ints[replace_index+1:, self._InputIdx_col]
+                row_of_id[old_id] = replace_index + 1 + int(np.argmax(later == old_id))
+            if row_of_id.get(new_id, self._n_rows) > replace_index:
+                row_of_id[new_id] = replace_index
+
     def _get_currently_avalible(self):
         """ Update the cound of how many pseudojets could pottentially be combined """
         # keep track of how many clusters don't yet have a parent
-        return sum([p[self._Parent_col] == -1 for p in self._ints])
+        return int(np.sum(self._ints[:, self._Parent_col] == -1))
 
     def __getattr__(self, attr_name):
         """
@@ -609,8 +869,7 @@ class PseudoJet:
             # floats return the value of the root
             # or list if more than one root
             col_num = getattr(self, self._float_contents[attr_name])
-            values = np.array([floats[col_num] for floats, ints in zip(self._floats, self._ints)
-                               if ints[self._Parent_col] == -1])
+            values = self._floats[self._ints[:, self._Parent_col] == -1, col_num]
             if attr_name == 'Phi':  # make sure it's -pi to pi
                 values = Components.confine_angle(values)
             if len(values) == 0:
@@ -621,7 +880,10 @@ class PseudoJet:
         if attr_name in self._int_contents:
             # ints return every value
             col_num = getattr(self, self._int_contents[attr_name])
-            return np.fromiter((ints[col_num] for ints in self._ints), dtype=int)
+            # a view on the table, so it must not be written to
+            column = self._ints[:, col_num]
+            column.flags.writeable = False
+            return column
         elif attr_name == "Rapidity":
             # if the jet was constructed with pseudorapidity
             # we might still want to know the rapidity
@@ -702,15 +964,14 @@ class PseudoJet:
         for jet in pseudojets:
             assert jet.eventWise == pseudojets[0].eventWise
             arrays[jet_name + "_RootInputIdx"][event_index].append(awkward.fromiter(jet.root_jetInputIdxs))
-            # if an array is deep it needs converting to an awkward array
-            ints = awkward.fromiter(jet._ints)
             for col_num, name in enumerate(jet.int_columns):
-                arrays[name.replace('PseudoJet', jet_name)][event_index].append(ints[:, col_num])
-            floats = awkward.fromiter(jet._floats)
+                arrays[name.replace('PseudoJet', jet_name)][event_index].append(
+                        jet._ints[:, col_num].copy())
             for col_num, name in enumerate(jet.float_columns):
                 if "_PerfectDenominator" in name:
                     continue
-                arrays[name.replace('PseudoJet', jet_name)][event_index].append(floats[:, col_num])
+                arrays[name.replace('PseudoJet', jet_name)][event_index].append(
+                        jet._floats[:, col_num].copy())
         return arrays
 
     def create_param_dict(self):
@@ -793,11 +1054,82 @@ class PseudoJet:
                     if written_params[name] != my_params[name]:
                         return False
         else:  # save the jets params
-            new_hyper = {jet_name + '_' + name: my_params[name] for name in my_params}
-            eventWise.append_hyperparameters(**new_hyper)
+            JetRegistry.of(eventWise).register(jet_name, my_params)
         # if we get here everything went well
         return True
 
+    @classmethod
+    def read_trees(cls, eventWise, jet_name="Pseudojet", event_start=0, event_stop=None,
+                   float_columns=None):
+        """
+        Read the stored jets of a range of events as one structured array,
+        without making any jet objects.
+        Each column is read for all the events at once.
+
+        Parameters
+        ----------
+        eventWise : string or eventWise
+            path of an eventWise file with jets in or the eventWise itself
+        jet_name: string
+            name of the jet for prefixes in the eventWise
+            (Default; "Pseudojet")
+        event_start : int
+            inclusive event to start reading
+            (Default value = 0)
+        event_stop : int
+            exclusive event to end on,
+            if None read to the last event
+            (Default value = None)
+        float_columns : list of strings
+            names of the float columns to read, without the jet name,
+            if None all the float columns of the class are read
+            (Default value = None)
+
+        Returns
+        -------
+        trees : numpy structured array
+            one row for each pseudojet in the events,
+            fields InputIdx, Parent, Child1, Child2 and Rank,
+            then the requested float columns
+        jet_offsets : numpy array of ints
+            the jets of event i are jets jet_offsets[i-event_start]
+            to jet_offsets[i-event_start+1]
+        row_offsets : numpy array of ints
+            the pseudojets of jet j are rows row_offsets[j]
+            to row_offsets[j+1] of the trees
+
+        """
+        if isinstance(eventWise, str):
+            eventWise = Components.EventWise.from_file(eventWise)
+        eventWise.selected_index = None
+        int_columns = [c.split('_', 1)[1] for c in cls.int_columns]
+        if float_columns is None:
+            float_columns = [c.split('_', 1)[1] for c in cls.float_columns
+                             if "_PerfectDenominator" not in c]
+            # check if its a pseudorapidty jet
+            if jet_name + "_Rapidity" not in eventWise.columns:
+                assert jet_name + "_PseudoRapidity" in eventWise.columns
+                float_columns[float_columns.index("Rapidity")] = "PseudoRapidity"
+        n_events = len(getattr(eventWise, jet_name + "_" + int_columns[0]))
+        if event_stop is None or event_stop > n_events:
+            event_stop = n_events
+        event_start = min(event_start, event_stop)
+        dtype = [(name, int) for name in int_columns] + \
+                [(name, float) for name in float_columns]
+        trees = None
+        for name in int_columns + float_columns:
+            column = Components.event_chunk(getattr(eventWise, jet_name + "_" + name),
+                                            event_start, event_stop)
+            offsets, content = Components.flat_structure(column)
+            if trees is None:
+                # events with no jets may have left the column too shallow
+                while len(offsets) < 2:
+                    offsets.append(np.zeros(1, dtype=int))
+                jet_offsets, row_offsets = offsets
+                trees = np.empty(len(content), dtype=dtype)
+            trees[name] = content
+        return trees, jet_offsets, row_offsets
+
     @classmethod
     def multi_from_file(cls, eventWise, event_idx=None, jet_name="Pseudojet",
                         batch_start=None, batch_end=None):
@@ -825,20 +1157,17 @@ class PseudoJet:
             the read jets
 
         """
-        int_columns = [c.replace('Pseudojet', jet_name) for c in cls.int_columns]
-        float_columns = [c.replace('Pseudojet', jet_name) for c in cls.float_columns]
         # could write a version that just read one jet if needed
         if isinstance(eventWise, str):
             eventWise = Components.EventWise.from_file(eventWise)
         if event_idx is not None:
             eventWise.selected_index = event_idx
-        assert eventWise.selected_index is not None
-        # check if its a pseudorapidty jet
-        if jet_name + "_Rapidity" not in eventWise.columns:
-            assert jet_name + "_PseudoRapidity" in eventWise.columns
-            idx = float_columns.index(jet_name + "_Rapidity")
-            float_columns[idx] = float_columns[idx].replace("_Rapidity", "_PseudoRapidity")
-        avalible = len(getattr(eventWise, int_columns[0]))
+        selected_index = eventWise.selected_index
+        assert selected_index is not None
+        trees, _, row_offsets = cls.read_trees(eventWise, jet_name,
+                                               selected_index, selected_index + 1)
+        eventWise.selected_index = selected_index
+        avalible = len(row_offsets) - 1
         # decide on the start and stop points
         if batch_start is None:
             batch_start = 0
@@ -849,21 +1178,17 @@ class PseudoJet:
         # get from the file
         jets = []
         param_dict = get_jet_params(eventWise, jet_name)
+        int_names = [c.split('_', 1)[1] for c in cls.int_columns]
+        float_names = trees.dtype.names[len(int_names):]
+        ints = np.column_stack([trees[name] for name in int_names])
+        floats = np.column_stack([trees[name] for name in float_names])
         for i in range(batch_start, batch_end):
             roots = getattr(eventWise, jet_name + "_RootInputIdx")[i]
-            # need to reassemble to ints and the floats
-            int_values = []
-            for name in int_columns:
-                int_values.append(np.array(getattr(eventWise, name)[i]).reshape((-1, 1)))
-            ints = np.hstack(int_values)
-            float_values = []
-            for name in float_columns:
-                float_values.append(np.array(getattr(eventWise, name)[i]).reshape((-1, 1)))
-            floats = np.hstack(float_values)
+            rows = slice(row_offsets[i], row_offsets[i+1])
             # it is needed to copy the eventWise to prevent it from being altered
             new_jet = cls(eventWise=eventWise,
                           selected_index=event_idx,
-                          ints_floats=(ints.tolist(), floats.tolist()),
+                          ints_floats=(ints[rows].copy(), floats[rows].copy()),
                           root_jetInputIdxs=roots,
                           dict_jet_params=param_dict)
             new_jet.currently_avalible = 0  # assumed since we are reading from file
@@ -877,9 +1202,10 @@ class PseudoJet:
         assert self.currently_avalible == 0, "Assign parents before you calculate roots"
         pseudojet_ids = self.InputIdx
         parent_ids = self.Parent
+        present_ids = set(pseudojet_ids.tolist())
         for mid, pid in zip(parent_ids, pseudojet_ids):
             if (mid == -1 or
-                mid not in pseudojet_ids or
+                mid not in present_ids or
                 mid == pid):
                 self.root_jetInputIdxs.append(pid)
 
@@ -903,8 +1229,8 @@ class PseudoJet:
         for root in self.root_jetInputIdxs:
             group = self.get_decendants(lastOnly=False, jetInputIdx=root)
             group_idx = [self.idx_from_inpIdx(ID) for ID in group]
-            ints = [self._ints[i] for i in group_idx]
-            floats = [self._floats[i] for i in group_idx]
+            ints = self._ints[group_idx]
+            floats = self._floats[group_idx]
             jet = type(self)(ints_floats=(ints, floats),
                              jet_name=self.jet_name,
                              selected_index=self.eventWise.selected_index,
@@ -953,18 +1279,8 @@ class PseudoJet:
         replace_index, remove_index = sorted([pseudojet_index1, pseudojet_index2])
         new_pseudojet_ints, new_pseudojet_floats = \
                 self._combine(remove_index, replace_index, distance2)
-        # move the first pseudojet to the back without replacement
-        pseudojet1_ints = self._ints.pop(remove_index)
-        pseudojet1_floats = self._floats.pop(remove_index)
-        self._ints.append(pseudojet1_ints)
-        self._floats.append(pseudojet1_floats)
-        # move the second pseudojet to the back but replace it with the new pseudojet
-        pseudojet2_ints = self._ints[replace_index]
-        pseudojet2_floats = self._floats[replace_index]
-        self._ints.append(pseudojet2_ints)
-        self._floats.append(pseudojet2_floats)
-        self._ints[replace_index] = new_pseudojet_ints
-        self._floats[replace_index] = new_pseudojet_floats
+        self._place_merged(remove_index, replace_index,
+                           new_pseudojet_ints, new_pseudojet_floats)
         # one less pseudojet avalible
         self.currently_avalible -= 1
         # now recalculate for the new pseudojet
@@ -982,17 +1298,26 @@ class PseudoJet:
 
         """
         # move the first pseudojet to the back without replacement
-        pseudojet_ints = self._ints.pop(pseudojet_index)
-        pseudojet_floats = self._floats.pop(pseudojet_index)
-        self._ints.append(pseudojet_ints)
-        self._floats.append(pseudojet_floats)
-        self.root_jetInputIdxs.append(pseudojet_ints[self._InputIdx_col])
+        self._move_to_back(pseudojet_index)
+        self.root_jetInputIdxs.append(int(self._ints[-1, self._InputIdx_col]))
         # delete the row and column
-        self._distances2 = np.delete(self._distances2, (pseudojet_index), axis=0)
-        self._distances2 = np.delete(self._distances2, (pseudojet_index), axis=1)
+        self._remove_distances(pseudojet_index)
         # one less pseudojet avalible
         self.currently_avalible -= 1
 
+    def _remove_distances(self, pseudojet_index):
+        """
+        Remove the distances of a pseudojet that is no longer avalible.
+
+        Parameters
+        ----------
+        pseudojet_index : int
+            index to remove
+
+        """
+        self._distances2 = np.delete(self._distances2, (pseudojet_index), axis=0)
+        self._distances2 = np.delete(self._distances2, (pseudojet_index), axis=1)
+
     def idx_from_inpIdx(self, jetInputIdx):
         """
         Given a JetInputIdx, which may be an idx of one of the jet inputs,
@@ -1009,12 +1334,13 @@ class PseudoJet:
         pseudojet_idx : int
             the row number of this jetInputIdx
         """
-        col = self._InputIdx_col
+        if self._row_of_id is None:
+            ids = self._ints[:, self._InputIdx_col].tolist()
+            # reversed, so if an id is repeated the first row is kept
+            self._row_of_id = dict(zip(reversed(ids), range(len(ids)-1, -1, -1)))
         try:
-            pseudojet_idx = next((idx for idx, row in enumerate(self._ints)
-                                  if row[col] == jetInputIdx))
-            return pseudojet_idx
-        except StopIteration:
+            return self._row_of_id[jetInputIdx]
+        except KeyError:
             raise ValueError(f"No pseudojet with ID {jetInputIdx}")
 
     def get_decendants(self, lastOnly=True, jetInputIdx=None, pseudojet_idx=None):
@@ -1046,22 +1372,24 @@ class PseudoJet:
         if pseudojet_idx is None:
             pseudojet_idx = self.idx_from_inpIdx(jetInputIdx)
         elif jetInputIdx is None:
-            jetInputIdx = self._ints[pseudojet_idx][self._InputIdx_col]
+            jetInputIdx = int(self._ints[pseudojet_idx, self._InputIdx_col])
         decendents = []
+        # everything in decendents, or passed over, goes in seen
+        seen = set()
         if not lastOnly:
             decendents.append(jetInputIdx)
+            seen.add(jetInputIdx)
         # make local variables for speed
-        local_obs = self.local_obs_idx()
+        ints = self._ints
         child1_col = self._Child1_col
         child2_col = self._Child2_col
         # bu this point we have the first pseudojet
-        if pseudojet_idx in local_obs:
+        child1 = int(ints[pseudojet_idx, child1_col])
+        child2 = int(ints[pseudojet_idx, child2_col])
+        if child1 < 0 and child2 < 0:
             # just the one
             return [jetInputIdx]
         to_check = []
-        ignore = []
-        child1 = self._ints[pseudojet_idx][child1_col]
-        child2 = self._ints[pseudojet_idx][child2_col]
         if child1 >= 0:
             to_check.append(child1)
         if child2 >= 0:
@@ -1069,15 +1397,15 @@ class PseudoJet:
         while len(to_check) > 0:
             jetInputIdx = to_check.pop()
             pseudojet_idx = self.idx_from_inpIdx(jetInputIdx)
-            if (pseudojet_idx in local_obs or not lastOnly):
+            child1 = int(ints[pseudojet_idx, child1_col])
+            child2 = int(ints[pseudojet_idx, child2_col])
+            is_obs = child1 < 0 and child2 < 0
+            if (is_obs or not lastOnly):
                 decendents.append(jetInputIdx)
-            else:
-                ignore.append(jetInputIdx)
-            child1 = self._ints[pseudojet_idx][child1_col]
-            child2 = self._ints[pseudojet_idx][child2_col]
-            if child1 >= 0 and child1 not in (decendents + ignore):
+            seen.add(jetInputIdx)
+            if child1 >= 0 and child1 not in seen:
                 to_check.append(child1)
-            if child2 >= 0 and child2 not in (decendents + ignore):
+            if child2 >= 0 and child2 not in seen:
                 to_check.append(child2)
         return decendents
 
@@ -1090,10 +1418,9 @@ class PseudoJet:
         idx_are_obs : list of ints
             local idx of the observable pseudojets
         """
-        idx_are_obs = [i for i in range(len(self)) if
-                       (self._ints[i][self._Child1_col] < 0 and
-                        self._ints[i][self._Child2_col] < 0)]
-        return idx_are_obs
+        idx_are_obs = np.flatnonzero(np.logical_and(self._ints[:, self._Child1_col] < 0,
+                                                    self._ints[:, self._Child2_col] < 0))
+        return idx_are_obs.tolist()
 
     def _combine(self, pseudojet_index1, pseudojet_index2, distance2):
         """
@@ -1115,24 +1442,25 @@ class PseudoJet:
         floats : list of floats
             float columns of the combined pseudojet, order as per the column attributes
         """
-        new_id = max([ints[self._InputIdx_col] for ints in self._ints]) + 1
-        self._ints[pseudojet_index1][self._Parent_col] = new_id
-        self._ints[pseudojet_index2][self._Parent_col] = new_id
-        rank = max(self._ints[pseudojet_index1][self._Rank_col],
-                   self._ints[pseudojet_index2][self._Rank_col]) + 1
+        ints1 = self._ints[pseudojet_index1]
+        ints2 = self._ints[pseudojet_index2]
+        # the id is only used up when the new pseudojet is placed
+        new_id = self._next_id
+        ints1[self._Parent_col] = new_id
+        ints2[self._Parent_col] = new_id
+        rank = int(max(ints1[self._Rank_col], ints2[self._Rank_col])) + 1
         # inputidx, parent, child1, child2 rank
         # child1 shoul
         ints = [new_id,
                 -1,
-                self._ints[pseudojet_index1][self._InputIdx_col],
-                self._ints[pseudojet_index2][self._InputIdx_col],
+                int(ints1[self._InputIdx_col]),
+                int(ints2[self._InputIdx_col]),
                 rank]
         # PT px py pz eta phi energy join_distance
         # it's easier conceptually to calculate pt, phi and rapidity afresh than derive them
         # from the exisiting pt, phis and rapidity
-        floats = [f1 + f2 for f1, f2 in
-                  zip(self._floats[pseudojet_index1],
-                      self._floats[pseudojet_index2])]
+        floats = (self._floats[pseudojet_index1] +
+                  self._floats[pseudojet_index2]).tolist()
         px = floats[self._Px_col]
         py = floats[self._Py_col]
         pz = floats[self._Pz_col]
@@ -1155,13 +1483,13 @@ class PseudoJet:
 
     def __len__(self):
         """ consider the length to be equal to the number of pseudojets """
-        return len(self._ints)
+        return self._n_rows
 
     def __eq__(self, other):
         """ consider pseudojets to eb equal if their ints and flaots are equal """
         if len(self) != len(other):
             return False
-        ints_eq = self._ints == other._ints
+        ints_eq = np.array_equal(self._ints, other._ints)
         floats_eq = np.allclose(self._floats, other._floats)
         return ints_eq and floats_eq
 
@@ -1213,6 +1541,9 @@ class Traditional(PseudoJet):
                        'ExpofPTFormat': ['min', 'Luclus'],
                        'ExpofPTMultiplier': Constants.numeric_classes['rn'],
                        'PhyDistance': ['angular', 'normed', 'invarient', 'taxicab']}
+    # events with at least this many inputs are clustered on
+    # rapidity-phi tiles when the distance measure allows it
+    min_tiled_inputs = 1000
     def __init__(self, eventWise=None, dict_jet_params=None, **kwargs):
         """
         Class constructor
@@ -1254,30 +1585,188 @@ class Traditional(PseudoJet):
             kwargs['dict_jet_params'] = dict_jet_params
         super().__init__(eventWise, **kwargs)
 
+    @property
+    def _distances2(self):
+        """
+        Distances squared between the avalible pseudojets,
+        with the distance to the beam on the diagonal.
+        This is a copy, the clustering works on _slot_distances2.
+        Not avalible when clustering on tiles,
+        as only the distances in reach of each tile are found.
+        """
+        if self._tiled:
+            raise ValueError("Distances between all pseudojets are not kept when tiled")
+        active = self._active_slots
+        return self._slot_distances2[np.ix_(active, active)]
+
+    @_distances2.setter
+    def _distances2(self, distances2):
+        """
+        Distances are stored against the slot each pseudojet had when the
+        distances were set. Avalible pseudojets never change order,
+        so the slots of the avalible pseudojets are always ascending.
+        """
+        self._tiled = False
+        self._slot_distances2 = np.array(distances2, dtype=float)
+        n_slots = len(self._slot_distances2)
+        self._active_slots = np.arange(n_slots)
+        self._reset_nearest(n_slots)
+        self._update_nearest(self._active_slots)
+
+    def _reset_nearest(self, n_slots):
+        """
+        Start empty caches of the nearest neighbour of each slot.
+        The nearest distances are also kept in a heap, so the closest
+        pair is found without searching every slot.
+        Heap entries are not removed when they go out of date,
+        they are skipped when they reach the top.
+
+        Parameters
+        ----------
+        n_slots : int
+            number of slots
+        """
+        # each slot caches it's nearest neighbour (which may be the beam)
+        self._nearest_slot = np.full(n_slots, -1, dtype=int)
+        self._nearest_distance2 = np.full(n_slots, np.inf)
+        self._slot_active = np.ones(n_slots, dtype=bool)
+        self._nearest_heap = []
+
+    def _set_nearest(self, slots, nearest_slots, distances2):
+        """
+        Record the nearest neighbour of some slots.
+
+        Parameters
+        ----------
+        slots : array of ints
+            slots to update
+        nearest_slots : array of ints
+            nearest slot to each of them
+        distances2 : array of floats
+            distance squared to the nearest slot
+        """
+        self._nearest_slot[slots] = nearest_slots
+        self._nearest_distance2[slots] = distances2
+        heap = self._nearest_heap
+        for slot, distance2 in zip(np.atleast_1d(slots).tolist(),
+                                   np.atleast_1d(self._nearest_distance2[slots]).tolist()):
+            # as np.argmin would, nan counts as smallest and ties go to the first slot
+            if distance2 != distance2:  # nan
+                heapq.heappush(heap, (False, 0., slot))
+            else:
+                heapq.heappush(heap, (True, distance2, slot))
+
+    def _closest_slot(self):
+        """
+        The avalible slot with the smallest nearest neighbour distance,
+        the same slot as an argmin over the active nearest distances.
+
+        Returns
+        -------
+        slot : int
+            the slot to merge or remove next
+        """
+        heap = self._nearest_heap
+        if len(heap) > 4*len(self._active_slots) + 64:
+            # too many out of date entries, start again from the active slots
+            active = self._active_slots
+            heap.clear()
+            self._set_nearest(active, self._nearest_slot[active],
+                              self._nearest_distance2[active])
+        while True:
+            is_number, distance2, slot = heap[0]
+            if self._slot_active[slot]:
+                current = self._nearest_distance2[slot]
+                if (current == distance2) if is_number else (current != current):
+                    return slot
+            heapq.heappop(heap)
+
+    def _update_nearest(self, slots):
+        """
+        Recalculate the nearest neighbour of some slots
+        from the full row of distances.
+        Ties go to the first slot, as np.argmin would choose.
+
+        Parameters
+        ----------
+        slots : array of ints
+            slots to update
+
+        """
+        if len(slots) == 0 or len(self._active_slots) == 0:
+            return
+        if self._tiled:
+            self._update_nearest_tiled(slots)
+            return
+        rows = self._slot_distances2[np.ix_(slots, self._active_slots)]
+        nearest = np.argmin(rows, axis=1)
+        self._set_nearest(slots, self._active_slots[nearest],
+                          rows[np.arange(len(slots)), nearest])
+
+    def _step_assign_parents(self):
+        """
+        Take a single step to join pseudojets.
+        Finds the same pair as an argmin over _distances2, but only
+        the top of the heap of nearest neighbours needs to be searched.
+        """
+        active = self._active_slots
+        row_slot = self._closest_slot()
+        row = int(np.searchsorted(active, row_slot))
+        column_slot = self._nearest_slot[row_slot]
+        if row_slot == column_slot:
+            self._remove_pseudojet(row)
+            return row
+        column = np.searchsorted(active, column_slot)
+        self._merge_pseudojets(row, column, self._nearest_distance2[row_slot])
+        return None
+
+    def _remove_distances(self, pseudojet_index):
+        """
+        Remove the distances of a pseudojet that is no longer avalible.
+
+        Parameters
+        ----------
+        pseudojet_index : int
+            index to remove
+
+        """
+        removed_slot = self._active_slots[pseudojet_index]
+        self._active_slots = np.delete(self._active_slots, pseudojet_index)
+        self._slot_active[removed_slot] = False
+        if self._tiled:
+            self._tiles[self._slot_tile[removed_slot]].discard(removed_slot)
+        # only slots that were nearest to the removed slot are changed
+        active = self._active_slots
+        self._update_nearest(active[self._nearest_slot[active] == removed_slot])
+
     def _set_distances(self, checkpoints=None):
         """ Calculate all distances between avalible pseudojets """
         # this is caluculating all the distances
         avalible_floats = self._floats[:self.currently_avalible]
+        if checkpoints is None and self._can_tile(avalible_floats):
+            self._set_tiles(avalible_floats)
+            return
         checkpoint_name = 'physical_distances2'
         if checkpoints is not None and checkpoint_name in checkpoints:
             self._distances2 = checkpoints[checkpoint_name]
         else:
-            self._distances2 = self.physical_distance2(avalible_floats, avalible_floats)
-            infinite_distance = np.isinf(self._distances2)
+            distances2 = self.physical_distance2(avalible_floats, avalible_floats)
+            infinite_distance = np.isinf(distances2)
             if np.any(infinite_distance):
                 # soft radation may create undesirable infinities
-                soft_radiation = np.fromiter((row[self._PT_col] == 0 for row in avalible_floats),
-                                             dtype=bool)
+                soft_radiation = avalible_floats[:, self._PT_col] == 0
                 # if this has occured make them 0
-                self._distances2[np.logical_and(soft_radiation, infinite_distance)] = 0
+                distances2[np.logical_and(soft_radiation, infinite_distance)] = 0
             # finally, add the diagonals
-            np.fill_diagonal(self._distances2, self.beam_distance2(avalible_floats))
+            np.fill_diagonal(distances2, self.beam_distance2(avalible_floats))
+            self._distances2 = distances2
             if checkpoints is not None:
-                checkpoints[checkpoint_name] = self._distances2
+                checkpoints[checkpoint_name] = distances2
 
     def _recalculate_one(self, remove_index, replace_index):
         """
-        Recalculate all the distances involving one pseudojet
+        Recalculate all the distances involving one pseudojet,
+        and the nearest neighbours that they change.
 
         Parameters
         ----------
@@ -1291,15 +1780,240 @@ class Traditional(PseudoJet):
         """
         # delete the larger index keep the smaller index
         assert remove_index > replace_index
-        # delete the first row and column of the merge
-        self._distances2 = np.delete(self._distances2, (remove_index), axis=0)
-        self._distances2 = np.delete(self._distances2, (remove_index), axis=1)
-
+        remove_slot = self._active_slots[remove_index]
+        replace_slot = self._active_slots[replace_index]
+        self._active_slots = np.delete(self._active_slots, remove_index)
+        self._slot_active[remove_slot] = False
+        if self._tiled:
+            self._recalculate_tiled(remove_slot, replace_slot, replace_index)
+            return
+        active = self._active_slots
         # calculate new values into the second column
         new_distances = self.physical_distance2(self._floats[replace_index],
                                                 self._floats[:self.currently_avalible])
         new_distances[:, replace_index] = self.beam_distance2(self._floats[replace_index])
-        self._distances2[replace_index] = self._distances2[:, replace_index] = new_distances
+        new_distances = new_distances.flatten()
+        self._slot_distances2[replace_slot, active] = new_distances
+        self._slot_distances2[active, replace_slot] = new_distances
+        # slots that were nearest to either merged pseudojet must be searched again
+        nearest = self._nearest_slot[active]
+        stale = np.logical_or(nearest == remove_slot, nearest == replace_slot)
+        stale[replace_index] = True
+        # the rest only need checking against the new pseudojet
+        # as np.argmin would, nan counts as smallest and ties go to the first slot
+        current = self._nearest_distance2[active]
+        closer = np.logical_or(new_distances < current,
+                               np.logical_and(np.isnan(new_distances), ~np.isnan(current)))
+        tied = np.logical_or(new_distances == current,
+                             np.logical_and(np.isnan(new_distances), np.isnan(current)))
+        closer = np.logical_or(closer, np.logical_and(tied, replace_slot < nearest))
+        closer[stale] = False
+        self._set_nearest(active[closer], replace_slot, new_distances[closer])
+        self._update_nearest(active[stale])
+
+    def _can_tile(self, avalible_floats):
+        """
+        Check if the avalible pseudojets can be clustered on rapidity-phi tiles.
+        That needs a distance that only depends on rapidity and phi,
+        scaled by the smaller of the two PT factors, so that a pair
+        further apart than DeltaR is never closer than the beam.
+
+        Parameters
+        ----------
+        avalible_floats : 2d array of floats
+            float rows of the avalible pseudojets
+
+        Returns
+        -------
+        : bool
+            True if tiles can be used
+        """
+        if len(avalible_floats) < self.min_tiled_inputs:
+            return False
+        if self.ExpofPTFormat != 'min' or self.PhyDistance not in ('angular', 'taxicab'):
+            return False
+        if not 0 < self._tile_radius() <= 2*np.pi/3:
+            return False
+        # soft radiation and infinite positions are left to the full matrix
+        positions = avalible_floats[:, [self._Rapidity_col, self._Phi_col]]
+        if not np.all(np.isfinite(positions)) or np.any(avalible_floats[:, self._PT_col] == 0):
+            return False
+        return np.all(np.isfinite(self.beam_distance2(avalible_floats)))
+
+    def _tile_radius(self):
+        """ Largest rapidity or phi seperation a pair can have
+        and still be closer than the beam """
+        if self.PhyDistance == 'taxicab':
+            return self.DeltaR**2
+        return self.DeltaR
+
+    def _set_tiles(self, avalible_floats):
+        """
+        Place the avalible pseudojets on a grid of rapidity-phi tiles,
+        at least one tile radius wide, so that only neighbouring tiles
+        need to be searched for the nearest neighbour.
+        The end tiles in rapidity are unbounded.
+
+        Parameters
+        ----------
+        avalible_floats : 2d array of floats
+            float rows of the avalible pseudojets
+        """
+        self._tiled = True
+        n_slots = len(avalible_floats)
+        self._active_slots = np.arange(n_slots)
+        self._slot_rows = np.array(avalible_floats)
+        radius = self._tile_radius()
+        raps = avalible_floats[:, self._Rapidity_col]
+        self._tile_rap_min = np.min(raps)
+        self._tile_rap_size = radius
+        self._n_rap_tiles = int((np.max(raps) - self._tile_rap_min)/radius) + 1
+        self._n_phi_tiles = int(2*np.pi/radius)
+        self._tile_phi_size = 2*np.pi/self._n_phi_tiles
+        self._slot_tile = self._tile_index(avalible_floats)
+        self._tiles = {}
+        for slot, tile in enumerate(self._slot_tile):
+            self._tiles.setdefault(tile, set()).add(slot)
+        self._neighbour_tiles = {}
+        self._reset_nearest(n_slots)
+        self._update_nearest_tiled(self._active_slots)
+
+    def _tile_index(self, rows):
+        """
+        Find the tile number of some pseudojets
+
+        Parameters
+        ----------
+        rows : 2d array of floats
+            float rows of the pseudojets
+
+        Returns
+        -------
+        tiles : array of ints
+            tile number of each row
+        """
+        rows = np.atleast_2d(rows)
+        rap_tile = np.floor((rows[:, self._Rapidity_col] - self._tile_rap_min)/self._tile_rap_size)
+        rap_tile = np.clip(np.nan_to_num(rap_tile), 0, self._n_rap_tiles - 1).astype(int)
+        phi = Components.confine_angle(rows[:, self._Phi_col]) + np.pi
+        phi_tile = np.floor(np.nan_to_num(phi)/self._tile_phi_size).astype(int)%self._n_phi_tiles
+        return rap_tile*self._n_phi_tiles + phi_tile
+
+    def _tile_candidates(self, tile):
+        """
+        All slots in this tile and the tiles next to it,
+        wrapping round in phi.
+
+        Parameters
+        ----------
+        tile : int
+            tile number
+
+        Returns
+        -------
+        candidates : array of ints
+            ascending slots in reach of this tile
+        """
+        if tile not in self._neighbour_tiles:
+            rap_tile, phi_tile = divmod(tile, self._n_phi_tiles)
+            raps = range(max(rap_tile - 1, 0), min(rap_tile + 2, self._n_rap_tiles))
+            phis = {(phi_tile + shift)%self._n_phi_tiles for shift in (-1, 0, 1)}
+            self._neighbour_tiles[tile] = [r*self._n_phi_tiles + p for r in raps for p in phis]
+        candidates = np.fromiter(itertools.chain.from_iterable(
+            self._tiles.get(neighbour, ()) for neighbour in self._neighbour_tiles[tile]),
+                                 dtype=int)
+        candidates.sort()
+        return candidates
+
+    def _tile_distances2(self, slot):
+        """
+        Distances from one slot to everything in reach of its tile,
+        with the beam distance in place of the distance to itself.
+
+        Parameters
+        ----------
+        slot : int
+            slot of the pseudojet
+
+        Returns
+        -------
+        candidates : array of ints
+            ascending slots in reach of this tile
+        distances2 : array of floats
+            distance squared to each candidate
+        """
+        row = self._slot_rows[slot]
+        candidates = self._tile_candidates(self._slot_tile[slot])
+        distances2 = self.physical_distance2(row, self._slot_rows[candidates]).flatten()
+        distances2[candidates == slot] = self.beam_distance2(row)
+        return candidates, distances2
+
+    def _update_nearest_tiled(self, slots):
+        """
+        Recalculate the nearest neighbour of some slots from the tiles in reach,
+        working one tile at a time.
+
+        Parameters
+        ----------
+        slots : array of ints
+            slots to update
+        """
+        slots = np.asarray(slots)
+        slot_tiles = self._slot_tile[slots]
+        for tile in np.unique(slot_tiles):
+            members = slots[slot_tiles == tile]
+            candidates = self._tile_candidates(tile)
+            distances2 = self.physical_distance2(self._slot_rows[members],
+                                                 self._slot_rows[candidates])
+            member_row, candidate_col = np.where(members[:, None] == candidates)
+            distances2[member_row, candidate_col] = \
+                    self.beam_distance2(self._slot_rows[members]).flatten()
+            nearest = np.argmin(distances2, axis=1)
+            self._set_nearest(members, candidates[nearest],
+                              distances2[np.arange(len(members)), nearest])
+
+    def _recalculate_tiled(self, remove_slot, replace_slot, replace_index):
+        """
+        Move the merged pseudojet to its tile, and update the nearest neighbours
+        in reach of it, or that were nearest to either of the pseudojets merged.
+
+        Parameters
+        ----------
+        remove_slot : int
+            slot of the jet that has been removed
+        replace_slot : int
+            slot of the jet that has been replaced by the combined jet
+        replace_index : int
+            index of the combined jet in the ints/floats
+        """
+        self._tiles[self._slot_tile[remove_slot]].discard(remove_slot)
+        self._tiles[self._slot_tile[replace_slot]].discard(replace_slot)
+        self._slot_rows[replace_slot] = self._floats[replace_index]
+        new_tile = self._tile_index(self._slot_rows[replace_slot])[0]
+        self._slot_tile[replace_slot] = new_tile
+        self._tiles.setdefault(new_tile, set()).add(replace_slot)
+        active = self._active_slots
+        nearest = self._nearest_slot[active]
+        # slots that were nearest to the removed pseudojet must be searched again
+        stale = active[nearest == remove_slot]
+        was_replace = active[nearest == replace_slot]
+        # the rest in reach only need checking against the new pseudojet
+        candidates, new_distances = self._tile_distances2(replace_slot)
+        current = self._nearest_distance2[candidates]
+        candidate_nearest = self._nearest_slot[candidates]
+        closer = np.logical_or(new_distances < current,
+                               np.logical_and(new_distances == current,
+                                              replace_slot < candidate_nearest))
+        # if the new pseudojet is no further than before it must still be nearest
+        kept = np.logical_and(candidate_nearest == replace_slot, new_distances <= current)
+        closer = np.logical_or(closer, kept)
+        closer[candidate_nearest == remove_slot] = False
+        closer[candidates == replace_slot] = False
+        self._set_nearest(candidates[closer], replace_slot, new_distances[closer])
+        # those that were nearest the replaced pseudojet, and now are not
+        was_replace = was_replace[~np.isin(was_replace, candidates[kept])]
+        stale = np.concatenate((stale, was_replace, [replace_slot]))
+        self._update_nearest(np.unique(stale))
 
     @classmethod
     def read_fastjet(cls, arg, eventWise, jet_name="FastJet", do_checks=False):
@@ -1308,11 +2022,13 @@ class Traditional(PseudoJet):
 
         Parameters
         ----------
-        arg : string or list of strings
+        arg : string or list of strings or tuple
             if the argument is a sngle string it is the path
             to a directory in which text fiels containing output are stored
             If the argument is a list of strings it is the byte output of the
             fastjet program
+            If the argument is a tuple it is the header, ints and floats
+            returned by FastJetBridge.cluster
         eventWise : EventWise
             data file to assign these jets to
         jet_name : string
@@ -1342,21 +2058,11 @@ class Traditional(PseudoJet):
                 header = ifile.readline()[1:]
             with open(ffile_name, 'r') as ffile:
                 fcolumns = ffile.readline()[1:].split()
+        elif isinstance(arg, tuple):
+            header, fast_ints, fast_floats = arg
+            fcolumns = FastJetBridge.float_columns
         else:
-            header = arg[0].decode()[1:]
-            arrays = [[]]
-            a_type = int
-            for line in arg[1:]:
-                line = line.decode().strip()
-                if line[0] == '#':  # moves from the ints to the doubles
-                    arrays.append([])
-                    a_type = float
-                    fcolumns = line[1:].split()
-                else:
-                    arrays[-1].append([a_type(x) for x in line.split()])
-            assert len(arrays) == 2, f"Problem wiht input; \n{arg}"
-            fast_ints = np.array(arrays[0], dtype=int)
-            fast_floats = np.array(arrays[1], dtype=float)
+            header, fast_ints, fast_floats, fcolumns = FastJetBridge.parse_text(arg)
         # first line will be the tech specs and columns
         header = header.split()
         DeltaR = float(header[0].split('=')[1])
@@ -1569,9 +2275,8 @@ class IterativeCone(PseudoJet):
 
     def _select_seed(self):
         """Pick a seed particle """
-        max_local_idx = np.argmax([row[self._PT_col] for row in
-                                   self._floats[:self.currently_avalible]])
-        if self._floats[max_local_idx][self._PT_col] > self.SeedThreshold:
+        max_local_idx = np.argmax(self._floats[:self.currently_avalible, self._PT_col])
+        if self._floats[max_local_idx, self._PT_col] > self.SeedThreshold:
             return max_local_idx
         else:
             return -1
@@ -1605,6 +2310,17 @@ class Spectral(PseudoJet):
                        'PhyDistance': ['angular', 'normed', 'invarient', 'taxicab'],
                        'Sigma': Constants.numeric_classes['rn'],
                        'StoppingCondition': ['standard', 'beamparticle', 'conductance', 'meandistance']}
+    # events with at least this many inputs build a sparse affinity
+    # from a spatial index when the affinity cutoff allows it
+    min_sparse_inputs = 1000
+    # the dense eigensolver finds the eigenspace exactly,
+    # the iterative eigensolvers only find the eigenvectors requested,
+    # None uses lanczos when the affinity is sparse and dense otherwise
+    eigensolvers = ('dense', 'lanczos', 'lobpcg')
+    eigensolver = None
+    # largest residual accepted from an iterative eigensolver,
+    # relative to the largest eigenvalue found
+    eigensolver_tol = 1e-6
     def __init__(self, eventWise=None, dict_jet_params=None, **kwargs):
         """
         Class constructor
@@ -1633,9 +2349,32 @@ class Spectral(PseudoJet):
         assign : bool (optional)
             Should the jets eb clustered immediatly?
             (Default; False)
+        eigensolver : str (optional)
+            One of eigensolvers, the method used to find the eigenspace.
+            If None, lanczos for a sparse affinity and dense otherwise.
+            (Default; eigensolver)
+        stage_cache : SpectralCache or string (optional)
+            Cache, or directory of a cache, to take the physical distances,
+            affinity, laplacien and eigenspace from before clustering.
+            (Default; None)
         """
         self._set_hyperparams(self.default_params, dict_jet_params, kwargs)
         self._define_calculate_affinity()
+        self.eigensolver = kwargs.pop('eigensolver', self.eigensolver)
+        if self.eigensolver is not None and self.eigensolver not in self.eigensolvers:
+            raise ValueError(f"eigensolver should be one of {self.eigensolvers}, "
+                             f"found {self.eigensolver}")
+        # eigenvectors from the last eigenspace, used to start iterative eigensolvers
+        self._warm_start = None
+        stage_cache = kwargs.pop('stage_cache', None)
+        if isinstance(stage_cache, str):
+            stage_cache = SpectralCache(stage_cache)
+        self._stage_cache = stage_cache
+        # key of the affinity in the stage cache, if it is being used
+        self._affinity_key = None
+        # running sums for the meandistance stopping condition,
+        # None when they need to be recalculated
+        self._distance_stats = None
         self.eigenvalues = []  # create a list to track the eigenvalues
         self.beam_particle = self.StoppingCondition == 'beamparticle'
         self.conductance = self.StoppingCondition == 'conductance'
@@ -1647,8 +2386,7 @@ class Spectral(PseudoJet):
         # by this time affinity should exist because caculate distance has been called
         # now calculate the size and put it in
         start_sizes = self._calculate_size()
-        for i, size in enumerate(start_sizes):
-            self._floats[i][self._Size_col] = size
+        self._floats[:len(start_sizes), self._Size_col] = start_sizes
         self.eigenspace_distance2 = self._define_eigenspace_distance()
         # make a version of the number of eigenvalues that
         # is garenteed to be finitie
@@ -1659,9 +2397,16 @@ class Spectral(PseudoJet):
             # set up to calcualte conductance
             self._conductance_sets = [{r} for r in range(self.currently_avalible)]
             self._set_input_idx = set().union(*self._conductance_sets)
-            self._initial_affinity = np.copy(self._affinity)
+            self._initial_affinity = self._affinity.copy()
+            # affinity from the inputs in each conductance set to all inputs
+            if scipy.sparse.issparse(self._initial_affinity):
+                self._conductance_rows = [self._initial_affinity[row]
+                                          for row in range(self.currently_avalible)]
+            else:
+                self._conductance_rows = list(self._initial_affinity)
             self._total_size = np.sum(start_sizes)
-            self._current_conductance = np.sum(self._initial_affinity, axis=1)/start_sizes
+            self._current_conductance = \
+                np.asarray(self._initial_affinity.sum(axis=1)).ravel()/start_sizes
         if assign:
             self.assign_parents()
 
@@ -1689,7 +2434,7 @@ class Spectral(PseudoJet):
                               dtype=float)
             pts /= self.event_mass
             try:
-                affinities = np.sum(self._affinity[:, indices], axis=0)
+                affinities = self._affinity_column_sums(indices)
                 #affinities /= np.mean(self._affinity)
                 affinities /= 1000
             except IndexError as e:
@@ -1707,7 +2452,7 @@ class Spectral(PseudoJet):
             return es
         if self.Laplacien == 'symmetric':
             try:
-                return np.sum(self._affinity[:, indices], axis=0)
+                return self._affinity_column_sums(indices)
             except IndexError as e:
                 if len(self._affinity.flatten()) == 0:
                     return np.zeros(1)
@@ -1726,12 +2471,71 @@ class Spectral(PseudoJet):
                 raise TypeError("PseudoJet must be created with an eventWise to use Laplacien 'perfect'")
         raise NotImplementedError(f"Don't recognise Laplacien {self.Laplacien}")
 
+    def _affinity_column_sums(self, indices):
+        """
+        Sum the affinity of some pseudojets to all others.
+
+        Parameters
+        ----------
+        indices : int or iterable of ints
+            indices of the pseudojets
+
+        Returns
+        -------
+        : float or array of floats
+            the summed affinity of each pseudojet
+        """
+        if scipy.sparse.issparse(self._affinity):
+            sums = np.asarray(self._affinity[:, np.asarray(indices)].sum(axis=0)).ravel()
+            return sums if np.ndim(indices) else sums[0]
+        return np.sum(self._affinity[:, indices], axis=0)
+
+    def _drop_affinity(self, pseudojet_index):
+        """
+        Remove the row and column of one pseudojet from the affinity.
+
+        Parameters
+        ----------
+        pseudojet_index : int
+            index to remove
+        """
+        if scipy.sparse.issparse(self._affinity):
+            keep = np.ones(self._affinity.shape[0], dtype=bool)
+            keep[pseudojet_index] = False
+            self._affinity = self._affinity[keep][:, keep]
+        else:
+            self._affinity = np.delete(self._affinity, pseudojet_index, axis=0)
+            self._affinity = np.delete(self._affinity, pseudojet_index, axis=1)
+
     def _conductance_check(self, idx_a, idx_b):
-        inside = self._conductance_sets[idx_a].union(self._conductance_sets[idx_b])
-        outside = list(self._set_input_idx - inside)
-        inside = list(inside)
-        numerator = np.sum(self._initial_affinity[inside][:, outside])
-        denominator = np.sum([self._floats[row][self._Size_col] for row in inside])
+        """
+        Find the conductance of the inputs of two pseudojets together,
+        and which of the pseudojets already have a lower conductance.
+
+        Parameters
+        ----------
+        idx_a : int
+            index of the first pseudojet
+        idx_b : int
+            index of the second pseudojet
+
+        Returns
+        -------
+        to_remove : list of ints
+            indices of the pseudojets with lower conductance
+        new_conductance : float
+            conductance of the pseudojets together
+        """
+        inside = list(self._conductance_sets[idx_a].union(self._conductance_sets[idx_b]))
+        outside = np.ones(len(self._set_input_idx), dtype=bool)
+        outside[inside] = False
+        # the affinity from the inputs inside to each input
+        inside_affinity = self._conductance_rows[idx_a] + self._conductance_rows[idx_b]
+        if scipy.sparse.issparse(inside_affinity):
+            numerator = np.sum(inside_affinity.data[outside[inside_affinity.indices]])
+        else:
+            numerator = np.sum(inside_affinity[outside])
+        denominator = np.sum(self._floats[inside, self._Size_col])
         denominator = min(denominator, self._total_size)
         new_conductance = numerator/denominator
         # we will remove any jet with lower conductance than then new conductance
@@ -1742,14 +2546,112 @@ class Spectral(PseudoJet):
             to_remove.append(idx_b)
         return to_remove, new_conductance
 
-    def _set_distances(self, checkpoints=None):
-        """ Calculate all distances between avalible pseudojets """
-        # if there is a beam particle need to get the distance to the beam particle too
-        n_distances = self.currently_avalible + self.beam_particle
-        if n_distances < 2:
+    @staticmethod
+    def _distance_sums(distances2):
+        """
+        Summarise some distances for the meandistance stopping condition.
+
+        Parameters
+        ----------
+        distances2 : array of floats
+            distances squared
+
+        Returns
+        -------
+        stats : array of floats
+            sum of the finite distances, number of distances that are not nan
+            and number of infinite distances
+        """
+        with np.errstate(invalid='ignore'):
+            distances = np.sqrt(distances2)
+        finite = np.isfinite(distances)
+        return np.array([np.sum(distances[finite]),
+                         np.sum(~np.isnan(distances)),
+                         np.sum(np.isinf(distances))])
+
+    def _row_distance_stats(self, row, exclude=None):
+        """
+        Summarise the distances from one pseudojet to all others.
+
+        Parameters
+        ----------
+        row : int
+            index of the pseudojet
+        exclude : int (optional)
+            index of another pseudojet to leave out
+
+        Returns
+        -------
+        stats : array of floats
+            as given by _distance_sums
+        """
+        keep = np.ones(len(self._distances2), dtype=bool)
+        keep[row] = False
+        if exclude is not None:
+            keep[exclude] = False
+        return self._distance_sums(self._distances2[row, keep])
+
+    def _mean_distance_over(self):
+        """
+        Check if the mean distance between the avalible pseudojets is more than DeltaR.
+        The distances are summed as they change, and only recalculated in full
+        when the running mean is too close to DeltaR to be certain.
+
+        Returns
+        -------
+        : bool
+            the mean distance is more than DeltaR
+        """
+        lower_triangle = np.tril_indices_from(self._distances2, -1)
+        if len(lower_triangle[0]) == 0:
+            return False
+        if self._distance_stats is None:
+            self._distance_stats = self._distance_sums(self._distances2[lower_triangle])
+        total, n_distances, n_infinite = self._distance_stats
+        if n_infinite:
+            return True
+        if n_distances == 0:
+            return False  # a mean of nan is never more than DeltaR
+        mean_distance = total/n_distances
+        tolerance = 1e-8*max(abs(mean_distance), abs(self.DeltaR))
+        if abs(mean_distance - self.DeltaR) > tolerance:
+            return mean_distance > self.DeltaR
+        # rounding in the running sum could matter, so start again
+        self._distance_stats = self._distance_sums(self._distances2[lower_triangle])
+        mean_distance = np.nanmean(np.sqrt(self._distances2[lower_triangle]))
+        return mean_distance > self.DeltaR
+
+    def _set_distances(self, checkpoints=None):
+        """ Calculate all distances between avalible pseudojets """
+        # if there is a beam particle need to get the distance to the beam particle too
+        n_distances = self.currently_avalible + self.beam_particle
+        if n_distances < 2:
             self._distances2 = np.zeros((1, 1))
             self._affinity = np.array([[]])
             return
+        # future calculatins will depend on the starting positions
+        self._starting_position = np.array(self._floats[:self.currently_avalible])
+        cache_keys = self._stage_keys(checkpoints)
+        if cache_keys is not None:
+            # the stage cache acts as a source of checkpoints
+            checkpoints = {}
+            for checkpoint_name, key in cache_keys.items():
+                cached = self._stage_cache.get(key)
+                if cached is not None:
+                    checkpoints[checkpoint_name] = SpectralCache.unpack_matrix(cached)
+            found = set(checkpoints)
+            self._affinity_key = cache_keys['affinity']
+        else:
+            self._affinity_key = None
+        if (checkpoints is None or cache_keys is not None) and self._can_sparse_affinity():
+            if cache_keys is not None and 'affinity' in checkpoints:
+                self._affinity = checkpoints['affinity']
+            else:
+                self._affinity = self._sparse_affinity(self._starting_position)
+                if cache_keys is not None:
+                    self._stage_cache.put(cache_keys['affinity'],
+                                          **SpectralCache.pack_matrix(self._affinity))
+            return
         checkpoint_name = 'physical_distances2'
         if checkpoints is not None and  checkpoint_name in checkpoints:
             physical_distances2 = checkpoints['physical_distances2']
@@ -1758,8 +2660,6 @@ class Spectral(PseudoJet):
             # this can be based on any of the three algorithms
             # for speed, make local variables
             pt_col = self._PT_col
-            # future calculatins will depend on the starting positions
-            self._starting_position = np.array(self._floats[:self.currently_avalible])
             physical_distances2 = self.physical_distance2(self._starting_position,
                                                           self._starting_position)
             infinite_distance = np.isinf(physical_distances2)
@@ -1797,53 +2697,198 @@ class Spectral(PseudoJet):
             np.fill_diagonal(self._affinity, 0.)  # the affinity may have problems on the diagonal
             if checkpoints is not None:
                 checkpoints[checkpoint_name] = self._affinity
+        if cache_keys is not None:
+            for checkpoint_name in set(checkpoints) - found:
+                self._stage_cache.put(cache_keys[checkpoint_name],
+                                      **SpectralCache.pack_matrix(checkpoints[checkpoint_name]))
+
+    def _stage_keys(self, checkpoints=None):
+        """
+        Find the keys of the physical distances and affinity in the stage cache.
+        The cache is only used for the starting pseudojets,
+        and is not used when checkpoints are given.
+
+        Parameters
+        ----------
+        checkpoints : dict (optional)
+            checkpoints given to _set_distances
+
+        Returns
+        -------
+        keys : dict of strings
+            the key of 'physical_distances2' and 'affinity',
+            None if the stage cache is not used
+        """
+        if self._stage_cache is None or checkpoints is not None:
+            return None
+        if self.currently_avalible != len(self._floats):
+            return None  # some pseudojets have been joined
+        # the distances can only depend on the starting positions
+        # and the parameters of the distance
+        physical_params = ['PhyDistance', 'ExpofPTPosition']
+        if self.ExpofPTPosition == 'input':
+            physical_params += ['ExpofPTFormat', 'ExpofPTMultiplier']
+        affinity_params = ['AffinityType', 'AffinityCutoff', 'Sigma', 'StoppingCondition']
+        if self.beam_particle:
+            affinity_params += ['DeltaR', 'ExpofPTFormat', 'ExpofPTMultiplier']
+        physical_key = SpectralCache.make_key(
+                'physical_distances2', self._starting_position,
+                *[(name, getattr(self, name)) for name in physical_params])
+        affinity_key = SpectralCache.make_key(
+                'affinity', physical_key,
+                *[(name, getattr(self, name)) for name in affinity_params])
+        return {'physical_distances2': physical_key, 'affinity': affinity_key}
+
+    def _can_sparse_affinity(self):
+        """
+        Check if the affinity can be built as a sparse matrix without
+        calculating every physical distance.
+        That needs a cutoff, an affinity that only depends on distance,
+        and a distance that only depends on rapidity and phi.
+
+        Returns
+        -------
+        : bool
+            True if _sparse_affinity can be used
+        """
+        if self.currently_avalible < self.min_sparse_inputs or self.beam_particle:
+            return False
+        if self.AffinityCutoff is None or self.AffinityType not in ('exponent', 'exponent2'):
+            return False
+        if self.PhyDistance not in ('angular', 'taxicab'):
+            return False
+        if self.ExpofPTPosition == 'input' and self.ExpofPTMultiplier != 0:
+            return False
+        positions = self._floats[:self.currently_avalible, [self._Rapidity_col, self._Phi_col]]
+        return np.all(np.isfinite(positions))
+
+    def _sparse_affinity(self, avalible_floats):
+        """
+        Make the affinity between the avalible pseudojets as a sparse matrix.
+        A periodic kd-tree in rapidity and phi finds the pairs inside the cutoff,
+        then only the distances of those pairs are calculated.
+        The nonzero entries are those of the dense calculation,
+        up to the order of tied distances in a knn cutoff.
+
+        Parameters
+        ----------
+        avalible_floats : 2d array of floats
+            float rows of the avalible pseudojets
+
+        Returns
+        -------
+        affinity : scipy.sparse.csr_matrix
+            the affinity, with 0 on the diagonal
+        """
+        n_points = len(avalible_floats)
+        rapidity = avalible_floats[:, self._Rapidity_col]
+        phi = avalible_floats[:, self._Phi_col]
+        # phi wraps around, rapidity is given a box too wide to wrap
+        shifted_rapidity = rapidity - np.min(rapidity)
+        shifted_phi = np.mod(phi, 2*np.pi)
+        shifted_phi[shifted_phi >= 2*np.pi] = 0.
+        boxsize = [2*np.max(shifted_rapidity) + 1., 2*np.pi]
+        tree = scipy.spatial.cKDTree(np.column_stack((shifted_rapidity, shifted_phi)),
+                                     boxsize=boxsize)
+        taxicab = self.PhyDistance == 'taxicab'
+        minkowski_p = 1 if taxicab else 2
+        cutoff_type, cutoff_param = self.AffinityCutoff
+        if cutoff_type == 'knn':
+            # like knn, each point keeps the cutoff_param + 2 nearest, including itself
+            n_neighbours = min(int(cutoff_param) + 2, n_points)
+            _, neighbours = tree.query(tree.data, k=np.arange(1, n_neighbours + 1),
+                                       p=minkowski_p)
+            rows = np.repeat(np.arange(n_points), n_neighbours)
+            columns = neighbours.ravel()
+        else:
+            # taxicab distance2 is not squared
+            radius = cutoff_param**2 if taxicab else cutoff_param
+            # a little extra, the exact cutoff is applied below
+            pairs = tree.query_pairs(radius*(1 + 1e-8), p=minkowski_p, output_type='ndarray')
+            rows, columns = pairs.T
+        # affinity is symmetric, and 0 on the diagonal
+        rows, columns = np.concatenate((rows, columns)), np.concatenate((columns, rows))
+        pairs = np.unique(rows*n_points + columns)
+        rows, columns = np.divmod(pairs, n_points)
+        off_diagonal = rows != columns
+        rows, columns = rows[off_diagonal], columns[off_diagonal]
+        angular_distance = Components.angular_distance(phi[rows], phi[columns])
+        if taxicab:
+            distances2 = np.abs(rapidity[rows] - rapidity[columns]) + angular_distance
+        else:
+            distances2 = (rapidity[rows] - rapidity[columns])**2 + angular_distance**2
+        if cutoff_type == 'distance':
+            inside = distances2 <= cutoff_param**2
+            rows, columns, distances2 = rows[inside], columns[inside], distances2[inside]
+        if self.AffinityType == 'exponent':
+            values = np.exp(-(distances2**0.5)/self.Sigma)
+        else:
+            values = np.exp(-distances2/self.Sigma)
+        affinity = scipy.sparse.csr_matrix((values, (rows, columns)),
+                                           shape=(n_points, n_points))
+        return affinity
 
     def _set_eigenspace(self):
         """
         Calculate the embedding of the currently_avalible pseudojets in eignspace
         Also find the distances in eigenspace and the eigenvalues.
         """
-        if np.sum(np.abs(self._affinity), initial=0) == 0.:
+        self._distance_stats = None  # all the distances will change
+        if abs(self._affinity).sum() == 0.:
             self._eigenspace = np.eye(self.currently_avalible)
             self.eigenvalues = np.ones(self.currently_avalible)
             # everything is seperated
-            self.root_jetInputIdxs = [row[self._InputIdx_col] for row in
-                                      self._ints[:self.currently_avalible]]
+            self.root_jetInputIdxs = \
+                    self._ints[:self.currently_avalible, self._InputIdx_col].tolist()
             self.currently_avalible = 0
             return
-        diagonal = np.diag(np.sum(self._affinity, axis=1))
-        laplacien = diagonal - self._affinity
         # add the denominator
-        factor = [row[self._Size_col] for row in self._floats[:self.currently_avalible]]
+        factor = self._floats[:self.currently_avalible, self._Size_col]
         if self.beam_particle:
-            factor += [1]
-        factor = np.array(factor)
+            factor = np.append(factor, 1.)
         with warnings.catch_warnings():
             warnings.filterwarnings('ignore')
             self.alt_diag = factor**(-0.5)
         self.alt_diag[factor == 0] = 0.
-        diag_alt_diag = np.diag(self.alt_diag)
-        laplacien = np.matmul(diag_alt_diag, np.matmul(laplacien, diag_alt_diag))
+        eigenspace_key = laplacien_key = cached = None
+        if self._affinity_key is not None and self.currently_avalible == len(self._floats):
+            # the iterative eigensolvers use a sparse laplacien if they can
+            eigensolver = self._chosen_eigensolver()
+            sparse = scipy.sparse.issparse(self._affinity) and eigensolver != 'dense'
+            laplacien_key = SpectralCache.make_key('laplacien', self._affinity_key,
+                                                   self.alt_diag, sparse)
+            eigenspace_key = SpectralCache.make_key('eigenspace', laplacien_key,
+                                                    self._NumEigenvectors, eigensolver)
+            cached = self._stage_cache.get(eigenspace_key)
         # get the eigenvectors (we know the smallest will be identity)
-        try:
-            eigenvalues, eigenvectors = \
-                    scipy.linalg.eigh(laplacien, eigvals=(0, self._NumEigenvectors))
-        except (ValueError, TypeError):
-            # sometimes there are fewer eigenvalues avalible
-            # just take waht can be found
+        if cached is not None:
+            eigenvalues, eigenvectors = cached['eigenvalues'], cached['eigenvectors']
+        else:
+            laplacien = self._laplacien(laplacien_key)
             try:
-                eigenvalues, eigenvectors = scipy.linalg.eigh(laplacien)
-            except Exception as e:  # sometimes this still fails, not sure when/why
-                # display whatever caused this
-                print(f"Exception while processing event {self.eventWise.selected_index}")
-                print(f"With jet params; {self.jet_parameters}")
-                print(e)
-                self.currently_avalible = len(self._floats)
-                self._set_distances()
-                self.root_jetInputIdxs = [row[self._InputIdx_col] for row in
-                                          self._ints[:self.currently_avalible]]
-                self.currently_avalible = 0
-                return
+                eigenvalues, eigenvectors = self._smallest_eigenvectors(laplacien)
+            except (ValueError, TypeError):
+                # sometimes there are fewer eigenvalues avalible
+                # just take waht can be found
+                try:
+                    if scipy.sparse.issparse(laplacien):
+                        laplacien = laplacien.toarray()
+                    eigenvalues, eigenvectors = scipy.linalg.eigh(laplacien)
+                except Exception as e:  # sometimes this still fails, not sure when/why
+                    # display whatever caused this
+                    print(f"Exception while processing event {self.eventWise.selected_index}")
+                    print(f"With jet params; {self.jet_parameters}")
+                    print(e)
+                    self.currently_avalible = len(self._floats)
+                    self._set_distances()
+                    self.root_jetInputIdxs = \
+                            self._ints[:self.currently_avalible, self._InputIdx_col].tolist()
+                    self.currently_avalible = 0
+                    return
+            if eigenspace_key is not None:
+                self._stage_cache.put(eigenspace_key, eigenvalues=eigenvalues,
+                                      eigenvectors=eigenvectors)
+        self._warm_start = eigenvectors
         # now remove any trivial eigenvector with 0 eigenvalue
         zero_value = np.where(np.isclose(eigenvalues, 0))[0]
         to_remove = np.isclose(eigenvectors[:, zero_value], eigenvectors[0, zero_value])
@@ -1872,6 +2917,146 @@ class Spectral(PseudoJet):
             # the diagonal is the stopping condition
             np.fill_diagonal(self._distances2, self.DeltaR**2)
 
+    def _chosen_eigensolver(self):
+        """
+        The eigensolver to use on the current affinity.
+
+        Returns
+        -------
+        eigensolver : str
+            One of eigensolvers, the eigensolver attribute if it was set,
+            else lanczos for a sparse affinity and dense for a dense one
+        """
+        if self.eigensolver is not None:
+            return self.eigensolver
+        if scipy.sparse.issparse(self._affinity):
+            return 'lanczos'
+        return 'dense'
+
+    def _laplacien(self, laplacien_key=None):
+        """
+        Calculate the laplacien of the currently_avalible pseudojets
+        from the affinity and alt_diag.
+
+        Parameters
+        ----------
+        laplacien_key : string (optional)
+            key of the laplacien in the stage cache, if it is being used
+
+        Returns
+        -------
+        laplacien : 2d array of floats or scipy.sparse matrix
+            symmetric laplacien, only sparse for the iterative eigensolvers
+        """
+        if laplacien_key is not None:
+            cached = self._stage_cache.get(laplacien_key)
+            if cached is not None:
+                return SpectralCache.unpack_matrix(cached)
+        affinity = self._affinity
+        if scipy.sparse.issparse(affinity) and self._chosen_eigensolver() != 'dense':
+            # iterative eigensolvers can work on a sparse laplacien
+            diagonal = scipy.sparse.diags(np.asarray(affinity.sum(axis=1)).ravel())
+            diag_alt_diag = scipy.sparse.diags(self.alt_diag)
+            laplacien = (diag_alt_diag @ (diagonal - affinity) @ diag_alt_diag).tocsr()
+        else:
+            if scipy.sparse.issparse(affinity):
+                # the dense eigensolver needs a dense laplacien
+                affinity = affinity.toarray()
+            diagonal = np.diag(np.sum(affinity, axis=1))
+            laplacien = diagonal - affinity
+            diag_alt_diag = np.diag(self.alt_diag)
+            laplacien = np.matmul(diag_alt_diag, np.matmul(laplacien, diag_alt_diag))
+        if laplacien_key is not None:
+            self._stage_cache.put(laplacien_key, **SpectralCache.pack_matrix(laplacien))
+        return laplacien
+
+    def _smallest_eigenvectors(self, laplacien):
+        """
+        Find the NumEigenvectors + 1 smallest eigenvalues of the laplacien
+        and their eigenvectors.
+        If an iterative eigensolver has been chosen it is tried first,
+        the dense eigensolver is used if it cannot be applied or
+        does not give accurate eigenvectors.
+
+        Parameters
+        ----------
+        laplacien : 2d array of floats or scipy.sparse matrix
+            symmetric matrix to decompose
+
+        Returns
+        -------
+        eigenvalues : array of floats
+            eigenvalues in ascending order
+        eigenvectors : 2d array of floats
+            the eigenvector of each eigenvalue as a column
+        """
+        if self._chosen_eigensolver() != 'dense':
+            try:
+                found = self._iterative_eigenvectors(laplacien)
+            except (scipy.sparse.linalg.ArpackError, np.linalg.LinAlgError,
+                    RuntimeError, ValueError):
+                found = None
+            if found is not None:
+                return found
+        if scipy.sparse.issparse(laplacien):
+            laplacien = laplacien.toarray()
+        return scipy.linalg.eigh(laplacien, eigvals=(0, self._NumEigenvectors))
+
+    def _iterative_eigenvectors(self, laplacien):
+        """
+        Find the NumEigenvectors + 1 smallest eigenvalues of the laplacien
+        and their eigenvectors with the chosen iterative eigensolver,
+        starting from the last eigenvectors found where they fit.
+
+        Parameters
+        ----------
+        laplacien : 2d array of floats or scipy.sparse matrix
+            symmetric matrix to decompose
+
+        Returns
+        -------
+        eigenvalues : array of floats
+            eigenvalues in ascending order,
+            None if the eigensolver cannot be used or is not accurate
+        eigenvectors : 2d array of floats
+            the eigenvector of each eigenvalue as a column,
+            None if the eigensolver cannot be used or is not accurate
+        """
+        n_points = laplacien.shape[0]
+        n_vectors = self._NumEigenvectors + 1
+        warm_start = self._warm_start
+        if warm_start is not None and warm_start.shape != (n_points, n_vectors):
+            warm_start = None
+        if self._chosen_eigensolver() == 'lanczos':
+            if n_vectors >= n_points - 1:
+                return None
+            # the smallest eigenvalue is 0, so shift just below it
+            # to find the eigenvalues closest to 0 with a factorisable matrix
+            sigma = -1e-6*max(1., np.max(np.abs(laplacien.diagonal())))
+            v0 = None if warm_start is None else np.sum(warm_start, axis=1)
+            eigenvalues, eigenvectors = scipy.sparse.linalg.eigsh(laplacien, k=n_vectors,
+                                                                  sigma=sigma, which='LM',
+                                                                  v0=v0)
+        else:  # lobpcg
+            # lobpcg is not reliable for large blocks in small matrices
+            if 5*n_vectors >= n_points:
+                return None
+            if warm_start is None:
+                warm_start = np.random.default_rng(0).standard_normal((n_points, n_vectors))
+            with warnings.catch_warnings():
+                warnings.filterwarnings('ignore')
+                eigenvalues, eigenvectors = scipy.sparse.linalg.lobpcg(
+                        laplacien, warm_start, largest=False,
+                        tol=self.eigensolver_tol, maxiter=max(200, n_points))
+        order = np.argsort(eigenvalues)
+        eigenvalues, eigenvectors = eigenvalues[order], eigenvectors[:, order]
+        # check the eigenvectors before using them
+        residual = laplacien @ eigenvectors - eigenvectors*eigenvalues
+        allowed = self.eigensolver_tol*max(1., np.max(np.abs(eigenvalues)))
+        if np.any(np.linalg.norm(residual, axis=0) > allowed):
+            return None
+        return eigenvalues, eigenvectors
+
     def _define_calculate_affinity(self):
         """ Define functions to caluclate affinity from real distance """
         sigma = self.Sigma
@@ -2280,26 +3465,25 @@ class Spectral(PseudoJet):
         replace_index, remove_index = sorted([pseudojet_index1, pseudojet_index2])
         new_pseudojet_ints, new_pseudojet_floats = self._combine(remove_index, replace_index,
                                                                  distance2)
-        # move the first pseudojet to the back without replacement
-        pseudojet1_ints = self._ints.pop(remove_index)
-        pseudojet1_floats = self._floats.pop(remove_index)
-        self._ints.append(pseudojet1_ints)
-        self._floats.append(pseudojet1_floats)
-        # move the second pseudojet to the back but replace it with the new pseudojet
-        pseudojet2_ints = self._ints[replace_index]
-        pseudojet2_floats = self._floats[replace_index]
-        self._ints.append(pseudojet2_ints)
-        self._floats.append(pseudojet2_floats)
-        self._ints[replace_index] = new_pseudojet_ints
-        self._floats[replace_index] = new_pseudojet_floats
+        self._place_merged(remove_index, replace_index,
+                           new_pseudojet_ints, new_pseudojet_floats)
         # one less pseudojet avalible
         self.currently_avalible -= 1
+        if self._distance_stats is not None:
+            # the distances of both pseudojets are about to change
+            self._distance_stats -= self._row_distance_stats(replace_index)
+            self._distance_stats -= self._row_distance_stats(remove_index, replace_index)
         # now recalculate for the new pseudojet
         self._recalculate_one(remove_index, replace_index)
+        if self._distance_stats is not None:
+            self._distance_stats += self._row_distance_stats(replace_index)
         # if a conductance is given then deal with the conductance lists
         if conductance is not None:
            removed_set = self._conductance_sets.pop(remove_index)
            self._conductance_sets[replace_index].update(removed_set)
+           removed_row = self._conductance_rows.pop(remove_index)
+           self._conductance_rows[replace_index] = \
+                   self._conductance_rows[replace_index] + removed_row
            self._current_conductance = np.delete(self._current_conductance, remove_index)
            self._current_conductance[replace_index] = conductance
 
@@ -2316,14 +3500,14 @@ class Spectral(PseudoJet):
 
         """
         # move the first pseudojet to the back without replacement
-        pseudojet_ints = self._ints.pop(pseudojet_index)
-        pseudojet_floats = self._floats.pop(pseudojet_index)
-        self._ints.append(pseudojet_ints)
-        self._floats.append(pseudojet_floats)
+        self._move_to_back(pseudojet_index)
+        if self._distance_stats is not None:
+            self._distance_stats -= self._row_distance_stats(pseudojet_index)
         # remove from the affinity and eiegnspace
         self._eigenspace = np.delete(self._eigenspace, pseudojet_index, axis=0)
-        self._affinity = np.delete(self._affinity, pseudojet_index, axis=0)
-        self._affinity = np.delete(self._affinity, pseudojet_index, axis=1)
+        if self._warm_start is not None:
+            self._warm_start = np.delete(self._warm_start, pseudojet_index, axis=0)
+        self._drop_affinity(pseudojet_index)
         # remove the alt diag
         self.alt_diag = np.delete(self.alt_diag, pseudojet_index)
         # delete the row and column
@@ -2331,10 +3515,11 @@ class Spectral(PseudoJet):
         self._distances2 = np.delete(self._distances2, pseudojet_index, axis=1)
         # one less pseudojet avalible
         self.currently_avalible -= 1
-        self.root_jetInputIdxs.append(pseudojet_ints[self._InputIdx_col])
+        self.root_jetInputIdxs.append(int(self._ints[-1, self._InputIdx_col]))
         # if we are tracking conductance, also sort those lists out
         if self.conductance:
            del self._conductance_sets[pseudojet_index]
+           del self._conductance_rows[pseudojet_index]
            self._current_conductance = np.delete(self._current_conductance, pseudojet_index)
 
     def _recalculate_one(self, remove_index, replace_index):
@@ -2383,8 +3568,7 @@ class Spectral(PseudoJet):
         new_laplacien = self.alt_diag * (new_laplacien * new_alt_diag)
         # remove from the eigenspace and the affinity
         self._eigenspace = np.delete(self._eigenspace, (remove_index), axis=0)
-        self._affinity = np.delete(self._affinity, (remove_index), axis=0)
-        self._affinity = np.delete(self._affinity, (remove_index), axis=1)
+        self._drop_affinity(remove_index)
         # and make its position in vector space
         new_position = np.dot(self._eigenspace.T, new_laplacien)
         self._eigenspace[replace_index] = new_position
@@ -2412,13 +3596,10 @@ class Spectral(PseudoJet):
             index of the pseudojet that is now at the back
         """
         if self.StoppingCondition == 'meandistance':
-            mean_distance = self._distances2[np.tril_indices_from(self._distances2, -1)]
-            if len(mean_distance):
-                mean_distance = np.nanmean(np.sqrt(mean_distance))
-                if mean_distance > self.DeltaR:  # remove everything
-                    while self.currently_avalible:
-                        self._remove_pseudojet(0)
-                    return 0
+            if self._mean_distance_over():  # remove everything
+                while self.currently_avalible:
+                    self._remove_pseudojet(0)
+                return 0
             np.fill_diagonal(self._distances2, np.inf)
         beam_index = self.currently_avalible
         # now find the smallest distance
@@ -2703,8 +3884,7 @@ class Indicator(Spectral):
             infinite_distance = np.isinf(physical_distances2)
             if np.any(infinite_distance):
                 # soft radation may create undesirable infinities
-                soft_radiation = np.fromiter((row[pt_col] == 0 for row in avalible_floats),
-                                             dtype=bool)
+                soft_radiation = avalible_floats[:, pt_col] == 0
                 # if this has occured make them 0
                 physical_distances2[np.logical_and(soft_radiation, infinite_distance)] = 0
             # finally, add the diagonals
@@ -2731,17 +3911,16 @@ class Indicator(Spectral):
             self._eigenspace = np.eye(self.currently_avalible)
             self.eigenvalues = np.ones(self.currently_avalible)
             # everything is seperated
-            self.root_jetInputIdxs += [row[self._InputIdx_col] for row in
-                                       self._ints[:self.currently_avalible]]
+            self.root_jetInputIdxs += \
+                    self._ints[:self.currently_avalible, self._InputIdx_col].tolist()
             self.currently_avalible = 0
             return
         diagonal = np.diag(np.sum(self._affinity, axis=1))
         laplacien = diagonal - self._affinity
         # add the denominator
-        factor = [row[self._Size_col] for row in self._floats[:self.currently_avalible]]
+        factor = self._floats[:self.currently_avalible, self._Size_col]
         if self.beam_particle:
-            factor += [1]
-        factor = np.array(factor)
+            factor = np.append(factor, 1.)
         with warnings.catch_warnings():
             warnings.filterwarnings('ignore')
             self.alt_diag = factor**(-0.5)
@@ -2763,8 +3942,8 @@ class Indicator(Spectral):
             print(f"Exception while processing event {self.eventwise.selected_index}")
             print(f"With jet params; {self.jet_parameters}")
             print(e)
-            self.root_jetInputIdxs += [row[self._InputIdx_col] for row in
-                                       self._ints[:self.currently_avalible]]
+            self.root_jetInputIdxs += \
+                    self._ints[:self.currently_avalible, self._InputIdx_col].tolist()
             self.currently_avalible = 0
             return
         # now remove any trivial eigenvector with 0 eigenvalue
@@ -2986,6 +4165,8 @@ class Splitting(Indicator):
             # this will be used to generate a list of scores
             self._scores = np.empty(self.currently_avalible - 1)
             # scores referances the spaces between the indices in order
+            # normalised cuts are relative to the size of everything
+            self._total_size = np.sum(self._floats[:self.currently_avalible, self._Size_col])
             # finnaly, keep track of jets, as they cannot be merged untill they are all found
             # as merging messes with the indices
             self._jets = []
@@ -2999,28 +4180,30 @@ class Splitting(Indicator):
         flip_point = None  # index of the flip point
         n_trials = len(self._avaliable) - 1
         post_flip = False  # switch for having found the flip point
-        # if the laplacien is symmetric this is needed to find the flip point
-        sum_avalible_affinity = np.sum(self._affinity[self._avaliable])
         # get the indices of the avaliable particles
         avaliable_idxs = self._order[self._avaliable]
-        # the set of all idxs is useful in finding what is not in this group
-        set_idxs = set(self._order)
+        leading_cut, trailing_cut = self._sweep_cuts(avaliable_idxs)
+        if self.Laplacien != 'unnormalised':
+            sizes = self._floats[avaliable_idxs, self._Size_col]
+            leading_size = np.cumsum(sizes)
+            trailing_size = np.cumsum(sizes[::-1])[::-1]
         for count_left in range(1, n_trials+1):  # start with one ont he far left in the jet
             # trial goes from 1 to 1-avalible
-            if post_flip:
-                in_group = avaliable_idxs[count_left:]  # in the jet
-            else:
-                in_group = avaliable_idxs[:count_left]  # in the jet
-            out_group = list(set_idxs - set(in_group))
             # numerator is the affinities that cross groups
-            numerator = np.sum(self._affinity[out_group][:, in_group])
+            if post_flip:  # the trailing elements are in the jet
+                numerator = trailing_cut[count_left]
+            else:  # the leading elements are in the jet
+                numerator = leading_cut[count_left]
             if self.Laplacien == 'unnormalised':  # ratiocut style
                 post_flip = count_left > 0.5*n_trials  # check if we are post flip
                 denominator = abs(count_left - post_flip*n_trials)
                 if flip_point is None and post_flip:
                     flip_point = count_left
             else:
-                denominator = np.sum([row[self._Size_col] for row in self._floats[in_group]])
+                if post_flip:
+                    denominator = trailing_size[count_left]
+                else:
+                    denominator = leading_size[count_left-1]
                 if not post_flip:  # calculation not easly generalised
                     # compare to the affinity in the remaing avalible objects
                     if denominator > 0.5*self._total_size:
@@ -3068,6 +4251,46 @@ class Splitting(Indicator):
             # if we finished, then merge the jets
             self._merge_complete_jets()
 
+    def _sweep_cuts(self, avaliable_idxs):
+        """
+        Find the affinity that crosses the boundary of each group made
+        by cutting the avaliable pseudojets in order.
+        Groups are cut from all other pseudojets, including those
+        already assigned to jets.
+
+        Parameters
+        ----------
+        avaliable_idxs : array of ints
+            indices of the avaliable pseudojets in order
+
+        Returns
+        -------
+        leading_cut : array of floats
+            element c is the affinity between the first c avaliable
+            pseudojets and all other pseudojets
+        trailing_cut : array of floats
+            element c is the affinity between the avaliable pseudojets
+            from c onwards and all other pseudojets
+        """
+        n_avaliable = len(avaliable_idxs)
+        affinity = self._affinity[:, avaliable_idxs]
+        assigned = np.ones(len(affinity), dtype=bool)
+        assigned[avaliable_idxs] = False
+        from_assigned = np.sum(affinity[assigned], axis=0)
+        affinity = affinity[avaliable_idxs]
+        leading_cut = np.zeros(n_avaliable + 1)
+        trailing_cut = np.zeros(n_avaliable + 1)
+        # affinity from each column to the rows at or after c
+        after = np.cumsum(affinity[::-1], axis=0)[::-1]
+        leading_cut[1:n_avaliable] = np.sum(np.tril(after, -1), axis=1)[1:]
+        # affinity from each column to the rows before c
+        before = np.cumsum(affinity, axis=0)
+        trailing_cut[1:n_avaliable] = np.sum(np.triu(before, 1), axis=1)[:-1]
+        # sums of positive values, so a group with no cut gets exactly 0
+        leading_cut[1:] += np.cumsum(from_assigned)
+        trailing_cut[:-1] += np.cumsum(from_assigned[::-1])[::-1]
+        return leading_cut, trailing_cut
+
     def plt_assign_parents(self, save_prefix=None):
         """
         Join pseudojets until all avalible psseudojets are taken.
@@ -3298,12 +4521,15 @@ class SpectralFull(Spectral):
             (current jet will be moved to the back)
 
         """
+        # the last eigenvectors, without the removed pseudojet,
+        # are a good start for the iterative eigensolvers
+        if self._warm_start is not None:
+            self._warm_start = np.delete(self._warm_start, remove_index, axis=0)
         self._set_distances()  # to get a new affinity
         if self.CombineSize == 'recalculated':
             # now calculate the size and put it in
             new_sizes = self._calculate_size()
-            for i, size in enumerate(new_sizes):
-                self._floats[i][self._Size_col] = size
+            self._floats[:len(new_sizes), self._Size_col] = new_sizes
         self._set_eigenspace()
 
 
@@ -3521,6 +4747,57 @@ def filter_obs(eventWise, existing_idx_selection):
     return new_selection
 
 
+def _flat_range(eventWise, name, start, stop):
+    """
+    The particles of a range of events as flat arrays.
+
+    Parameters
+    ----------
+    eventWise : EventWise
+        data structure
+    name : string
+        name of the column to read
+    start : int
+        first event to read
+    stop : int
+        event to stop before
+
+    Returns
+    -------
+    offsets : list of numpy arrays
+        offsets of each level of the column, outermost first
+    content : numpy array
+        values of the column for all particles in the range
+    """
+    eventWise.selected_index = None
+    return Components.flat_structure(
+            Components.event_chunk(getattr(eventWise, name), start, stop))
+
+
+def mask_obs(eventWise, start, stop):
+    """
+    Mask of the observable particles over a range of events,
+    vectorised version of filter_obs.
+
+    Parameters
+    ----------
+    eventWise : EventWise
+        data structure
+    start : int
+        first event to mask
+    stop : int
+        event to stop before
+
+    Returns
+    -------
+    mask : numpy array of bools
+        true for each particle in the range that filter_obs would keep
+    """
+    _, track = _flat_range(eventWise, "Particle_Track", start, stop)
+    _, tower = _flat_range(eventWise, "Particle_Tower", start, stop)
+    return np.logical_or(track >= 0, tower >= 0)
+
+
 def filter_ends(eventWise, existing_idx_selection):
     """
     Filter particle in an eventWise data structure to select only the particles
@@ -3545,6 +4822,29 @@ def filter_ends(eventWise, existing_idx_selection):
     return new_selection
 
 
+def mask_ends(eventWise, start, stop):
+    """
+    Mask of the particles that have not decayed over a range of events,
+    vectorised version of filter_ends.
+
+    Parameters
+    ----------
+    eventWise : EventWise
+        data structure
+    start : int
+        first event to mask
+    stop : int
+        event to stop before
+
+    Returns
+    -------
+    mask : numpy array of bools
+        true for each particle in the range that filter_ends would keep
+    """
+    offsets, _ = _flat_range(eventWise, "Children", start, stop)
+    return np.diff(offsets[1]) == 0
+
+
 def filter_pt_eta(eventWise, existing_idx_selection, min_pt=.5, max_eta=2.5):
     """
     Filter particle in an eventWise data structure that have enough pt
@@ -3583,6 +4883,112 @@ def filter_pt_eta(eventWise, existing_idx_selection, min_pt=.5, max_eta=2.5):
     return updated_selection
 
 
+def mask_pt_eta(eventWise, start, stop, min_pt=.5, max_eta=2.5):
+    """
+    Mask of the particles with enough pt and a small enough barrel angle
+    over a range of events, vectorised version of filter_pt_eta.
+
+    Parameters
+    ----------
+    eventWise : EventWise
+        data structure
+    start : int
+        first event to mask
+    stop : int
+        event to stop before
+    min_pt : float
+        smallest pt permissable in a particle
+        (Default value = .5)
+    max_eta : float
+        larges abs value of pseudorapidity in a particle
+        (Default value = 2.5)
+
+    Returns
+    -------
+    mask : numpy array of bools
+        true for each particle in the range that filter_pt_eta would keep
+    """
+    _, pt = _flat_range(eventWise, "PT", start, stop)
+    if "Pseudorapidity" in eventWise.columns:
+        _, pseudorapidity = _flat_range(eventWise, "Pseudorapidity", start, stop)
+    else:
+        _, pz = _flat_range(eventWise, "Pz", start, stop)
+        theta = Components.ptpz_to_theta(pt, pz)
+        pseudorapidity = Components.theta_to_pseudorapidity(theta)
+    with np.errstate(invalid='ignore'):
+        return np.logical_and(pt > min_pt, np.abs(pseudorapidity) < max_eta)
+
+
+# vectorised versions of the filter functions
+filter_masks = {filter_obs: mask_obs, filter_ends: mask_ends, filter_pt_eta: mask_pt_eta}
+
+
+def get_filter_mask(filter_func):
+    """
+    Find the vectorised version of a filter function,
+    including filter functions with keyword arguments set by functools.partial.
+
+    Parameters
+    ----------
+    filter_func : callable
+        function with the same signature as filter_pt_eta
+
+    Returns
+    -------
+    mask_func : callable or None
+        function with the same signature as mask_pt_eta,
+        or None if the filter has no vectorised version
+    """
+    if isinstance(filter_func, functools.partial):
+        if filter_func.args or filter_func.func not in filter_masks:
+            return None
+        return functools.partial(filter_masks[filter_func.func], **filter_func.keywords)
+    return filter_masks.get(filter_func)
+
+
+def jet_input_mask(eventWise, filter_functions, start, stop):
+    """
+    Apply a set of filter functions to a range of events.
+    If every filter has a vectorised version the masks are
+    made for all the events at once and combined,
+    otherwise the filters are applied one event at a time.
+
+    Parameters
+    ----------
+    eventWise : EventWise
+        data structure
+    filter_functions : list of callabels
+        callabels with the same signature as filter_pt_eta
+    start : int
+        first event to filter
+    stop : int
+        event to stop before
+
+    Returns
+    -------
+    event_offsets : numpy array of ints
+        where the particles of each event start in the mask
+    mask : numpy array of bools
+        true for each particle in the range that passes every filter
+    """
+    (event_offsets,), _ = _flat_range(eventWise, "PT", start, stop)
+    mask_functions = [get_filter_mask(filter_func) for filter_func in filter_functions]
+    if None not in mask_functions:
+        mask = np.ones(event_offsets[-1], dtype=bool)
+        for mask_func in mask_functions:
+            mask &= mask_func(eventWise, start, stop)
+        return event_offsets, mask
+    mask = np.zeros(event_offsets[-1], dtype=bool)
+    for event_n in range(start, stop):
+        eventWise.selected_index = event_n
+        idx_selection = np.arange(len(eventWise.PT))
+        for filter_func in filter_functions:
+            idx_selection = filter_func(eventWise, idx_selection)
+        mask[event_offsets[event_n - start] + np.asarray(idx_selection, dtype=int)] = True
+    eventWise.selected_index = None
+    return event_offsets, mask
+
+
 def create_jetInputs(eventWise, filter_functions=[filter_obs, filter_pt_eta], batch_length=1000):
     """
     Add to the eventWise a set of particles prefixed by JetInputs
@@ -3619,32 +5025,51 @@ def create_jetInputs(eventWise, filter_functions=[filter_obs, filter_pt_eta], ba
             sources.remove(s)
     columns = ["JetInputs_" + c for c in sources]
     columns.append("JetInputs_SourceIdx")
+    event_offsets, mask = jet_input_mask(eventWise, filter_functions, start_point, end_point)
+    # each event keeps the particles that pass the mask
+    kept_offsets = np.concatenate(([0], np.cumsum(mask)))[event_offsets]
     # the source column gives indices in the origin
-    # construct the observable filter in advance
-    contents = {"JetInputs_SourceIdx": list(getattr(eventWise, "JetInputs_SourceIdx", []))}
-    for name in columns:
-        contents[name] = list(getattr(eventWise, name, []))
-    mask = []
-    for event_n in range(start_point, end_point):
-        if event_n % 100 == 0:
-            print(f"{event_n/n_events:.1%}", end='\r', flush=True)
-        eventWise.selected_index = event_n
-        idx_selection = np.arange(len(eventWise.PT))
-        for filter_func in filter_functions:
-            idx_selection = filter_func(eventWise, idx_selection)
-        contents["JetInputs_SourceIdx"].append(idx_selection)
-        mask_here = np.full_like(eventWise.PT, False, dtype=bool)
-        mask_here[idx_selection] = True
-        mask.append(awkward.fromiter(mask_here))
-    mask = awkward.fromiter(mask).astype(bool)
-    eventWise.selected_index = None
+    particle_idx = np.arange(len(mask))
+    particle_idx -= np.repeat(event_offsets[:-1], np.diff(event_offsets))
+    new_contents = {"JetInputs_SourceIdx": particle_idx[mask]}
     for name, source_name in zip(columns, sources):
-        contents[name] += list(getattr(eventWise, source_name)[start_point:end_point][mask])
-    contents = {k:awkward.fromiter(v) for k, v in contents.items()}
+        _, content = _flat_range(eventWise, source_name, start_point, end_point)
+        new_contents[name] = content[mask]
+    eventWise.selected_index = None
+    contents = {}
+    for name, content in new_contents.items():
+        new_events = Components.restore_structure([kept_offsets], content)
+        contents[name] = Components.concatenate_events([getattr(eventWise, name, []), new_events])
     eventWise.append(**contents)
     return end_point == n_events
 
 
+def _summary_array(eventWise):
+    """
+    The jet inputs of one event as a table of
+    input index, px, py, pz and energy.
+
+    Parameters
+    ----------
+    eventWise : EventWise
+        file containing data
+
+    Returns
+    -------
+    summary : 2d numpy array of floats
+        one row per jet input
+
+    """
+    assert eventWise.selected_index is not None
+    n_inputs = len(eventWise.JetInputs_SourceIdx)
+    summary = np.vstack((np.arange(n_inputs),
+                         eventWise.JetInputs_Px,
+                         eventWise.JetInputs_Py,
+                         eventWise.JetInputs_Pz,
+                         eventWise.JetInputs_Energy)).T
+    return summary
+
+
 def produce_summary(eventWise, to_file=True):
     """
     Create a csv of the jet inputs for one event.
@@ -3664,14 +5089,7 @@ def produce_summary(eventWise, to_file=True):
 
 
     """
-    assert eventWise.selected_index is not None
-    n_inputs = len(eventWise.JetInputs_SourceIdx)
-    summary = np.vstack((np.arange(n_inputs),
-                         eventWise.JetInputs_Px,
-                         eventWise.JetInputs_Py,
-                         eventWise.JetInputs_Pz,
-                         eventWise.JetInputs_Energy)).T
-    summary = summary.astype(str)
+    summary = _summary_array(eventWise).astype(str)
     if to_file:
         header = f"# summary file for {eventWise}, event {eventWise.selected_index}\n"
         file_name = os.path.join(eventWise.dir_name, f"summary_observables.csv")
@@ -3684,25 +5102,355 @@ def produce_summary(eventWise, to_file=True):
         return '\n'.join(rows).encode()
 
 
-def run_FastJet(eventWise, DeltaR, ExpofPTMultiplier, jet_name="FastJet", use_pipe=True):
+class FastJetBridge:
     """
-    Run fastjet on one event. Data not written to eventWise.
+    A long lived applyFastJet process that clusters events sent over a pipe.
+    Batches of events go in and trees come out in a binary framing
+    (see run_binary in applyFastJet.cc), so a whole file can be
+    clustered with one process launch and no text formatting.
+    The process is started on the first event and restarted if it fails.
+    Builds of applyFastJet without --binary are run once per event
+    with the text protocol instead.
+    """
+    int_columns = ["pseudojet_id", "InputIdx", "parent_id", "child1_id", "child2_id"]
+    float_columns = ["PT", "Rapidity", "Phi", "Energy", "Px", "Py", "Pz"]
+    algorithm_names = {0: "kt_algorithm", 1: "antikt_algorithm", 2: "cambridge_algorithm"}
+    max_tries = 5
+    _batch_header = struct.Struct("=iid")
+    _shared = {}
+
+    def __init__(self, program_path="./tree_tagger/applyFastJet"):
+        self.program_path = program_path
+        self._process = None
+        # None until the program has been asked if it speaks the binary protocol
+        self.binary = None
 
-    Parameters
-    ----------
-    eventWise : EventWise
-        Input data file
-    DeltaR: float
-        stoppign parameter for clustering
-    ExpofPTMultiplier : int
-        should be -1, 0, or 1 depending if anti-kt, cambridge aachen or
-        kt clustering is required
-    jet_name: string
+    @classmethod
+    def shared(cls, program_path="./tree_tagger/applyFastJet"):
+        """
+        A bridge that is reused by every call with the same program path,
+        and closed when python exits.
+
+        Parameters
+        ----------
+        program_path : string
+            path to call the program at
+            (Default value = "./tree_tagger/applyFastJet")
+
+        Returns
+        -------
+        bridge : FastJetBridge
+            the shared bridge for this program
+
+        """
+        bridge = cls._shared.get(program_path)
+        if bridge is None:
+            bridge = cls._shared[program_path] = cls(program_path)
+            atexit.register(bridge.close)
+        return bridge
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _start(self):
+        """
+        Launch the program, listening for binary input.
+        The first launch checks the program accepts --binary,
+        builds from before it was added only have the text protocol,
+        and then every event is sent as text instead.
+        """
+        if self.binary is False:
+            return
+        self._process = subprocess.Popen([self.program_path, "--binary"],
+                                         stdout=subprocess.PIPE,
+                                         stdin=subprocess.PIPE)
+        if self.binary is None:
+            self.binary = self._probe()
+            if not self.binary:
+                print(f"{self.program_path} does not accept --binary, "
+                      "using the text protocol")
+                self.close()
+
+    def _probe(self):
+        """ Send an empty batch, only the binary protocol replies with a zero offset """
+        try:
+            self._process.stdin.write(self._batch_header.pack(0, 0, 0.) +
+                                      np.zeros(1, dtype=np.int64).tobytes())
+            self._process.stdin.flush()
+            return self._read(8) == bytes(8)
+        except (OSError, EOFError):
+            return False
+
+    def close(self):
+        """ End the process, closing stdin tells it to stop """
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.close()
+            self._process.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self._process.kill()
+            self._process.wait()
+        self._process.stdout.close()
+        self._process = None
+
+    def _read(self, n_bytes):
+        """ Read exactly n_bytes from the process """
+        data = self._process.stdout.read(n_bytes)
+        if len(data) < n_bytes:
+            raise EOFError(f"Expected {n_bytes} bytes from {self.program_path}, got {len(data)}")
+        return data
+
+    def cluster(self, inputs, DeltaR, algorithm_num):
+        """
+        Cluster one event.
+
+        Parameters
+        ----------
+        inputs : 2d array like of floats
+            one row per jet input, with columns
+            input index, px, py, pz and energy
+        DeltaR : float
+            stopping parameter for clustering
+        algorithm_num : int
+            number indicating the algorithm to use
+
+        Returns
+        -------
+        header : string
+            deltaR, algorithm and int columns, as in the text output
+        fast_ints : 2d numpy array of ints
+            pseudojet_id, InputIdx, parent_id, child1_id, child2_id
+            for each pseudojet
+        fast_floats : 2d numpy array of floats
+            PT, Rapidity, Phi, Energy, Px, Py, Pz
+            for each pseudojet
+
+        """
+        inputs = np.asarray(inputs, dtype=float).reshape((-1, 5))
+        header, fast_ints, fast_floats, _ = self.cluster_batch(inputs, [0, len(inputs)],
+                                                               DeltaR, algorithm_num)
+        return header, fast_ints, fast_floats
+
+    def cluster_batch(self, inputs, input_offsets, DeltaR, algorithm_num):
+        """
+        Cluster many events in one exchange with the process.
+
+        Parameters
+        ----------
+        inputs : 2d array like of floats
+            one row per jet input, for all events end to end, with columns
+            input index in the event, px, py, pz and energy
+        input_offsets : array like of ints
+            where each event starts in the inputs,
+            with one extra entry for the end of the last event
+        DeltaR : float
+            stopping parameter for clustering
+        algorithm_num : int
+            number indicating the algorithm to use
+
+        Returns
+        -------
+        header : string
+            deltaR, algorithm and int columns, as in the text output
+        fast_ints : 2d numpy array of ints
+            pseudojet_id, InputIdx, parent_id, child1_id, child2_id
+            for each pseudojet of all events
+        fast_floats : 2d numpy array of floats
+            PT, Rapidity, Phi, Energy, Px, Py, Pz
+            for each pseudojet of all events
+        row_offsets : numpy array of ints
+            where each event starts in the rows of
+            fast_ints and fast_floats, with one extra entry for the end
+
+        """
+        inputs = np.ascontiguousarray(inputs, dtype=float).reshape((-1, 5))
+        input_offsets = np.ascontiguousarray(input_offsets, dtype=np.int64)
+        n_events = len(input_offsets) - 1
+        assert input_offsets[-1] == len(inputs)
+        message = self._batch_header.pack(n_events, algorithm_num, DeltaR) + \
+            input_offsets.tobytes() + inputs.tobytes()
+        if self.binary is None:
+            self._start()
+        if not self.binary:
+            return self._cluster_batch_text(inputs, input_offsets, DeltaR, algorithm_num)
+        n_int_cols, n_float_cols = len(self.int_columns), len(self.float_columns)
+        for _ in range(self.max_tries):
+            if self._process is None or self._process.poll() is not None:
+                self.close()
+                self._start()
+            try:
+                self._process.stdin.write(message)
+                self._process.stdin.flush()
+                row_offsets = np.frombuffer(self._read(8*(n_events + 1)), dtype=np.int64)
+                n_rows = int(row_offsets[-1])
+                fast_ints = np.frombuffer(self._read(4*n_int_cols*n_rows), dtype=np.int32)
+                fast_floats = np.frombuffer(self._read(8*n_float_cols*n_rows), dtype=float)
+                break
+            except (OSError, EOFError):
+                print("Error! No output, retrying that input")
+                self.close()
+        else:
+            raise RuntimeError("Subprocess problems")
+        fast_ints = fast_ints.reshape((n_rows, n_int_cols)).astype(int)
+        fast_floats = fast_floats.reshape((n_rows, n_float_cols))
+        return self._header(DeltaR, algorithm_num), fast_ints, fast_floats, \
+            row_offsets.astype(int)
+
+    def _header(self, DeltaR, algorithm_num):
+        """ The header line of the text output, without the leading # """
+        return f"deltaR={DeltaR} {self.algorithm_names[algorithm_num]} Columns; " + \
+            ' '.join(self.int_columns)
+
+    def _cluster_batch_text(self, inputs, input_offsets, DeltaR, algorithm_num):
+        """
+        Cluster many events with the text protocol,
+        one program launch per event.
+        Takes and returns the same as cluster_batch.
+        """
+        all_ints, all_floats, row_offsets = [], [], [0]
+        for start, stop in zip(input_offsets[:-1], input_offsets[1:]):
+            output_lines = self._run_text(inputs[start:stop], DeltaR, algorithm_num)
+            _, fast_ints, fast_floats, fcolumns = self.parse_text(output_lines)
+            assert fcolumns == self.float_columns
+            all_ints.append(fast_ints)
+            all_floats.append(fast_floats)
+            row_offsets.append(row_offsets[-1] + len(fast_ints))
+        n_int_cols, n_float_cols = len(self.int_columns), len(self.float_columns)
+        fast_ints = np.vstack(all_ints + [np.empty((0, n_int_cols), dtype=int)])
+        fast_floats = np.vstack(all_floats + [np.empty((0, n_float_cols))])
+        return self._header(DeltaR, algorithm_num), fast_ints, fast_floats, \
+            np.array(row_offsets)
+
+    def _run_text(self, inputs, DeltaR, algorithm_num):
+        """
+        Run the program once on one event,
+        sending it the inputs as text on stdin.
+
+        Parameters
+        ----------
+        inputs : 2d numpy array of floats
+            one row per jet input, with columns
+            input index, px, py, pz and energy
+        DeltaR : float
+            stopping parameter for clustering
+        algorithm_num : int
+            number indicating the algorithm to use
+
+        Returns
+        -------
+        output_lines : list of bytes
+            returned from fastjet
+
+        """
+        input_lines = '\n'.join([' '.join([str(x) for x in row])
+                                 for row in inputs]).encode()
+        # all system prompts start with *
+        start_marker = b' **output file starts here\n'
+        for _ in range(self.max_tries):
+            process = subprocess.run([self.program_path, str(DeltaR), str(algorithm_num)],
+                                     input=input_lines, stdout=subprocess.PIPE)
+            if start_marker in process.stdout:
+                return process.stdout.split(start_marker, 1)[1].splitlines()
+            print("Error! No output, retrying that input")
+        raise RuntimeError("Subprocess problems")
+
+    @classmethod
+    def parse_text(cls, output_lines):
+        """
+        Read the text output of the program.
+
+        Parameters
+        ----------
+        output_lines : list of bytes
+            returned from fastjet, starting with the header
+
+        Returns
+        -------
+        header : string
+            deltaR, algorithm and int columns
+        fast_ints : 2d numpy array of ints
+            one row per pseudojet, with the columns in the header
+        fast_floats : 2d numpy array of floats
+            one row per pseudojet, with the columns in fcolumns
+        fcolumns : list of strings
+            the columns of fast_floats
+
+        """
+        header = output_lines[0].decode()[1:]
+        arrays = [[]]
+        a_type = int
+        fcolumns = cls.float_columns
+        for line in output_lines[1:]:
+            line = line.decode().strip()
+            if not line:
+                continue
+            if line[0] == '#':  # moves from the ints to the doubles
+                arrays.append([])
+                a_type = float
+                fcolumns = line[1:].split()
+            else:
+                arrays[-1].append([a_type(x) for x in line.split()])
+        assert len(arrays) == 2, f"Problem wiht input; \n{output_lines}"
+        n_int_cols = len(header.split()) - header.split().index("Columns;") - 1
+        fast_ints = np.array(arrays[0], dtype=int).reshape((-1, n_int_cols))
+        fast_floats = np.array(arrays[1], dtype=float).reshape((-1, len(fcolumns)))
+        return header, fast_ints, fast_floats, fcolumns
+
+
+def _fastjet_algorithm_num(ExpofPTMultiplier):
+    """
+    The number applyFastJet uses for a clustering algorithm.
+
+    Parameters
+    ----------
+    ExpofPTMultiplier : int
+        should be -1, 0, or 1 depending if anti-kt, cambridge aachen or
+        kt clustering is required
+
+    Returns
+    -------
+    algorithm_num : int
+        number indicating the algorithm to use
+
+    """
+    if ExpofPTMultiplier == -1:
+        # antikt algorithm
+        return 1
+    elif ExpofPTMultiplier == 0:
+        return 2
+    elif ExpofPTMultiplier == 1:
+        return 0
+    raise ValueError(f"ExpofPTMultiplier should be -1, 0 or 1, found {ExpofPTMultiplier}")
+
+
+def run_FastJet(eventWise, DeltaR, ExpofPTMultiplier, jet_name="FastJet", use_pipe=True,
+                bridge=None):
+    """
+    Run fastjet on one event. Data not written to eventWise.
+
+    Parameters
+    ----------
+    eventWise : EventWise
+        Input data file
+    DeltaR: float
+        stoppign parameter for clustering
+    ExpofPTMultiplier : int
+        should be -1, 0, or 1 depending if anti-kt, cambridge aachen or
+        kt clustering is required
+    jet_name: string
         Prefix name for the jet in eventWise
         (Default value = "FastJet")
     use_pipe : bool
         Should the data be piped to fastjet, rather than reading and writing from disk?
         (Default value = True)
+    bridge : FastJetBridge
+        fastjet process to pipe the event to,
+        if not given one process is shared between calls
+        (Default value = None)
 
     Returns
     -------
@@ -3711,20 +5459,12 @@ def run_FastJet(eventWise, DeltaR, ExpofPTMultiplier, jet_name="FastJet", use_pi
 
     """
     assert eventWise.selected_index is not None
-    if ExpofPTMultiplier == -1:
-        # antikt algorithm
-        algorithm_num = 1
-    elif ExpofPTMultiplier == 0:
-        algorithm_num = 2
-    elif ExpofPTMultiplier == 1:
-        algorithm_num = 0
-    else:
-        raise ValueError(f"ExpofPTMultiplier should be -1, 0 or 1, found {ExpofPTMultiplier}")
+    algorithm_num = _fastjet_algorithm_num(ExpofPTMultiplier)
     program_name = "./tree_tagger/applyFastJet"
     if use_pipe:
-        summary_lines = produce_summary(eventWise, False)
-        out = _run_applyfastjet(summary_lines, str(DeltaR).encode(),
-                                str(algorithm_num).encode())
+        if bridge is None:
+            bridge = FastJetBridge.shared(program_name)
+        out = bridge.cluster(_summary_array(eventWise), DeltaR, algorithm_num)
         fastjets = Traditional.read_fastjet(out, eventWise, jet_name=jet_name)
         return fastjets
     produce_summary(eventWise)
@@ -3733,60 +5473,684 @@ def run_FastJet(eventWise, DeltaR, ExpofPTMultiplier, jet_name="FastJet", use_pi
     return fastjets
 
 
-def _run_applyfastjet(input_lines, DeltaR, algorithm_num, program_path="./tree_tagger/applyFastJet", tries=0):
+def run_FastJet_batch(eventWise, DeltaR, ExpofPTMultiplier, jet_name="FastJet",
+                      start=0, stop=None, bridge=None):
     """
-    Run applyfastjet, sending the provided input lines to stdin
-    Helper function for run_FastJet
+    Run fastjet on a range of events in one exchange with the fastjet process.
+    Data not written to eventWise.
 
     Parameters
     ----------
-    input_lines : list of byte array
-        contents of the input as byte arrays
-    DeltaR : float
-        stopping parameter for clustering
-    algorithm_num : int
-        number indicating the algorithm to use
-    program_path : string
-        path to call the program at
-        (Default value = "./tree_tagger/applyFastJet")
-    tries : int
-        number of tries with this input
+    eventWise : EventWise
+        Input data file
+    DeltaR: float
+        stoppign parameter for clustering
+    ExpofPTMultiplier : int
+        should be -1, 0, or 1 depending if anti-kt, cambridge aachen or
+        kt clustering is required
+    jet_name: string
+        Prefix name for the jet in eventWise
+        (Default value = "FastJet")
+    start : int
+        first event to cluster
         (Default value = 0)
+    stop : int
+        event to stop before, if not given
+        all events after start are clustered
+        (Default value = None)
+    bridge : FastJetBridge
+        fastjet process to send the events to,
+        if not given one process is shared between calls
+        (Default value = None)
 
+    Returns
+    -------
+    columns : dict of awkward arrays
+        the jets of each event from start to stop, in the columns
+        and order that run_FastJet and Traditional.create_updated_dict give,
+        can be joined to earlier events with Components.concatenate_events
+
+    """
+    eventWise.selected_index = None
+    n_events = len(eventWise.JetInputs_Energy)
+    stop = n_events if stop is None else min(stop, n_events)
+    flat = [Components.flat_structure(Components.event_chunk(
+                getattr(eventWise, "JetInputs_" + name), start, stop))
+            for name in ["Px", "Py", "Pz", "Energy"]]
+    input_offsets = flat[0][0][0] if flat[0][0] else np.zeros(1, dtype=int)
+    input_counts = np.diff(input_offsets)
+    local_idx = np.arange(input_offsets[-1]) - np.repeat(input_offsets[:-1], input_counts)
+    inputs = np.column_stack([local_idx] + [content for _, content in flat])
+    if bridge is None:
+        bridge = FastJetBridge.shared()
+    _, fast_ints, fast_floats, row_offsets = \
+        bridge.cluster_batch(inputs, input_offsets, DeltaR,
+                             _fastjet_algorithm_num(ExpofPTMultiplier))
+    return _fastjet_columns(fast_ints, fast_floats, row_offsets, input_counts, jet_name)
+
+
+def _fastjet_columns(fast_ints, fast_floats, row_offsets, input_counts, jet_name):
+    """
+    Turn the fastjet output of many events into jet columns,
+    matching what Traditional.read_fastjet followed by split gives for each event.
+    Each step is done for all events at once, looping only over the depth of the trees.
+
+    Parameters
+    ----------
+    fast_ints : 2d numpy array of ints
+        pseudojet_id, InputIdx, parent_id, child1_id, child2_id
+        for each pseudojet of all events
+    fast_floats : 2d numpy array of floats
+        PT, Rapidity, Phi, Energy, Px, Py, Pz
+        for each pseudojet of all events
+    row_offsets : numpy array of ints
+        where each event starts in the rows
+    input_counts : numpy array of ints
+        number of jet inputs in each event
+    jet_name: string
+        Prefix name for the jet in eventWise
 
     Returns
     -------
-    output_lines : list of bytes
-        returned from fastjet
+    columns : dict of awkward arrays
+        the jets of each event
+
+    """
+    n_events = len(input_counts)
+    n_rows = len(fast_ints)
+    event_of_row = np.repeat(np.arange(n_events), np.diff(row_offsets))
+    row_start = row_offsets[:-1][event_of_row]
+    # applyFastJet numbers the pseudojets of an event by their row
+    assert np.array_equal(fast_ints[:, 0], np.arange(n_rows) - row_start)
+    input_idx = fast_ints[:, 1]
+    is_input = input_idx >= 0
+    assert np.array_equal(np.bincount(event_of_row[is_input], minlength=n_events),
+                          input_counts), "Problem with inpu idx"
+    # inputs keep their index, joins are numbered after the inputs in row order
+    is_join = ~is_input
+    joins_before = np.cumsum(is_join) - is_join
+    joins_at_start = joins_before[row_start]
+    new_id = np.where(is_input, input_idx,
+                      input_counts[event_of_row] + joins_before - joins_at_start)
+    links = fast_ints[:, 2:]
+    link_rows = np.where(links >= 0, links + row_start[:, None], -1)
+    link_ids = np.where(links >= 0, new_id[link_rows], -1)
+    parent_row, child1_row, child2_row = link_rows.T
+    # group the rows by depth in their tree
+    levels = [np.flatnonzero(parent_row < 0)]
+    while len(levels[-1]):
+        children = np.concatenate((child1_row[levels[-1]], child2_row[levels[-1]]))
+        levels.append(children[children >= 0])
+    # rank is one less than the height above the deepest input,
+    # and the size counts all the pseudojets in a subtree
+    height = np.zeros(n_rows, dtype=int)
+    size = np.ones(n_rows, dtype=int)
+    for level in levels[-2:0:-1]:
+        np.maximum.at(height, parent_row[level], height[level] + 1)
+        np.add.at(size, parent_row[level], size[level])
+    # jets are sorted by root within each event
+    roots = levels[0][np.lexsort((new_id[levels[0]], event_of_row[levels[0]]))]
+    jet_of_row = np.empty(n_rows, dtype=int)
+    jet_of_row[roots] = np.arange(len(roots))
+    # rows within a jet follow get_decendants, depth first with the second child first
+    position = np.zeros(n_rows, dtype=int)
+    for level in levels[:-1]:
+        parents = level[child1_row[level] >= 0]
+        child1, child2 = child1_row[parents], child2_row[parents]
+        position[child2] = position[parents] + 1
+        position[child1] = position[parents] + 1 + size[child2]
+        jet_of_row[child1] = jet_of_row[child2] = jet_of_row[parents]
+    jet_sizes = size[roots]
+    jet_starts = np.cumsum(jet_sizes) - jet_sizes
+    order = np.empty(n_rows, dtype=int)
+    order[jet_starts[jet_of_row] + position] = np.arange(n_rows)
+    jets_per_event = np.bincount(event_of_row[roots], minlength=n_events)
+    offsets = [np.concatenate(([0], np.cumsum(jets_per_event))),
+               np.concatenate(([0], np.cumsum(jet_sizes)))]
+    int_values = [new_id, link_ids[:, 0], link_ids[:, 1], link_ids[:, 2], height - 1]
+    float_values = [fast_floats[:, i] for i in range(fast_floats.shape[1])]
+    float_values += [np.zeros(n_rows), np.zeros(n_rows)]  # join distance and size
+    columns = {}
+    for name, values in zip(Traditional.int_columns + Traditional.float_columns,
+                            int_values + float_values):
+        columns[name.replace('Pseudojet', jet_name)] = \
+            Components.restore_structure(offsets, values[order])
+    columns[jet_name + "_RootInputIdx"] = Components.restore_structure(
+        offsets[:1] + [np.arange(len(roots) + 1)], new_id[roots])
+    return columns
 
+
+class JetColumnBuilder:
+    """
+    Collects the jets of many events into growing flat arrays,
+    then makes the jagged columns create_updated_dict would give in one step.
+    Each event adds rows to the buffers and a count of jets,
+    each jet adds a count of rows and roots,
+    so no nested python lists are built.
     """
-    # input liens should eb one long byte string
-    assert isinstance(input_lines, bytes)
-    process = subprocess.Popen([program_path, DeltaR, algorithm_num],
-                               stdout=subprocess.PIPE,
-                               stdin=subprocess.PIPE)
-    while process.poll() is None:
-        output_lines = None
-        process_output = process.stdout.readline()
-        if process_output[:2] == b' *': # all system prompts start with *
-            # note that SusHi reads the input file several times
-            if b'**send input file to stdin' in process_output:
-                process.stdin.write(input_lines)
-                process.stdin.flush()
-                process.stdin.close()
-            elif b'**output file starts here' in process_output:
-                process.wait()  # ok let it complete
-                output_lines = process.stdout.readlines()
-    if output_lines is None:
-        print("Error! No output, retrying that input")
-        tries += 1
-        if tries > 5:
-            print("Tried this 5 times... already")
-            #st()
-            raise RuntimeError("Subrocess problems")
-        # recursive call
-        output_lines = _run_applyfastjet(input_lines, DeltaR, algorithm_num, program_path, tries)
-    return output_lines
+    def __init__(self, jet_class, jet_name, eventWise=None, initial_rows=1024):
+        """
+        Class constructor
+
+        Parameters
+        ----------
+        jet_class : class
+            class of the jets that will be added
+        jet_name : string
+            Prefix name for the jet in eventWise
+        eventWise : EventWise
+            if given, the jets already in this eventWise
+            are used as the first events
+            (Default value = None)
+        initial_rows : int
+            number of rows to allocate in the buffers,
+            the buffers double in size when full
+            (Default value = 1024)
+
+        """
+        self.jet_name = jet_name
+        self.int_columns = [c.replace('Pseudojet', jet_name) for c in jet_class.int_columns]
+        self.float_columns = [c.replace('Pseudojet', jet_name) for c in jet_class.float_columns
+                              if "_PerfectDenominator" not in c]
+        if eventWise is not None and jet_name + "_Rapidity" not in eventWise.columns \
+                and jet_name + "_PseudoRapidity" in eventWise.columns:
+            self._use_pseudorapidity()
+        self.n_events = 0
+        self.n_jets = 0
+        self.n_rows = 0
+        self.n_roots = 0
+        self._ints = np.empty((initial_rows, len(self.int_columns)), dtype=int)
+        self._floats = np.empty((initial_rows, len(self.float_columns)), dtype=float)
+        self._roots = np.empty(initial_rows, dtype=int)
+        self._jets_per_event = np.zeros(initial_rows, dtype=int)
+        self._rows_per_jet = np.empty(initial_rows, dtype=int)
+        self._roots_per_jet = np.empty(initial_rows, dtype=int)
+        if eventWise is not None:
+            self._add_existing(eventWise)
+
+    def _use_pseudorapidity(self):
+        """ Swap the rapidity column for a pseudorapidity column """
+        idx = self.float_columns.index(self.jet_name + "_Rapidity")
+        self.float_columns[idx] = self.jet_name + "_PseudoRapidity"
+
+    @staticmethod
+    def _grow(buffer, length):
+        """
+        Return a buffer that can hold at least length rows,
+        doubling the size of the given buffer if it is too small.
+
+        Parameters
+        ----------
+        buffer : numpy array
+            array to be grown
+        length : int
+            number of rows needed
+
+        Returns
+        -------
+        buffer : numpy array
+            array with at least length rows,
+            the same object if it was long enough
+
+        """
+        if length <= len(buffer):
+            return buffer
+        new_length = max(length, 2*len(buffer))
+        new_buffer = np.zeros((new_length,) + buffer.shape[1:], dtype=buffer.dtype)
+        new_buffer[:len(buffer)] = buffer
+        return new_buffer
+
+    def _add_existing(self, eventWise):
+        """
+        Start the buffers with the jets already in an eventWise.
+
+        Parameters
+        ----------
+        eventWise : EventWise
+            eventWise that may contain columns for this jet
+
+        """
+        eventWise.selected_index = None
+        root_name = self.jet_name + "_RootInputIdx"
+        if root_name not in eventWise.columns:
+            return
+        (event_offsets, root_offsets), roots = \
+            Components.flat_structure(getattr(eventWise, root_name))
+        self.n_events = len(event_offsets) - 1
+        self.n_jets = len(root_offsets) - 1
+        self.n_roots = len(roots)
+        self._jets_per_event = self._grow(self._jets_per_event, self.n_events)
+        self._jets_per_event[:self.n_events] = np.diff(event_offsets)
+        self._roots_per_jet = self._grow(self._roots_per_jet, self.n_jets)
+        self._roots_per_jet[:self.n_jets] = np.diff(root_offsets)
+        self._roots = self._grow(self._roots, self.n_roots)
+        self._roots[:self.n_roots] = roots
+        for buffer_name, names in (("_ints", self.int_columns), ("_floats", self.float_columns)):
+            for col_num, name in enumerate(names):
+                (_, row_offsets), content = \
+                    Components.flat_structure(getattr(eventWise, name))
+                self.n_rows = len(content)
+                buffer = self._grow(getattr(self, buffer_name), self.n_rows)
+                buffer[:self.n_rows, col_num] = content
+                setattr(self, buffer_name, buffer)
+        self._rows_per_jet = self._grow(self._rows_per_jet, self.n_jets)
+        self._rows_per_jet[:self.n_jets] = np.diff(row_offsets)
+
+    def add_event(self, event_index, pseudojets):
+        """
+        Add the jets of one event, any events between the last
+        event added and this one are left empty.
+
+        Parameters
+        ----------
+        event_index : int
+            zero index event number that these pseudojets belong to
+        pseudojets : list of PseudoJet
+            pseudojet objects created in the chosen event.
+
+        """
+        assert event_index >= self.n_events - 1, \
+                "Events must be added in order"
+        n_events = event_index + 1
+        self._jets_per_event = self._grow(self._jets_per_event, n_events)
+        self._jets_per_event[self.n_events:n_events] = 0
+        self.n_events = max(self.n_events, n_events)
+        if not pseudojets:
+            return
+        if self.n_rows == 0 and pseudojets[0].from_PseudoRapidity \
+                and self.jet_name + "_Rapidity" in self.float_columns:
+            self._use_pseudorapidity()
+        float_idxs = [pseudojets[0].float_columns.index(name)
+                      for name in self.float_columns]
+        n_jets = self.n_jets + len(pseudojets)
+        self._rows_per_jet = self._grow(self._rows_per_jet, n_jets)
+        self._roots_per_jet = self._grow(self._roots_per_jet, n_jets)
+        for jet in pseudojets:
+            assert jet.eventWise == pseudojets[0].eventWise
+            n_rows = len(jet._ints)
+            end = self.n_rows + n_rows
+            self._ints = self._grow(self._ints, end)
+            self._ints[self.n_rows:end] = jet._ints
+            self._floats = self._grow(self._floats, end)
+            self._floats[self.n_rows:end] = jet._floats[:, float_idxs]
+            roots = jet.root_jetInputIdxs
+            self._roots = self._grow(self._roots, self.n_roots + len(roots))
+            self._roots[self.n_roots:self.n_roots + len(roots)] = roots
+            self._rows_per_jet[self.n_jets] = n_rows
+            self._roots_per_jet[self.n_jets] = len(roots)
+            self.n_rows = end
+            self.n_roots += len(roots)
+            self.n_jets += 1
+        self._jets_per_event[event_index] += len(pseudojets)
+
+    def columns(self):
+        """
+        Make the jagged columns of all the events added.
+
+        Returns
+        -------
+        columns : dict of awkward arrays
+            keys are column names, values have one entry per event
+            then one entry per jet
+
+        """
+        event_offsets = np.zeros(self.n_events + 1, dtype=int)
+        np.cumsum(self._jets_per_event[:self.n_events], out=event_offsets[1:])
+        row_offsets = np.zeros(self.n_jets + 1, dtype=int)
+        np.cumsum(self._rows_per_jet[:self.n_jets], out=row_offsets[1:])
+        root_offsets = np.zeros(self.n_jets + 1, dtype=int)
+        np.cumsum(self._roots_per_jet[:self.n_jets], out=root_offsets[1:])
+        offsets = [event_offsets, row_offsets]
+        columns = {self.jet_name + "_RootInputIdx":
+                   Components.restore_structure([event_offsets, root_offsets],
+                                                self._roots[:self.n_roots].copy())}
+        for buffer, names in ((self._ints, self.int_columns), (self._floats, self.float_columns)):
+            for col_num, name in enumerate(names):
+                columns[name] = Components.restore_structure(
+                        offsets, buffer[:self.n_rows, col_num].copy())
+        return columns
+
+
+class ClusterResultLog:
+    """
+    Append only record of the jets made by cluster_multiapply,
+    kept in a hidden directory beside the eventWise file,
+    so it is not mistaken for a directory of fragments.
+    Each batch of events goes in its own file, which only appears
+    once it is complete, so an interrupted run loses at most the batch in progress
+    and the next run continues from the last batch on disk.
+    Compacting moves the logged events into the eventWise and removes the log.
+    Neither writing a batch nor compacting rewrites the events that came before,
+    so the cost of each is the same however many events are stored.
+    """
+    batch_format = "events{:09d}-{:09d}.awkd"
+    batch_pattern = re.compile(r"^events(\d+)-(\d+)\.awkd$")
+    temp_format = "~{}.awkd"
+    temp_pattern = re.compile(r"^~\d+\.awkd$")
+
+    def __init__(self, eventWise, jet_name):
+        """
+        Class constructor
+
+        Parameters
+        ----------
+        eventWise : EventWise
+            data file the jets belong in
+        jet_name : string
+            Prefix name for the jet in eventWise
+
+        """
+        self.eventWise = eventWise
+        self.jet_name = jet_name
+        self.logs_dir = self.logs_dir_of(eventWise)
+        self.dir_name = os.path.join(self.logs_dir, jet_name)
+
+    @staticmethod
+    def logs_dir_of(eventWise):
+        """
+        Directory that holds the logs of every jet in an eventWise.
+
+        Parameters
+        ----------
+        eventWise : EventWise
+            data file the jets belong in
+
+        Returns
+        -------
+        logs_dir : string
+            path of the directory, which may not exist
+
+        """
+        return os.path.join(eventWise.dir_name, Components.logs_dir_name(eventWise.save_name))
+
+    @classmethod
+    def clear_all(cls, eventWise):
+        """
+        Delete the logs of every jet in an eventWise,
+        dropping any events that were not compacted.
+
+        Parameters
+        ----------
+        eventWise : EventWise
+            data file the jets belong in
+
+        """
+        shutil.rmtree(cls.logs_dir_of(eventWise), ignore_errors=True)
+
+    @property
+    def n_stored(self):
+        """ Number of events whose jets are already in the eventWise """
+        self.eventWise.selected_index = None
+        return len(getattr(self.eventWise, self.jet_name + "_Energy", []))
+
+    def _batch_files(self):
+        """
+        All complete batch files in the log.
+
+        Returns
+        -------
+        batches : list of tuples
+            start, stop and file path of each batch, ordered by start
+
+        """
+        if not os.path.isdir(self.dir_name):
+            return []
+        batches = []
+        for file_name in os.listdir(self.dir_name):
+            match = self.batch_pattern.match(file_name)
+            if match is not None:
+                batches.append((int(match.group(1)), int(match.group(2)),
+                                os.path.join(self.dir_name, file_name)))
+        return sorted(batches)
+
+    def batches(self):
+        """
+        The batches that carry on from the events in the eventWise,
+        without gaps. Batches left from before the last compaction are ignored.
+
+        Returns
+        -------
+        batches : list of tuples
+            start, stop and file path of each batch, in order
+
+        """
+        stop = self.n_stored
+        batches = []
+        for start, batch_stop, path in self._batch_files():
+            if start == stop:
+                batches.append((start, batch_stop, path))
+                stop = batch_stop
+        return batches
+
+    @property
+    def stop(self):
+        """ Number of events that are stored, in the eventWise or the log """
+        batches = self.batches()
+        if batches:
+            return batches[-1][1]
+        return self.n_stored
+
+    def write_batch(self, start, stop, **columns):
+        """
+        Durably add a batch of events to the log.
+        The file is written under a temporary name, synced,
+        then renamed, so it is either complete or absent.
+
+        Parameters
+        ----------
+        start : int
+            first event in the batch
+        stop : int
+            event after the last event in the batch
+        **columns : awkward arrays
+            the parameter names are the column names
+            the parameter values have one entry per event in the batch
+
+        """
+        assert start == self.stop, f"Batch starts at {start}, log is at {self.stop}"
+        assert all(len(column) == stop - start for column in columns.values())
+        os.makedirs(self.dir_name, exist_ok=True)
+        path = os.path.join(self.dir_name, self.batch_format.format(start, stop))
+        temp_path = os.path.join(self.dir_name, self.temp_format.format(os.getpid()))
+        awkward.save(temp_path, columns, mode='w')
+        with open(temp_path, 'rb') as temp_file:
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+
+    def compact(self, **additional_columns):
+        """
+        Move all logged events into the eventWise, then clear the log.
+        If this is interrupted the log is still valid,
+        batches are only removed once the eventWise has been written.
+
+        Parameters
+        ----------
+        **additional_columns : iterables
+            other columns to append to the eventWise at the same time
+
+        """
+        batches = self.batches()
+        self.eventWise.append(**additional_columns)
+        if batches:
+            self.eventWise.selected_index = None
+            parts = [awkward.load(path) for _, _, path in batches]
+            names = set().union(*[set(part.keys()) for part in parts])
+            # only the logged events are written, the stored events are untouched
+            self.eventWise.extend(**{name: Components.concatenate_events(
+                                         [part[name] for part in parts if name in part])
+                                     for name in names})
+        for _, _, path in self._batch_files():
+            os.remove(path)
+        if os.path.isdir(self.dir_name):
+            # batches that were being written when a run was interrupted
+            for file_name in os.listdir(self.dir_name):
+                if self.temp_pattern.match(file_name):
+                    os.remove(os.path.join(self.dir_name, file_name))
+        for dir_name in [self.dir_name, self.logs_dir]:
+            try:
+                os.rmdir(dir_name)
+            except OSError:  # missing, or holds a batch or log being written
+                pass
+
+
+class SpectralCache:
+    """
+    On disk cache for the arrays Spectral makes before clustering;
+    physical distances, affinity, laplacien and eigenspace.
+    Each entry is named by a hash of the inputs and parameters it depends on,
+    so entries are shared by any parameter sets, processes or runs that need them.
+    Once the cache is larger than max_bytes the least recently used
+    entries are removed.
+    """
+    def __init__(self, dir_name, max_bytes=2**30):
+        """
+        Class constructor
+
+        Parameters
+        ----------
+        dir_name : string
+            directory to keep the cache in, created if needed
+        max_bytes : int
+            largest size the cache is allowed to reach
+            (Default; 2**30)
+        """
+        os.makedirs(dir_name, exist_ok=True)
+        self.dir_name = dir_name
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        Hash some arrays and values into a key for an entry.
+
+        Parameters
+        ----------
+        parts : numpy arrays or values with a stable repr
+            everything the entry depends on
+
+        Returns
+        -------
+        key : string
+            hexadecimal hash
+        """
+        hasher = hashlib.sha1()
+        for part in parts:
+            if isinstance(part, np.ndarray):
+                hasher.update(repr((part.dtype.str, part.shape)).encode())
+                hasher.update(np.ascontiguousarray(part).tobytes())
+            else:
+                hasher.update(repr(part).encode())
+            hasher.update(b'|')
+        return hasher.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.dir_name, key + ".npz")
+
+    def get(self, key):
+        """
+        Read an entry from the cache.
+
+        Parameters
+        ----------
+        key : string
+            key of the entry
+
+        Returns
+        -------
+        arrays : dict of numpy arrays
+            the arrays of the entry, None if it is not in the cache
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as content:
+                arrays = {name: content[name] for name in content.files}
+            os.utime(path)  # mark it as recently used
+        except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+            # missing, or removed by another process
+            return None
+        return arrays
+
+    def put(self, key, **arrays):
+        """
+        Write an entry to the cache, then make room if the cache is too large.
+
+        Parameters
+        ----------
+        key : string
+            key of the entry
+        arrays : numpy arrays
+            named arrays that make the entry
+        """
+        path = self._path(key)
+        # write to a temporary file so other processes never read half an entry
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as temp_file:
+            np.savez(temp_file, **arrays)
+        os.replace(temp_path, path)
+        self._evict()
+
+    def _evict(self):
+        """ Remove the least recently used entries until the cache is small enough """
+        entries = []
+        for name in os.listdir(self.dir_name):
+            if not name.endswith(".npz"):
+                continue
+            path = os.path.join(self.dir_name, name)
+            try:
+                stats = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stats.st_mtime, stats.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    @staticmethod
+    def pack_matrix(matrix):
+        """
+        Split a dense or sparse matrix into arrays for an entry.
+
+        Parameters
+        ----------
+        matrix : 2d numpy array or scipy.sparse matrix
+            matrix to store
+
+        Returns
+        -------
+        arrays : dict of numpy arrays
+            named arrays that make the entry
+        """
+        if scipy.sparse.issparse(matrix):
+            matrix = matrix.tocsr()
+            return {'data': matrix.data, 'indices': matrix.indices,
+                    'indptr': matrix.indptr, 'shape': np.array(matrix.shape)}
+        return {'dense': matrix}
+
+    @staticmethod
+    def unpack_matrix(arrays):
+        """
+        Rebuild a matrix split by pack_matrix.
+
+        Parameters
+        ----------
+        arrays : dict of numpy arrays
+            named arrays from the entry
+
+        Returns
+        -------
+        matrix : 2d numpy array or scipy.sparse matrix
+            the stored matrix
+        """
+        if 'dense' in arrays:
+            return arrays['dense']
+        return scipy.sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                                       shape=tuple(arrays['shape']))
 
 
 def identify_matching_checkpoints(checkpoint_content, checkpoint_hyper,
@@ -3888,9 +6252,14 @@ def retrive_checkpoint_dict(eventWise_list):
 
 def cluster_multiapply(eventWise, cluster_algorithm, dict_jet_params={},
                        jet_name=None, batch_length=100, silent=False,
-                       checkpoint_hyper=None, checkpoint_content=None):
+                       checkpoint_hyper=None, checkpoint_content=None,
+                       stage_cache=None, compact_every=10):
     """
     Apply a clustering algorithm to many events.
+    Each call clusters one batch and adds it to a ClusterResultLog,
+    the log is moved into the eventWise every compact_every batches
+    and when the last event is clustered.
+    An interrupted run continues from the last batch in the log.
 
     Parameters
     ----------
@@ -3911,6 +6280,20 @@ def cluster_multiapply(eventWise, cluster_algorithm, dict_jet_params={},
         should print statments indicating progrss be suppressed?
         useful for running in parallel
         (Default value = False)
+    checkpoint_hyper : dict
+        parameters of the jets in checkpoint_content
+        (Default value = None)
+    checkpoint_content : dict
+        stages saved by other jets, as found by retrive_checkpoint_dict
+        (Default value = None)
+    stage_cache : SpectralCache or string
+        on disk cache, or directory of a cache, for the stages of spectral jets,
+        used for events without checkpoints
+        (Default value = None)
+    compact_every : int
+        number of batches to keep in the log before
+        moving them into the eventWise
+        (Default value = 10)
 
     Returns
     -------
@@ -3939,11 +6322,18 @@ def cluster_multiapply(eventWise, cluster_algorithm, dict_jet_params={},
         jet_class = cluster_algorithm
         # make sure the assignment is done on creation
         additional_parameters["assign"] = True
+        if stage_cache is not None and issubclass(jet_class, Spectral):
+            if isinstance(stage_cache, str):
+                stage_cache = SpectralCache(stage_cache)
+            additional_parameters["stage_cache"] = stage_cache
     eventWise.selected_index = None
     dir_name = eventWise.dir_name
     n_events = len(eventWise.JetInputs_Energy)
-    start_point = len(getattr(eventWise, jet_name+"_Energy", []))
+    result_log = ClusterResultLog(eventWise, jet_name)
+    start_point = result_log.stop
     if start_point >= n_events:
+        # a previous run may have stopped before compacting
+        result_log.compact()
         if not silent:
             print("Finished")
         return True
@@ -3951,8 +6341,7 @@ def cluster_multiapply(eventWise, cluster_algorithm, dict_jet_params={},
     if not silent:
         print(f" Starting at {start_point/n_events:.1%}")
         print(f" Will stop at {end_point/n_events:.1%}")
-    # updated_dict will be replaced in the first batch
-    updated_dict = None
+    builder = JetColumnBuilder(jet_class, jet_name)
     checked = False
     has_eigenvalues = 'NumEigenvectors' in dict_jet_params
     if has_eigenvalues:
@@ -3962,6 +6351,8 @@ def cluster_multiapply(eventWise, cluster_algorithm, dict_jet_params={},
             print(f"{event_n/n_events:.1%}", end='\r', flush=True)
         eventWise.selected_index = event_n
         if len(eventWise.JetInputs_PT) == 0:
+            if has_eigenvalues:
+                eigenvalues.append([])
             continue  # there are no observables
         # look for checkpoints
         if checkpoints is not None:
@@ -3978,15 +6369,21 @@ def cluster_multiapply(eventWise, cluster_algorithm, dict_jet_params={},
         if not checked and len(jets) > 0:
             assert jets[0].check_params(eventWise), f"Jet parameters don't match recorded parameters for {jet_name}"
             checked = True
-        updated_dict = jet_class.create_updated_dict(jets, jet_name, event_n, eventWise, updated_dict)
-    updated_dict = {name: awkward.fromiter(updated_dict[name]) for name in updated_dict}
+        builder.add_event(event_n - start_point, jets)
+    # events at the end with no observables still need rows
+    builder.add_event(end_point - start_point - 1, [])
+    batch_columns = builder.columns()
+    if has_eigenvalues:
+        batch_columns[jet_name + "_Eigenvalues"] = awkward.fromiter(eigenvalues)
+    result_log.write_batch(start_point, end_point, **batch_columns)
+    finished = end_point == n_events
     if new_checkpoints:
+        # checkpoints are kept for every event, so they go straight to the eventWise
         checkpoint_content = {k: awkward.fromiter(v) for k, v in checkpoint_content.items()}
-        updated_dict.update(checkpoint_content)
-    if has_eigenvalues:
-        updated_dict[jet_name + "_Eigenvalues"] = awkward.fromiter(eigenvalues)
-    eventWise.append(**updated_dict)
-    return end_point == n_events
+        result_log.compact(**checkpoint_content)
+    elif finished or len(result_log.batches()) >= compact_every:
+        result_log.compact()
+    return finished
 
 
 # track which classes in this module are cluster classes
@@ -4061,6 +6458,380 @@ def check_hyperparameters(cluster_class, params):
         raise ValueError(error_str.format(value, name, opts))
 
 
+def _possible_params():
+    """
+    Names of all the parameters a jet could have.
+
+    Returns
+    -------
+    possible_params : set of strings
+        parameter names
+
+    """
+    return set(sum([list(cluster_class.permited_values.keys())
+                    for cluster_class in
+                    [Traditional, Splitting, Spectral, Indicator]], []))
+
+
+def _canonical_parameter(value):
+    """
+    Put a parameter value in a standard form, so that values
+    that are exactly equal have the same form.
+    Numbers become floats and sequences become tuples.
+    Numbers that are only close are not made the same,
+    that tolerance is applied by _tolerance_key.
+
+    Parameters
+    ----------
+    value : object
+        value of the parameter
+
+    Returns
+    -------
+    canonical : object
+        hashable standard form of the value
+
+    """
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, (tuple, list, np.ndarray)):
+        return tuple(_canonical_parameter(part) for part in value)
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return repr(value)
+    if np.isnan(number):
+        return "nan"
+    return number
+
+
+def _tolerance_key(value):
+    """
+    Split a parameter value into the part that must be equal
+    and a number that need only be close (by np.isclose) for
+    check_for_jet to match it.
+    Finite numbers only need to be close, and pairs such as
+    ('knn', 3) need an equal first element and a close second element.
+
+    Parameters
+    ----------
+    value : object
+        value of the parameter
+
+    Returns
+    -------
+    key : tuple or None
+        the canonical form of the part that must be equal,
+        and the number that need only be close,
+        None if the whole value must be equal
+
+    """
+    if isinstance(value, (tuple, list)) and len(value) == 2:
+        second = _tolerance_key(value[1])
+        if second is not None and second[0] == ():
+            return (_canonical_parameter(value[0]),), second[1]
+        return None
+    if value is None or isinstance(value, (bool, np.bool_, str)):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not np.isfinite(number):
+        return None
+    return (), number
+
+
+def jet_parameter_hash(parameters):
+    """
+    Hash of a set of jet parameters, which is the same for
+    any exactly equal parameter sets.
+    Parameters that are only close, which check_for_jet
+    would match, can have different hashes.
+
+    Parameters
+    ----------
+    parameters : dict
+        keys are parameter names and values are parameter values
+
+    Returns
+    -------
+    : string
+        hex digest of the parameters
+
+    """
+    canonical = sorted((name, _canonical_parameter(value))
+                       for name, value in parameters.items())
+    return hashlib.sha1(repr(canonical).encode()).hexdigest()
+
+
+class JetRegistry:
+    """
+    Index of the jets in an eventWise by their parameters.
+    The hash of each jet's parameters is stored in the eventWise
+    as the hyperparameter <jet_name>_ParameterHash,
+    so an exactly equal parameter set is found with one lookup.
+    Partial parameter sets are found by intersecting the jets
+    that match each parameter value, numbers are kept sorted so
+    the ones close to the requested value are found by bisection.
+    Use JetRegistry.of to get the registry of an eventWise,
+    it is made once and kept up to date with the hyperparameters.
+    """
+    hash_suffix = "_ParameterHash"
+
+    def __init__(self, eventWise):
+        """
+        Class constructor
+
+        Parameters
+        ----------
+        eventWise : EventWise
+            data structure with jets
+
+        """
+        self.eventWise = eventWise
+        self.hashes = {}  # jet_name: hash of its parameters
+        self._by_hash = {}  # hash: set of jet names
+        self._param_columns = {}  # jet_name: tuple of (position, column name)
+        self._params = {}  # jet_name: parameters, filled on request
+        # indices of parameter values, made when first needed
+        self._by_value = None  # (name, canonical value): set of jet names
+        self._by_number = None  # (name, equal part): sorted list of (number, jet name)
+        self._hyperparameter_columns = None
+        self.sync()
+
+    @classmethod
+    def of(cls, eventWise):
+        """
+        Get the registry of an eventWise, making it if needed.
+
+        Parameters
+        ----------
+        eventWise : EventWise
+            data structure with jets
+
+        Returns
+        -------
+        registry : JetRegistry
+            up to date registry of the eventWise
+
+        """
+        registry = vars(eventWise).get('_jet_registry')
+        if registry is None:
+            registry = cls(eventWise)
+            eventWise._jet_registry = registry
+        else:
+            registry.sync()
+        return registry
+
+    def sync(self):
+        """
+        Update the registry to match the hyperparameters of the eventWise.
+        Only jets whose hyperparameters have been moved, changed or
+        removed since the last sync are read again.
+        """
+        columns = tuple(self.eventWise.hyperparameter_columns)
+        if columns == self._hyperparameter_columns:
+            return
+        self._hyperparameter_columns = columns
+        possible_params = _possible_params()
+        param_columns = {}
+        for position, name in enumerate(columns):
+            jet_name, _, param = name.partition('_')
+            if param in possible_params:
+                param_columns.setdefault(jet_name, []).append((position, name))
+        param_columns = {jet_name: tuple(found) for jet_name, found in param_columns.items()}
+        for jet_name in list(self.hashes):
+            if param_columns.get(jet_name) != self._param_columns.get(jet_name):
+                self._forget(jet_name)
+        stored = set(columns)
+        for jet_name, found in param_columns.items():
+            if jet_name in self.hashes:
+                continue
+            self._param_columns[jet_name] = found
+            hash_name = jet_name + self.hash_suffix
+            if hash_name in stored:
+                param_hash = getattr(self.eventWise, hash_name)
+            else:  # written before there was a registry
+                param_hash = jet_parameter_hash(self.params(jet_name))
+            self.hashes[jet_name] = param_hash
+            self._by_hash.setdefault(param_hash, set()).add(jet_name)
+            if self._by_value is not None:
+                self._index_values(jet_name)
+
+    def _forget(self, jet_name):
+        """
+        Remove a jet from the registry, but not from the eventWise.
+
+        Parameters
+        ----------
+        jet_name : string
+            Prefix name of the jet
+
+        """
+        param_hash = self.hashes.pop(jet_name)
+        self._by_hash[param_hash].discard(jet_name)
+        if not self._by_hash[param_hash]:
+            del self._by_hash[param_hash]
+        self._param_columns.pop(jet_name, None)
+        params = self._params.pop(jet_name, None)
+        if self._by_value is not None and params is not None:
+            for name, value in params.items():
+                key = _tolerance_key(value)
+                if key is None:
+                    self._by_value[(name, _canonical_parameter(value))].discard(jet_name)
+                else:
+                    self._by_number[(name, key[0])].remove((key[1], jet_name))
+
+    def _index_values(self, jet_name):
+        """
+        Add a jet to the indices of parameter values.
+
+        Parameters
+        ----------
+        jet_name : string
+            Prefix name of the jet
+
+        """
+        for name, value in self.params(jet_name).items():
+            key = _tolerance_key(value)
+            if key is None:
+                key = (name, _canonical_parameter(value))
+                self._by_value.setdefault(key, set()).add(jet_name)
+            else:
+                numbers = self._by_number.setdefault((name, key[0]), [])
+                bisect.insort(numbers, (key[1], jet_name))
+
+    def _matching(self, name, value):
+        """
+        Jets with a parameter that check_for_jet would match to a value.
+        Numbers match if they are close by np.isclose.
+
+        Parameters
+        ----------
+        name : string
+            name of the parameter
+        value : object
+            value of the parameter
+
+        Returns
+        -------
+        names : set of strings
+            Prefix names of the matching jets
+
+        """
+        key = _tolerance_key(value)
+        if key is None:
+            return self._by_value.get((name, _canonical_parameter(value)), set())
+        equal_part, required = key
+        numbers = self._by_number.get((name, equal_part), [])
+        # np.isclose(found, required) allows atol + rtol*abs(required)
+        tolerance = 1e-8 + 1e-5*abs(required)
+        start = bisect.bisect_left(numbers, (required - tolerance,))
+        matching = set()
+        for found, jet_name in numbers[start:]:
+            if found > required + tolerance:
+                break
+            if np.isclose(found, required):
+                matching.add(jet_name)
+        return matching
+
+    def params(self, jet_name):
+        """
+        The parameters of a jet, as written in the eventWise.
+
+        Parameters
+        ----------
+        jet_name : string
+            Prefix name of the jet
+
+        Returns
+        -------
+        params : dict
+            keys are parameter names and values are parameter values,
+            empty if the jet has no parameters written
+
+        """
+        self.sync()
+        if jet_name not in self._param_columns:
+            return {}
+        if jet_name not in self._params:
+            trim = len(jet_name) + 1
+            self._params[jet_name] = {name[trim:]: getattr(self.eventWise, name)
+                                      for _, name in self._param_columns.get(jet_name, [])}
+        return dict(self._params[jet_name])
+
+    def names_for(self, parameters):
+        """
+        Jets with exactly this set of parameters, found by hash.
+        Unlike find, numbers must be equal, not just close.
+
+        Parameters
+        ----------
+        parameters : dict
+            keys are parameter names and values are parameter values
+
+        Returns
+        -------
+        names : list of strings
+            Prefix names of the matching jets
+
+        """
+        self.sync()
+        return sorted(self._by_hash.get(jet_parameter_hash(parameters), []))
+
+    def find(self, parameters):
+        """
+        Jets that have all the given parameter values,
+        they may also have other parameters.
+        Numbers, and the second element of pairs such as ('knn', 3),
+        need only be close by np.isclose, as in check_for_jet.
+
+        Parameters
+        ----------
+        parameters : dict
+            keys are parameter names and values are parameter values
+
+        Returns
+        -------
+        names : list of strings
+            Prefix names of the matching jets
+
+        """
+        self.sync()
+        if self._by_value is None:
+            self._by_value = {}
+            self._by_number = {}
+            for jet_name in self.hashes:
+                self._index_values(jet_name)
+        found = set(self.hashes)
+        for name, value in parameters.items():
+            found &= self._matching(name, value)
+            if not found:
+                break
+        return sorted(found)
+
+    def register(self, jet_name, parameters):
+        """
+        Write the parameters of a jet to the eventWise,
+        along with their hash.
+
+        Parameters
+        ----------
+        jet_name : string
+            Prefix name of the jet
+        parameters : dict
+            keys are parameter names and values are parameter values
+
+        """
+        new_hyper = {jet_name + '_' + name: parameters[name] for name in parameters}
+        new_hyper[jet_name + self.hash_suffix] = jet_parameter_hash(parameters)
+        self.eventWise.append_hyperparameters(**new_hyper)
+        self.sync()
+
+
 def get_jet_params(eventWise, jet_name, add_defaults=False):
     """
     Given an eventwise in which a jet was written return it's settings.
@@ -4081,14 +6852,7 @@ def get_jet_params(eventWise, jet_name, add_defaults=False):
         dictionary with keys being parameter names and values being parameter values
 
     """
-    possible_params = set(sum([list(cluster_class.permited_values.keys())
-                               for cluster_class in
-                               [Traditional, Splitting, Spectral, Indicator]], []))
-    prefix = jet_name + "_"
-    trim = len(prefix)
-    columns = {name[trim:]: getattr(eventWise, name) for name in eventWise.hyperparameter_columns
-               if name.startswith(prefix) and name.split('_', 1)[1] in possible_params}
-
+    columns = JetRegistry.of(eventWise).params(jet_name)
     if add_defaults:
         if jet_name.startswith("SpectralMean"):
             defaults = SpectralMean.default_params
@@ -4176,42 +6940,36 @@ def filter_jets(eventWise, jet_name, min_jetpt=None, min_ntracks=None):
 
 
 def check_for_jet(eventWise, parameters, name_start=None, pottentials=None):
+    """
+    Find the jets in an eventWise that were made with the given parameters.
+
+    Parameters
+    ----------
+    eventWise : EventWise
+        data structure with jets
+    parameters : dict
+        keys are parameter names and values are parameter values,
+        jets may have other parameters too
+    name_start : string
+        if given only jets whose names start with this are considered
+        (Default value = None)
+    pottentials : iterable of strings
+        if given only jets with these names are considered,
+        otherwise all jets with columns in the eventWise are considered
+        (Default value = None)
+
+    Returns
+    -------
+    pottentials : list of strings
+        names of the matching jets
+
+    """
     if pottentials is None:
         pottentials = get_jet_names(eventWise)
-        if name_start is not None:
-            pottentials = {name for name in pottentials if name.startswith(name_start)}
-    discreet_types = (bool, str, type(None))
-    discreet_parameters = [key for key, val in parameters.items()
-                           if isinstance(val, discreet_types)]
-    continuous_parameters = [key for key in parameters
-                             if key not in discreet_parameters]
-    while len(pottentials) > 1 and discreet_parameters:
-        key = discreet_parameters.pop()
-        values = [getattr(eventWise, name+'_'+key) for name in pottentials]
-        pottentials = [name for name, value in zip(pottentials, values)
-                       if isinstance(value, discreet_types) and value == parameters[key]]
-    while len(pottentials) > 1 and continuous_parameters:
-        key = continuous_parameters.pop()
-        required = parameters[key]
-        values = [getattr(eventWise, name+'_'+key) for name in pottentials]
-        if isinstance(required, tuple):
-            pottentials = [name for name, value in zip(pottentials, values)
-                           if isinstance(value, tuple) and 
-                           value[0] == required[0] and 
-                           np.isclose(value[1], required[1])]
-        elif isinstance(required, (str, bool, type(None))):  # can require strict equality
-            pottentials = [name for name, value in zip(pottentials, values)
-                           if value == required]
-        else:  # some sort of numeric
-            pottentials = []
-            for name, value in zip(pottentials, values):
-                try:
-                    close = np.isclose(value, required, equal_nan=True)
-                except TypeError:
-                    close = False
-                if close:
-                    pottentials.append(name)
-    return pottentials
+    pottentials = set(pottentials)
+    found = JetRegistry.of(eventWise).find(parameters)
+    return [name for name in found if name in pottentials and
+            (name_start is None or name.startswith(name_start))]
 
 
 def take_jets(recipient_eventWise, donar_list, jet_list):
@@ -132,6 +132,8 @@ def _worker(eventWise_path, run_condition, jet_class,
                                                    silent=True)
     else:
         raise ValueError(f"Dont recognise run_condition {run_condition}")
+    # leave all the finished batches in the eventWise
+    FormJets.ClusterResultLog(eventWise, jet_name).compact()
     #if finished:
     #    print(f"Finished {i} batches, dataset {eventWise_path} complete")
     #else:
@@ -187,15 +189,17 @@ def make_n_working_fragments(eventWise_path, n_fragments, jet_name):
             pass
         #print(f"{eventWise_path} appears to be directory")
         # if it's a directory look for subdirectories whos name starts with the directory name
-        # these indicate existing splits
+        # these indicate existing splits, hidden directories hold jet logs
         leaf_dir = os.path.split(eventWise_path)[-1]
         sub_dir = [name for name in os.listdir(eventWise_path)
-                   if name.startswith(leaf_dir) and os.path.isdir(os.path.join(eventWise_path, name))]
+                   if name.startswith(leaf_dir) and not name.startswith('.')
+                   and os.path.isdir(os.path.join(eventWise_path, name))]
         while sub_dir:
             #print(f"Entering {sub_dir[0]}")
             eventWise_path = os.path.join(sub_dir[0])
             sub_dir = [name for name in os.listdir(eventWise_path)
-                       if name.startswith(sub_dir[0]) and os.path.isdir(os.path.join(eventWise_path, name))]
+                       if name.startswith(sub_dir[0]) and not name.startswith('.')
+                       and os.path.isdir(os.path.join(eventWise_path, name))]
         existing_fragments = [name for name in os.listdir(eventWise_path)
                               if name.endswith(".awkd")]
         if len(existing_fragments) == 0:
@@ -262,10 +266,14 @@ def make_n_working_fragments(eventWise_path, n_fragments, jet_name):
             return True
         eventWise = Components.EventWise.from_file(unfinished_path)
     #print("Fragmenting eventwise")
-    all_paths = eventWise.fragment("JetInputs_Energy", n_fragments=n_fragments)
     if unfinished_path is not None:
+        all_paths = eventWise.fragment("JetInputs_Energy", n_fragments=n_fragments)
         # get rid of the unfishied part becuase it exists in the fragments already
         os.remove(unfinished_path)
+    else:
+        # the original file is kept, so the fragments need not copy it
+        all_paths = eventWise.fragment("JetInputs_Energy", n_fragments=n_fragments,
+                                       virtual=True)
     return all_paths
 
 
@@ -381,7 +389,10 @@ def remove_partial(all_paths, expected_length=None):
                      if len(getattr(ew, name + "_InputIdx")) < length]
         for name in too_short:
             ew.remove_prefix(name)
-        ew.write()
+        # only the change is written, virtual fragments stay virtual
+        ew.write_segment()
+        # logged batches belong to jets that are not finished
+        FormJets.ClusterResultLog.clear_all(ew)
 
 
 def recombine_eventWise(eventWise_path):
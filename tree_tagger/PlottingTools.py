@@ -38,7 +38,7 @@ def discribe_jet(eventWise=None, jet_name=None, properties_dict=None, ax=None, f
         prefix = jet_name + "_"
         trim = len(prefix)
         properties_dict = {name[trim:]: getattr(eventWise, name) for name in eventWise.hyperparameter_columns
-                           if name.startswith(prefix)}
+                           if name.startswith(prefix) and not name.endswith("_ParameterHash")}
         if skip_scores:
             score_starts = ["Ave", "Seperate", "Quality"]
             properties_dict = {name: value for name, value in properties_dict.items()
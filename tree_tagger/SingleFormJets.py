@@ -3,6 +3,7 @@ from ipdb import set_trace as st
 from tree_tagger import InputTools, Components, JoinHepMCRoot, ReadHepmc, FormJets, TrueTag, ShapeVariables, MassPeaks
 import os
 import shutil
+import functools
 import ast
 import numpy as np
 from matplotlib import pyplot as plt
@@ -73,7 +74,7 @@ def define_inputs(eventWise):
     if InputTools.yesNo_question("Filter the tracks on pT or eta? "):
         pt_cut = InputTools.get_literal("What is the minimum pT of the tracks? ", float)
         eta_cut = InputTools.get_literal("What is the absolute maximum of the tracks? ", float)
-        pt_eta_cut = lambda *args: FormJets.filter_pt_eta(*args, min_pt=pt_cut, max_eta=eta_cut)
+        pt_eta_cut = functools.partial(FormJets.filter_pt_eta, min_pt=pt_cut, max_eta=eta_cut)
         filter_functions = [FormJets.filter_ends, pt_eta_cut]
     else:
         filter_functions = [FormJets.filter_ends]
@@ -8,6 +8,8 @@
 //#include "/scratch/hadh1g17/fastjet_install/include/fastjet/ClusterSequence.hh"
 #include "/usr/local/include/fastjet/ClusterSequence.hh"
 #include <fstream>
+#include <cstdio>
+#include <cstdint>
 
 using namespace std;
 using namespace fastjet;
@@ -245,14 +247,77 @@ void output_doubles(std::ostream& double_file, vector<vector<double>> doubles,
     }
 }
 
+bool read_exact(void* buffer, size_t n_bytes){
+    return fread(buffer, 1, n_bytes, stdin) == n_bytes;
+}
+
+
+// Cluster batches of events from stdin until it closes, without restarting the program.
+// Each batch arrives as
+//   int32 n_events, int32 algorithm_num, double deltaR,
+//   (n_events+1) int64 offsets of each event in the inputs,
+//   offsets[n_events]*5 doubles {global_obs_id, px, py, pz, e}
+// and each reply is
+//   (n_events+1) int64 offsets of each event in the rows,
+//   n_rows*5 int32 {pseudojet_id, InputIdx, parent_id, child1_id, child2_id},
+//   n_rows*7 doubles {PT, Rapidity, Phi, Energy, Px, Py, Pz}
+// all in the native byte order. A negative n_events also stops the program.
+int run_binary(){
+    int32_t header[2];
+    double R;
+    // the banner is printed when the first ClusterSequence is made,
+    // on stdout it would land in the middle of the first reply
+    ClusterSequence::set_fastjet_banner_stream(&std::cerr);
+    while(read_exact(header, sizeof(header)) && read_exact(&R, sizeof(R))){
+        int32_t n_events = header[0];
+        if(n_events < 0){
+            break;
+        }
+        vector<int64_t> input_offsets(n_events + 1);
+        if(!read_exact(input_offsets.data(), input_offsets.size()*sizeof(int64_t))){
+            return 1;  // the batch was cut short
+        }
+        vector<double> all_inputs(5*input_offsets[n_events]);
+        if(!read_exact(all_inputs.data(), all_inputs.size()*sizeof(double))){
+            return 1;
+        }
+        vector<int64_t> row_offsets(1, 0);
+        vector<int32_t> flat_ints;
+        vector<double> flat_doubles;
+        for(int32_t event_n=0; event_n<n_events; event_n++){
+            vector<double> a(all_inputs.begin() + 5*input_offsets[event_n],
+                             all_inputs.begin() + 5*input_offsets[event_n + 1]);
+            vector< vector<int> > ints;
+            vector< vector<double> > doubles;
+            vector< double > masses;
+            vector< double > pts;
+            fj(a, ints, doubles, masses, pts, R, header[1]);
+            for(size_t i=0; i<ints.size(); i++){
+                flat_ints.insert(flat_ints.end(), ints[i].begin(), ints[i].end());
+                flat_doubles.insert(flat_doubles.end(), doubles[i].begin(), doubles[i].end());
+            }
+            row_offsets.push_back(row_offsets.back() + ints.size());
+        }
+        fwrite(row_offsets.data(), sizeof(int64_t), row_offsets.size(), stdout);
+        fwrite(flat_ints.data(), sizeof(int32_t), flat_ints.size(), stdout);
+        fwrite(flat_doubles.data(), sizeof(double), flat_doubles.size(), stdout);
+        fflush(stdout);
+    }
+    return 0;
+}
+
 
 int main(int argc, char * argv[]) {
     bool read_pipe = true;
+    if(argc == 2 && string(argv[1]) == "--binary"){
+        return run_binary();
+    }
     if(argc < 3 || argc > 4){
         std::cout << "The arguments should be "
                   << "<deltaR> "
                   << "<algorithm_num> "
-                  << "<folder_name(optional)> " << std::endl;
+                  << "<folder_name(optional)> " << std::endl
+                  << "or --binary to cluster many events from stdin" << std::endl;
         return 1;
     }
    double R = atof(argv[1]);
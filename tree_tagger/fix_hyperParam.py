@@ -52,6 +52,10 @@ def fix_eventWise(eventWise, variable, fixing_function):
     to_append = {}
     for name in hyperparam:
         to_append[name] = fixing_function(getattr(eventWise, name))
+        # the parameter hash no longer matches, it will be recalculated
+        hash_name = name.split('_', 1)[0] + "_ParameterHash"
+        if hash_name in eventWise.hyperparameter_columns:
+            eventWise.remove(hash_name)
     eventWise.append_hyperparameters(**to_append)
     
 